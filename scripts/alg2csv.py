@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
 import sys
-import xml.parsers.expat
+
+from xmlstream import iter_links
 
 fromDoc = ''
 toDoc = ''
@@ -40,7 +41,5 @@ def start_element(name, attrs):
             print(','.join([fromDoc,toDoc,link[0],link[1],alignType,alignScore,hunScore,timeOverlap,bicleanerScore]))
 
 
-parser = xml.parsers.expat.ParserCreate()
-parser.StartElementHandler = start_element
-for line in sys.stdin:
-    parser.Parse(line)
+for (name, attrs) in iter_links(sys.stdin.buffer, 'stdin'):
+    start_element(name, attrs)
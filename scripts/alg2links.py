@@ -4,6 +4,15 @@ import argparse
 import sys
 import sqlite3
 import os, traceback
+import multiprocessing
+
+from queue import Empty
+
+from sentindex import DocumentSentids, DocumentIndex
+from linkids import encode_ids
+from linkpostings import create_tables, add_postings
+from bulkbuild import DELETE_DUPLICATE_LINKS, set_pragmas, create_indexes, PhaseTimer
+from linkschema import LINKED_TABLES, LINKED_INDEXES, LINK_TABLES, LINK_INDEXES, CORPUS_TABLES, WATERMARK_TABLES
 
 parser = argparse.ArgumentParser(prog='alg2links',description='convert alignments from bitexts to link databases')
 parser.add_argument("-a", "--alignments", type=str, required=True, help="name of the alignment database file (input)")
@@ -17,6 +26,17 @@ parser.add_argument("-s2", "--srclang2", type=str, help="source language code (O
 parser.add_argument("-t2", "--trglang2", type=str, help="target language code (OPUS langids)")
 parser.add_argument("-s3", "--srclang3", type=str, help="source language code (ISO-639-3)")
 parser.add_argument("-t3", "--trglang3", type=str, help="target language code (ISO-639-3)")
+parser.add_argument("-m", "--max-doc-size", type=int, default=5000000,
+                    help="max number of sentences per document to be cached in memory (default: 5000000)")
+parser.add_argument("-b", "--binary-ids", action='store_true',
+                    help="store srcSentIDs and trgSentIDs as compact binary BLOBs (see linkids.py)")
+parser.add_argument("-p", "--postings", action='store_true',
+                    help="store sentence-to-link postings instead of linkedsource/linkedtarget (see linkpostings.py)")
+parser.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes for resolving links")
+parser.add_argument("-B", "--bulk", action='store_true',
+                    help="create indeces on links and linked tables after inserting all links (for new link DBs)")
+parser.add_argument("-C", "--cache-size", type=int, default=0, help="SQLite page cache size in MB (default: SQLite default)")
+parser.add_argument("-M", "--memory-temp", action='store_true', help="keep temporary data (index sorting) in memory")
 
 
 args = parser.parse_args()
@@ -29,6 +49,14 @@ linkDB = args.links
 
 buffersize = 100000
 # buffersize = 10
+queuetimeout = 10    # seconds to wait for the workers before checking whether they are still alive
+maxDocSize = args.max_doc_size
+binaryIDs = args.binary_ids
+postings = args.postings
+bulk = args.bulk
+
+timer = PhaseTimer()
+timer.start('schema')
 
 ##----------------------------------------------------------------
 ## connect to source and target language sentence index DBs
@@ -40,48 +68,57 @@ srcDBcur = srcDBcon.cursor()
 trgDBcon = sqlite3.connect(f"file:{trgDB}?immutable=1",uri=True)
 trgDBcur = trgDBcon.cursor()
 
+## document ID lookup tables (loaded once per corpus release)
+
+srcDocIndex = DocumentIndex(srcDBcon.cursor(), srcDB)
+trgDocIndex = DocumentIndex(trgDBcon.cursor(), trgDB)
+
 ##----------------------------------------------------------------
 # create DB that shows what sentences are included in what kind of alignment units
 ##----------------------------------------------------------------
 
 linksDBcon = sqlite3.connect(linkDB, timeout=7200)
 linksDBcur = linksDBcon.cursor()
+set_pragmas(linksDBcon, args.cache_size, args.memory_temp)
 
-## tables that map sentences to links
+## secondary indeces on links and linked tables (created at the end in bulk mode)
 
-linksDBcur.execute("CREATE TABLE IF NOT EXISTS linkedsource ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, corpusID INTEGER, PRIMARY KEY(linkID,sentID) )")
-linksDBcur.execute("CREATE TABLE IF NOT EXISTS linkedtarget ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, corpusID INTEGER, PRIMARY KEY(linkID,sentID) )")
+indexes = []
+
+## tables that map sentences to links
 
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_bitext ON linkedsource (corpusID,bitextID,sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_bitext ON linkedtarget (corpusID,bitextID,sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_linkid ON linkedsource (linkID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_linkid ON linkedtarget (linkID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_sentid ON linkedsource (sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_sentid ON linkedtarget (sentID)")
+if postings:
+    create_tables(linksDBcon)
+else:
+    for statement in LINKED_TABLES:
+        linksDBcur.execute(statement)
+    indexes.extend(LINKED_INDEXES)
 
 ## the original alignment table, now also with internal sentence IDs
 
-linksDBcur.execute("""CREATE TABLE IF NOT EXISTS links ( linkID INTEGER NOT NULL PRIMARY KEY, bitextID, 
-                                                         srcIDs TEXT, trgIDs TEXT, srcSentIDs TEXT, trgSentIDs TEXT,
-                                                         alignType TEXT, alignerScore REAL, cleanerScore REAL)""")
-linksDBcur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_links ON links ( bitextID, srcIDs, trgIDs )")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_aligntype ON links ( bitextID, alignType )")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_bitextid ON links ( bitextID )")
+for statement in LINK_TABLES:
+    linksDBcur.execute(statement)
+indexes.extend(LINK_INDEXES)
+
+if not bulk:
+    create_indexes(linksDBcon, indexes)
+
+
+## corpus and bitext tables, their linkID ranges (including *_range_extra for
+## bitexts and corpora that got new alignments after other corpora had been added)
 
+for statement in CORPUS_TABLES:
+    linksDBcur.execute(statement)
 
-## corpus and bitext tables
+## watermarks: the last alignment (rowid in the alignment DB) that has been processed
+## for each corpus and bitext (stored in the same transaction as the links) and
+## whether the corpus or bitext has been finished (ranges and bitext entries added)
+## they are used for resuming interrupted jobs and for incremental updates
+## (corpus_watermarks holds the largest bitextID and linkID processed for a corpus)
 
-linksDBcur.execute("""CREATE TABLE IF NOT EXISTS corpora (corpusID INTEGER NOT NULL PRIMARY KEY,
-	                                                  corpus TEXT,version TEXT,srclang TEXT,trglang TEXT,
-	                                                  srclang3 TEXT,trglang3 TEXT,latest INTEGER)""")
-linksDBcur.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_corpora 
-                      ON corpora (corpus,version,srclang,trglang,srclang3,trglang3,latest)""")
-linksDBcur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_release ON corpora (corpus,version,srclang,trglang)")
-linksDBcur.execute("""CREATE TABLE IF NOT EXISTS bitexts (bitextID INTEGER NOT NULL PRIMARY KEY,
-	                                         corpus TEXT,version TEXT,fromDoc TEXT,toDoc TEXT)""")
-linksDBcur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bitexts ON bitexts (corpus,version,fromDoc,toDoc)")
-linksDBcur.execute("CREATE TABLE IF NOT EXISTS bitext_range (bitextID INTEGER NOT NULL PRIMARY KEY,start INTEGER,end INTEGER)")
-linksDBcur.execute("CREATE TABLE IF NOT EXISTS corpus_range (corpusID INTEGER NOT NULL PRIMARY KEY,start INTEGER,end INTEGER)")
+newWatermarks = not linksDBcur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='watermarks'").fetchone()
+for statement in WATERMARK_TABLES:
+    linksDBcur.execute(statement)
 
 linksDBcon.commit()
 
@@ -101,10 +138,11 @@ bitextDBcur = algDBcon.cursor()
 srcbuffer = []
 trgbuffer = []
 linkbuffer = []
+watermarks = {}
 
 def insert_links():
-    global linkDB, linksDBcon, linksDBcur, srcbuffer, trgbuffer, linkbuffer
-    if len(srcbuffer) > 0 or len(trgbuffer) > 0:
+    global linkDB, linksDBcon, linksDBcur, srcbuffer, trgbuffer, linkbuffer, watermarks
+    if len(srcbuffer) > 0 or len(trgbuffer) > 0 or len(linkbuffer) > 0 or len(watermarks) > 0:
         if len(srcbuffer) > 0:
             linksDBcur.executemany("""INSERT OR IGNORE INTO linkedsource VALUES(?,?,?,?)""", srcbuffer)
         if len(trgbuffer) > 0:
@@ -118,48 +156,134 @@ def insert_links():
             #     print(sqlite3.Error.sqlite_errorcode)  # Prints 275
             #     print(sqlite3.Error.sqlite_errorname)  # Prints SQLITE_CONSTRAINT_CHECK
             #     quit()
+        if len(watermarks) > 0:
+            linksDBcur.executemany("""INSERT OR REPLACE INTO watermarks VALUES(?,?,?,0)""",
+                                   [(b, watermarks[b][0], watermarks[b][1]) for b in watermarks])
+            linksDBcur.executemany("""INSERT INTO corpus_watermarks VALUES(?,?,?,0)
+                                      ON CONFLICT(corpusID) DO UPDATE SET bitextID=MAX(bitextID,excluded.bitextID),
+                                                                          linkID=MAX(linkID,excluded.linkID)""",
+                                   [(watermarks[b][0], b, watermarks[b][1]) for b in watermarks])
 
         linksDBcon.commit()
         
         srcbuffer = []
         trgbuffer = []
         linkbuffer = []
+        watermarks = {}
 
 
 ##----------------------------------------------------------------
-## insert rowid range for a bitext
+## linkID ranges (blocks) of bitexts and corpora
+##
+## a block is a linkID range without links of other bitexts (or corpora);
+## the first block is stored in bitext_range (corpus_range) and further
+## blocks in bitext_range_extra (corpus_range_extra)
+## linkIDs are rowids of the alignment DB, so blocks are checked against the
+## alignments there: they stay valid when other corpora are added later on
+## (and there is no need for an index on bitextID in the link DB)
 ##----------------------------------------------------------------
 
-def insert_bitext_range(bitextID):
-    global linkDB, linksDBcon, linksDBcur
+## linkID range of the links of each bitext that have been added in this run
 
-    for rowids in linksDBcur.execute(f"SELECT MIN(rowid),MAX(rowid) FROM links WHERE bitextID={bitextID}"):
-        start = rowids[0]
-        end = rowids[1]
-        if start and end:
-            linksDBcur.execute(f"INSERT OR IGNORE INTO bitext_range VALUES ({bitextID},{start},{end})")
-            linksDBcur.execute(f"UPDATE bitext_range SET start={start},end={end} WHERE bitextID='{bitextID}'")
-        
+newRanges = {}
+
+def stored_blocks(kind, ID):
+    global linksDBcur
+    blocks = linksDBcur.execute(f"SELECT start,end FROM {kind}_range WHERE {kind}ID=?", (ID,)).fetchall()
+    blocks.extend(linksDBcur.execute(f"SELECT start,end FROM {kind}_range_extra WHERE {kind}ID=?", (ID,)).fetchall())
+    return sorted(blocks)
+
+
+def store_blocks(kind, ID, blocks):
+    global linksDBcon, linksDBcur
+    linksDBcur.execute(f"DELETE FROM {kind}_range WHERE {kind}ID=?", (ID,))
+    linksDBcur.execute(f"DELETE FROM {kind}_range_extra WHERE {kind}ID=?", (ID,))
+    if blocks:
+        linksDBcur.execute(f"INSERT INTO {kind}_range VALUES (?,?,?)", (ID, blocks[0][0], blocks[0][1]))
+        linksDBcur.executemany(f"INSERT INTO {kind}_range_extra VALUES (?,?,?)", [(ID, s, e) for (s, e) in blocks[1:]])
     linksDBcon.commit()
 
 
+## split a linkID range of a bitext into blocks
+## (only necessary if alignments of several bitexts are interleaved in the alignment DB)
+
+def split_range(bitextID, start, end):
+    global bitextDBcur, linksDBcon, linksDBcur
+    other = bitextDBcur.execute("SELECT 1 FROM links WHERE rowid BETWEEN ? AND ? AND bitextID<>? LIMIT 1",
+                                (start, end, bitextID)).fetchone()
+    if not other:
+        return [(start, end)]
+    runs = []
+    inside = False
+    for (rowid, ID) in algDBcon.execute("""SELECT rowid,bitextID FROM links
+                                           WHERE rowid BETWEEN ? AND ? ORDER BY rowid""", (start, end)):
+        if ID != bitextID:
+            inside = False
+        elif inside:
+            runs[-1] = (runs[-1][0], rowid)
+        else:
+            runs.append((rowid, rowid))
+            inside = True
+    blocks = []
+    for (first, last) in runs:
+        rowids = linksDBcur.execute("SELECT MIN(linkID),MAX(linkID) FROM links WHERE linkID BETWEEN ? AND ?",
+                                    (first, last)).fetchone()
+        if rowids[0] is not None:
+            blocks.append(tuple(rowids))
+    return blocks
+
+
+## merge blocks if there are no alignments of other bitexts or corpora between them
+## (other is the condition for those alignments in the alignment DB)
+
+def merge_blocks(blocks, other):
+    global bitextDBcur
+    merged = []
+    for (start, end) in sorted(blocks):
+        if merged and (start <= merged[-1][1] + 1 or not
+                       bitextDBcur.execute(f"SELECT 1 FROM links WHERE rowid>? AND rowid<? AND {other} LIMIT 1",
+                                           (merged[-1][1], start)).fetchone()):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+## blocks of a bitext: the stored ones together with links from interrupted
+## runs (storedRanges) and links added in this run (newRanges)
+
+def insert_bitext_range(bitextID):
+    blocks = stored_blocks('bitext', bitextID)
+    for linkIDs in (storedRanges.get(bitextID), newRanges.pop(bitextID, None)):
+        if linkIDs:
+            blocks.extend(split_range(bitextID, linkIDs[0], linkIDs[1]))
+    blocks = merge_blocks(blocks, f"bitextID<>{bitextID}")
+    store_blocks('bitext', bitextID, blocks)
+    return blocks
+
+
+## blocks of a corpus: merged blocks of its bitexts
+
 def insert_corpus_range(corpusID,corpus,version,srclang,trglang):
     global linkDB, linksDBcon, linksDBcur
 
-    start = 0
-    end = 0
-    for rowids in linksDBcur.execute(f"SELECT MIN(rowid),MAX(rowid) FROM links WHERE bitextID IN (SELECT rowid FROM bitexts WHERE corpus='{corpus}' AND version='{version}' AND fromDoc LIKE '{srclang}/%' AND toDoc LIKE '{trglang}/%')"):
-        start = rowids[0]
-        end = rowids[1]
-        if start and end:
-            linksDBcur.execute(f"INSERT OR IGNORE INTO corpus_range VALUES ({corpusID},{start},{end})")
-            linksDBcur.execute(f"UPDATE corpus_range SET start={start},end={end} WHERE corpusID='{corpusID}'")
-
-    if not start and not end:
-        linksDBcur.execute(f"DELETE FROM corpora WHERE corpusID='{corpusID}'")
-        linksDBcur.execute(f"DELETE FROM corpus_range WHERE corpusID='{corpusID}'")
-        
-    linksDBcon.commit()
+    matchBitexts = f"""corpus='{corpus}' AND version='{version}'
+                       AND fromDoc LIKE '{srclang}/%' AND toDoc LIKE '{trglang}/%'"""
+    bitexts = f"SELECT bitextID FROM bitexts WHERE {matchBitexts}"
+    blocks = linksDBcur.execute(f"""SELECT start,end FROM bitext_range WHERE bitextID IN ({bitexts})
+                                    UNION ALL
+                                    SELECT start,end FROM bitext_range_extra WHERE bitextID IN ({bitexts})""").fetchall()
+    blocks = merge_blocks(blocks, f"bitextID NOT IN (SELECT rowid FROM bitexts WHERE {matchBitexts})")
+    store_blocks('corpus', corpusID, blocks)
+    return blocks
+
+
+## add the sentence-to-link postings for all links of a corpus
+
+def add_corpus_postings(corpusID):
+    global linksDBcon, linksDBcur
+    for rowids in stored_blocks('corpus', corpusID):
+        add_postings(linksDBcon, rowids[0], rowids[1])
 
 
 def insert_corpus(data):
@@ -179,6 +303,7 @@ def delete_corpus(corpusID):
     global linksDBcon, linksDBcur
     linksDBcur.execute(f"DELETE FROM corpora WHERE corpusID='{corpusID}'")
     linksDBcur.execute(f"DELETE FROM corpus_range WHERE corpusID='{corpusID}'")
+    linksDBcur.execute(f"DELETE FROM corpus_range_extra WHERE corpusID='{corpusID}'")
     linksDBcon.commit()
 
 
@@ -191,66 +316,50 @@ def delete_bitext(bitextID):
     global linksDBcon, linksDBcur
     linksDBcur.execute(f"DELETE FROM bitexts WHERE bitextID='{bitextID}'")
     linksDBcur.execute(f"DELETE FROM bitext_range WHERE bitextID='{bitextID}'")
+    linksDBcur.execute(f"DELETE FROM bitext_range_extra WHERE bitextID='{bitextID}'")
     linksDBcon.commit()
 
 
 #----------------------------------------------------------------
-# run through all bitexts in a selected corpus (aligned document pairs)
-# and store links that map internal sentence IDs to internal linkIDs
+# resolve all links of one bitext (with alignment rowids larger than after)
+#
+# generator that yields chunks of linkedsource, linkedtarget and links rows
+# for each chunk of alignments (together with the number of alignments in the chunk
+# and the rowid of the last alignment in the chunk)
 #----------------------------------------------------------------
 
-def copy_links(corpus,version,srclang,trglang):
-    global bitextDBcur, algDBcur, srcDBcur, trgDBcur
-    global srcbuffer, trgbuffer, linkbuffer
+def resolve_links(bitextID,corpusID,fromDocID,toDocID,after,algcur,srccur,trgcur):
 
-    ## get corpus ID and copy the corpus entry to the new DB
+    # load the sentence IDs of both documents
+    # (large documents are looked up in chunks of links)
 
-    corpusID = 0
-    matchCorpus = f"corpus='{corpus}' AND version='{version}'"
-    matchLangs = f"srclang='{srclang}' AND trglang='{trglang}'"
-    matchDocLangs = f"fromDoc LIKE '{srclang}/%' AND toDoc LIKE '{trglang}/%'"
-    
-    for data in bitextDBcur.execute(f"SELECT rowid,* FROM corpora WHERE {matchCorpus} AND {matchLangs}"):
-        corpusID = data[0]
-        insert_corpus(tuple(data))
+    srcSentIndex = DocumentSentids(srccur, fromDocID, maxDocSize)
+    trgSentIndex = DocumentSentids(trgcur, toDocID, maxDocSize)
 
-    bitextID = 0
-    fromDocID = 0
-    toDocID = 0
-    count = 0
-    countCorpusLinks = 0
+    # run through alignments in this bitext
 
-    for bitext in bitextDBcur.execute(f"SELECT rowid,* FROM bitexts WHERE {matchCorpus} AND {matchDocLangs}"):
-    
-        # find document IDs (fromDocID and toDocID)
-        
-        bitextID = bitext[0]
-        fromDoc = bitext[3]
-        toDoc = bitext[4]
-        countBitextLinks = 0
-
-        # print(f"now doing {bitextID}: {fromDoc}-{toDoc}")    
-        for doc in srcDBcur.execute(f"SELECT rowid FROM documents WHERE {matchCorpus} AND document='{fromDoc}'"):
-            fromDocID = doc[0]
-            for doc in trgDBcur.execute(f"SELECT rowid FROM documents WHERE {matchCorpus} AND document='{toDoc}'"):
-                toDocID = doc[0]
-    
-        # run through alignments in this bitext
+    algcur.execute(f"""SELECT rowid,srcIDs,trgIDs,alignType,alignerScore,cleanerScore FROM links
+                       WHERE bitextID={bitextID} AND rowid>{after} ORDER BY rowid""")
+    while True:
+        rows = algcur.fetchmany(buffersize)
+        if not rows:
+            break
+        if not srcSentIndex.complete:
+            srcSentIndex.prefetch([s for row in rows for s in row[1].split(' ') if s])
+        if not trgSentIndex.complete:
+            trgSentIndex.prefetch([t for row in rows for t in row[2].split(' ') if t])
 
-        for row in algDBcur.execute(f"SELECT rowid,srcIDs,trgIDs,alignType,alignerScore,cleanerScore FROM links WHERE bitextID={bitextID}"):
-            count+=1
-            if not count % 5000:
-                sys.stderr.write('.')
-                if not count % 100000:
-                    sys.stderr.write(f" {count}\n")
-                    sys.stderr.flush()
+        srcrows = []
+        trgrows = []
+        linkrows = []
 
+        for row in rows:
             linkID = row[0]
             srcIDs = row[1].split(' ')
             trgIDs = row[2].split(' ')
 
             # get source and target sentence IDs from the sentence indeces
-            # (search for the OPUS IDs in the sentence index DBs)
+            # (search for the OPUS IDs in the document's sentence ID map)
 
             srcSentIDs = []
             trgSentIDs = []
@@ -261,52 +370,320 @@ def copy_links(corpus,version,srclang,trglang):
             for s in srcIDs:
                 if (s):
                     cleanSrcIDs.append(s)
-                    for sent in srcDBcur.execute(f"SELECT id FROM sentids WHERE docID={fromDocID} AND sentID='{s}'"):
-                        sentID = sent[0]
-                        if sentID:
-                            srcbuffer.append(tuple([sentID,linkID,bitextID,corpusID]))
-                            srcSentIDs.append(str(sentID))
+                    sentID = srcSentIndex.get(s)
+                    if sentID:
+                        if not postings:
+                            srcrows.append(tuple([sentID,linkID,bitextID,corpusID]))
+                        srcSentIDs.append(str(sentID))
 
             for t in trgIDs:
                 if (t):
                     cleanTrgIDs.append(t)
-                    for sent in trgDBcur.execute(f"SELECT id FROM sentids WHERE docID={toDocID} AND sentID='{t}'"):
-                        sentID = sent[0]
-                        if sentID:
-                            trgbuffer.append(tuple([sentID,linkID,bitextID,corpusID]))
-                            trgSentIDs.append(str(sentID))
+                    sentID = trgSentIndex.get(t)
+                    if sentID:
+                        if not postings:
+                            trgrows.append(tuple([sentID,linkID,bitextID,corpusID]))
+                        trgSentIDs.append(str(sentID))
 
             if (len(cleanSrcIDs) == len(srcSentIDs)) and ((len(cleanTrgIDs) == len(trgSentIDs))):
-                countBitextLinks+=1
-                
                 srcID = ' '.join(cleanSrcIDs)
                 trgID = ' '.join(cleanTrgIDs)
-                srcSentID = ' '.join(srcSentIDs)
-                trgSentID = ' '.join(trgSentIDs)
+                if binaryIDs:
+                    srcSentID = encode_ids(srcSentIDs)
+                    trgSentID = encode_ids(trgSentIDs)
+                else:
+                    srcSentID = ' '.join(srcSentIDs)
+                    trgSentID = ' '.join(trgSentIDs)
+
+                linkrows.append([linkID,bitextID,srcID,trgID,srcSentID,trgSentID,row[3],row[4],row[5]])
+
+        yield (len(rows), srcrows, trgrows, linkrows, rows[-1][0])
+
+
+## add resolved rows to the insert buffers
 
-                linkbuffer.append([linkID,bitextID,srcID,trgID,srcSentID,trgSentID,row[3],row[4],row[5]])
+count = 0
 
-            if len(srcbuffer) >= buffersize or len(trgbuffer) >= buffersize:
-                insert_links()
+def buffer_links(corpusID, bitextID, nrows, srcrows, trgrows, linkrows, lastID):
+    global count, srcbuffer, trgbuffer, linkbuffer, watermarks
 
+    watermarks[bitextID] = (corpusID, lastID)
+    srcbuffer.extend(srcrows)
+    trgbuffer.extend(trgrows)
+    linkbuffer.extend(linkrows)
+    if linkrows:
+        (first, last) = (linkrows[0][0], linkrows[-1][0])
+        if bitextID in newRanges:
+            first = min(first, newRanges[bitextID][0])
+            last = max(last, newRanges[bitextID][1])
+        newRanges[bitextID] = (first, last)
+    if len(srcbuffer) >= buffersize or len(trgbuffer) >= buffersize or len(linkbuffer) >= buffersize:
         insert_links()
-        if (countBitextLinks):
-            insert_bitext(tuple(bitext))
-            insert_bitext_range(bitextID)
-        else:
-            delete_bitext(bitextID)
 
-        countCorpusLinks += countBitextLinks
+    for i in range(nrows):
+        count+=1
+        if not count % 5000:
+            sys.stderr.write('.')
+            if not count % 100000:
+                sys.stderr.write(f" {count}\n")
+                sys.stderr.flush()
+
+
+## store the bitext and its link ranges (or remove it if there are no links)
+## (links stored in earlier runs are included as well)
+
+def finish_bitext(corpusID, bitext):
+    insert_links()
+    if insert_bitext_range(bitext[0]):
+        insert_bitext(tuple(bitext))
+    else:
+        delete_bitext(bitext[0])
+    linksDBcur.execute("""INSERT INTO watermarks VALUES(?,?,0,1)
+                          ON CONFLICT(bitextID) DO UPDATE SET done=1""", (bitext[0], corpusID))
+    linksDBcon.commit()
+
+
+#----------------------------------------------------------------
+# links of a bitext that have been stored in earlier runs after its last
+# stored block (interrupted runs that have not updated the ranges yet)
+# (the linkID range is restricted to the rowids of the bitext in the
+# alignment DB to avoid a table scan if there is no index on bitextID)
+#----------------------------------------------------------------
+
+storedRanges = {}
+
+def stored_range(bitextID, lastID):
+    global bitextDBcur, linksDBcur
+    blocks = stored_blocks('bitext', bitextID)
+    after = blocks[-1][1] if blocks else 0
+    first = bitextDBcur.execute(f"SELECT MIN(rowid) FROM links WHERE bitextID={bitextID} AND rowid>{after}").fetchone()[0]
+    if first is None:
+        return None
+    rowids = linksDBcur.execute(f"""SELECT MIN(linkID),MAX(linkID) FROM links
+                                    WHERE linkID BETWEEN {first} AND {lastID} AND bitextID={bitextID}""").fetchone()
+    if rowids[0] is None:
+        return None
+    return tuple(rowids)
+
+
+## watermarks for link DBs that have been created before watermarks existed:
+## the last link of each bitext that is stored in the link DB; bitexts with a
+## bitext_range and corpora with a corpus_range have been finished
+
+def init_watermarks():
+    global bitextDBcur, linksDBcon, linksDBcur
+    lastLinks = dict(linksDBcur.execute("SELECT bitextID,MAX(linkID) FROM links GROUP BY bitextID").fetchall())
+    finishedBitexts = set(row[0] for row in linksDBcur.execute("SELECT bitextID FROM bitext_range"))
+    finishedCorpora = set(row[0] for row in linksDBcur.execute("SELECT corpusID FROM corpus_range"))
+    for data in linksDBcur.execute("SELECT corpusID,corpus,version,srclang,trglang FROM corpora").fetchall():
+        (corpusID, corpus, version, srclang, trglang) = data
+        lastBitext = 0
+        lastLink = 0
+        for bitext in bitextDBcur.execute(f"""SELECT rowid FROM bitexts WHERE corpus='{corpus}' AND version='{version}'
+                                              AND fromDoc LIKE '{srclang}/%' AND toDoc LIKE '{trglang}/%'""").fetchall():
+            lastID = lastLinks.get(bitext[0], 0)
+            done = 1 if bitext[0] in finishedBitexts else 0
+            linksDBcur.execute("INSERT OR IGNORE INTO watermarks VALUES(?,?,?,?)", (bitext[0], corpusID, lastID, done))
+            lastBitext = max(lastBitext, bitext[0])
+            lastLink = max(lastLink, lastID)
+        done = 1 if corpusID in finishedCorpora else 0
+        linksDBcur.execute("INSERT OR IGNORE INTO corpus_watermarks VALUES(?,?,?,?)", (corpusID, lastBitext, lastLink, done))
+    linksDBcon.commit()
+
+
+#----------------------------------------------------------------
+# run through all bitexts in a selected corpus (aligned document pairs)
+# and store links that map internal sentence IDs to internal linkIDs
+#
+# only alignments after the watermark of each bitext need to be processed:
+# all of them for new bitexts, the remaining ones for bitexts that have been
+# interrupted and new ones that have been appended to the alignment DB
+#
+# returns the corpus ID, a list of (bitext, fromDocID, toDocID, after) for all
+# bitexts with new alignments that have documents in the sentence indeces
+# and whether there are links from earlier runs
+# (or None if there is nothing to be done for this corpus)
+#----------------------------------------------------------------
+
+def start_corpus(corpus,version,srclang,trglang):
+    global bitextDBcur, linksDBcur, srcDocIndex, trgDocIndex
+
+    corpusID = 0
+    matchCorpus = f"corpus='{corpus}' AND version='{version}'"
+    matchLangs = f"srclang='{srclang}' AND trglang='{trglang}'"
+    matchDocLangs = f"fromDoc LIKE '{srclang}/%' AND toDoc LIKE '{trglang}/%'"
+
+    corpusData = bitextDBcur.execute(f"SELECT rowid,* FROM corpora WHERE {matchCorpus} AND {matchLangs}").fetchall()
+    for data in corpusData:
+        corpusID = data[0]
+
+    processed = {}
+    unfinished = set()
+    for row in linksDBcur.execute(f"SELECT bitextID,linkID,done FROM watermarks WHERE corpusID={corpusID}"):
+        processed[row[0]] = row[1]
+        if not row[2]:
+            unfinished.add(row[0])
+    corpusDone = linksDBcur.execute(f"SELECT done FROM corpus_watermarks WHERE corpusID={corpusID}").fetchone()
+
+    bitexts = []
+    for bitext in bitextDBcur.execute(f"SELECT rowid,* FROM bitexts WHERE {matchCorpus} AND {matchDocLangs} ORDER BY rowid").fetchall():
+    
+        # skip bitexts without new alignments
+
+        bitextID = bitext[0]
+        after = processed.get(bitextID, 0)
+        if bitextID in processed and bitextID not in unfinished:
+            lastID = bitextDBcur.execute(f"SELECT MAX(rowid) FROM links WHERE bitextID={bitextID}").fetchone()[0]
+            if lastID is None or lastID <= after:
+                continue
+
+        # find document IDs (fromDocID and toDocID)
         
+        fromDoc = bitext[3]
+        toDoc = bitext[4]
+
+        # print(f"now doing {bitextID}: {fromDoc}-{toDoc}")    
+        fromDocID = srcDocIndex.get(corpus, version, fromDoc)
+        toDocID = trgDocIndex.get(corpus, version, toDoc)
+
+        # skip bitexts with documents that are not in the sentence index
+
+        if fromDocID is None or toDocID is None:
+            delete_bitext(bitextID)
+            continue
+
+        bitexts.append((bitext,fromDocID,toDocID,after))
+
+    if not bitexts and (corpusDone is None or corpusDone[0]):
+        return None
+
+    ## copy the corpus entry to the new DB
+
+    for data in corpusData:
+        insert_corpus(tuple(data))
+    linksDBcur.execute(f"UPDATE corpus_watermarks SET done=0 WHERE corpusID={corpusID}")
+    linksDBcon.commit()
+
+    ## links from interrupted runs that are not in the stored ranges yet
+
+    storedRanges.clear()
+    for (bitext,fromDocID,toDocID,after) in bitexts:
+        if after:
+            rowids = stored_range(bitext[0], after)
+            if rowids:
+                storedRanges[bitext[0]] = rowids
+
+    return (corpusID, bitexts, corpusDone is not None)
+
+
+## store the corpus ranges (or remove the corpus if there are no links)
+
+def finish_corpus(corpusID,corpus,version,srclang,trglang):
 
     # final insert if necessary (should not be necessary)
     insert_links()
-    if countCorpusLinks:
-        insert_corpus_range(corpusID,corpus,version,srclang,trglang)
+    if insert_corpus_range(corpusID,corpus,version,srclang,trglang):
+        if postings:
+            add_corpus_postings(corpusID)
     else:
         delete_corpus(corpusID)
+    linksDBcur.execute(f"""INSERT INTO corpus_watermarks VALUES({corpusID},0,0,1)
+                           ON CONFLICT(corpusID) DO UPDATE SET done=1""")
+    linksDBcon.commit()
 
 
+def copy_links(corpus,version,srclang,trglang,corpusID,bitexts):
+    global algDBcur, srcDBcur, trgDBcur
+
+    for (bitext,fromDocID,toDocID,after) in bitexts:
+        for (nrows, srcrows, trgrows, linkrows, lastID) in resolve_links(bitext[0],corpusID,fromDocID,toDocID,after,
+                                                                         algDBcur,srcDBcur,trgDBcur):
+            buffer_links(corpusID, bitext[0], nrows, srcrows, trgrows, linkrows, lastID)
+        finish_bitext(corpusID, bitext)
+
+    finish_corpus(corpusID,corpus,version,srclang,trglang)
+
+
+#----------------------------------------------------------------
+# parallel version of copy_links
+#
+# worker processes resolve links for disjoint sets of bitexts and
+# stream their rows through a queue to the main process (the only writer)
+# linkIDs are the rowids of the alignment DB and ranges are computed from
+# the stored links, so the result does not depend on the order of inserts
+#----------------------------------------------------------------
+
+def link_worker(bitexts,corpusID,queue):
+    try:
+        algcon = sqlite3.connect(f"file:{algDB}?immutable=1",uri=True)
+        srccon = sqlite3.connect(f"file:{srcDB}?immutable=1",uri=True)
+        trgcon = sqlite3.connect(f"file:{trgDB}?immutable=1",uri=True)
+        algcur = algcon.cursor()
+        srccur = srccon.cursor()
+        trgcur = trgcon.cursor()
+
+        for (bitext,fromDocID,toDocID,after) in bitexts:
+            for chunk in resolve_links(bitext[0],corpusID,fromDocID,toDocID,after,algcur,srccur,trgcur):
+                queue.put(('links', bitext, chunk))
+            queue.put(('done', bitext, None))
+
+        algcon.close()
+        srccon.close()
+        trgcon.close()
+    except Exception:
+        queue.put(('error', None, traceback.format_exc()))
+    queue.put(None)
+
+
+def copy_links_parallel(corpus,version,srclang,trglang,corpusID,bitexts,workers):
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue(maxsize=4*workers)
+    processes = []
+    for i in range(workers):
+        process = context.Process(target=link_worker, args=(bitexts[i::workers],corpusID,queue))
+        process.start()
+        processes.append(process)
+
+    finished = 0
+    failed = False
+    while finished < workers:
+        try:
+            item = queue.get(timeout=queuetimeout)
+        except Empty:
+            ## a worker that has been killed (out of memory, signal) never sends None
+            dead = [p for p in processes if not p.is_alive() and p.exitcode != 0]
+            if dead:
+                for process in dead:
+                    sys.stderr.write(f"worker {process.pid} died with exit code {process.exitcode}\n")
+                for process in processes:
+                    if process.is_alive():
+                        process.terminate()
+                failed = True
+                break
+            continue
+        if item is None:
+            finished += 1
+            continue
+        (message, bitext, data) = item
+        if message == 'links':
+            (nrows, srcrows, trgrows, linkrows, lastID) = data
+            buffer_links(corpusID, bitext[0], nrows, srcrows, trgrows, linkrows, lastID)
+        elif message == 'done':
+            finish_bitext(corpusID, bitext)
+        elif message == 'error':
+            sys.stderr.write(data)
+            failed = True
+
+    for process in processes:
+        process.join()
+
+    if failed:
+        insert_links()
+        sys.exit(f"failed to process {corpus}/{version}/{srclang}-{trglang}")
+
+    finish_corpus(corpusID,corpus,version,srclang,trglang)
+
 
 
 conditions = []
@@ -328,6 +705,10 @@ if conditions:
 else:
     condition = ''
 
+if newWatermarks:
+    init_watermarks()
+
+timer.start('links')
 corpusDBcur = algDBcon.cursor()
 for bitext in corpusDBcur.execute(f"SELECT DISTINCT corpus,version,srclang,trglang FROM corpora {condition}"):
     
@@ -336,14 +717,27 @@ for bitext in corpusDBcur.execute(f"SELECT DISTINCT corpus,version,srclang,trgla
     srclang = bitext[2]
     trglang = bitext[3]
 
-    linksDBcur.execute(f"""SELECT rowid FROM corpora 
-                           WHERE corpus='{corpus}' AND version='{version}' 
-                           AND srclang='{srclang}' AND trglang='{trglang}'""")
-    if linksDBcur.fetchone():
+    todo = start_corpus(corpus,version,srclang,trglang)
+    if todo is None:
         print(f"already done: {corpus}/{version}/{srclang}-{trglang}")
     else:
-        print(f"processing {corpus}/{version}/{srclang}-{trglang}")
-        copy_links(corpus,version,srclang,trglang)
+        (corpusID, bitexts, stored) = todo
+        if stored:
+            print(f"updating {corpus}/{version}/{srclang}-{trglang} ({len(bitexts)} bitexts)")
+        else:
+            print(f"processing {corpus}/{version}/{srclang}-{trglang}")
+        if args.workers > 1:
+            copy_links_parallel(corpus,version,srclang,trglang,corpusID,bitexts,args.workers)
+        else:
+            copy_links(corpus,version,srclang,trglang,corpusID,bitexts)
+
+if bulk:
+    timer.start('indexes')
+    create_indexes(linksDBcon, indexes, {'idx_links': DELETE_DUPLICATE_LINKS})
+
+srcDocIndex.report()
+trgDocIndex.report()
+timer.report()
 
 linksDBcon.close()
 algDBcon.close()
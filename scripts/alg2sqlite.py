@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
 #
 # USAGE: alg2sqlite.py -d dbname -c corpus -v version [-r] < xces-align-file
+#
+# bitext IDs are assigned from an in-memory map that is seeded from the existing
+# bitexts table and bitexts and links are inserted together in large transactions
+# re-running the same file after a failure does not create duplicates
 
 
 import argparse
 import sys
+import time
 import xml.parsers.expat
 import sqlite3
 
+from xmlstream import parse
+
 
 parser = argparse.ArgumentParser(prog='alg2sqlite',
                                  description='Insert sentence alignments into an SQLite database')
@@ -15,6 +22,10 @@ parser.add_argument("-d", "--database", type=str, required=True, help="name of t
 parser.add_argument("-c", "--corpus", type=str, required=True, help="name of the OPUS corpus")
 parser.add_argument("-v", "--version", type=str, required=True, help="release of the corpus")
 parser.add_argument("-r", "--reverse", action='store_true', help='reverse alignment direction')
+parser.add_argument("-i", "--commit-interval", type=int, default=1000000,
+                    help="number of links to be inserted per transaction (default: 1000000)")
+parser.add_argument("-S", "--synchronous-off", action='store_true',
+                    help="set PRAGMA synchronous=OFF during the bulk load (faster but unsafe on system crashes)")
 
 args = parser.parse_args()
 
@@ -54,6 +65,8 @@ cur.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_corpora ON corpora (corpus,
                                                                          srclang3,trglang3,latest)""")
 cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_release ON corpora (corpus,version,srclang,trglang)")
 cur.execute("PRAGMA journal_mode=WAL")
+if args.synchronous_off:
+    cur.execute("PRAGMA synchronous=OFF")
 
 
 
@@ -96,43 +109,67 @@ toDoc = ''
 bitextID = 0
 
 
-## global buffer for mass-inserting links
+## map of bitexts in this corpus release to their bitext IDs
+## (seeded from the DB, new bitexts get the next free rowid)
+
+bitextIDs = {}
+for row in cur.execute("SELECT rowid,fromDoc,toDoc FROM bitexts WHERE corpus=? AND version=?", (corpus, version)):
+    bitextIDs[(row[1],row[2])] = row[0]
+
+cur.execute("SELECT MAX(rowid) FROM bitexts")
+maxID = cur.fetchone()[0]
+nextBitextID = maxID + 1 if maxID else 1
+
 
+## global buffers for mass-inserting bitexts and links
+
+bitextbuffer = []
 buffer = []
 buffersize = 100000
 bufferCount = 0
+commitInterval = args.commit_interval
+uncommitted = 0
+linkCount = 0
+startTime = time.time()
 
 
 ## function to insert the current data buffer
+## (commit only after commitInterval links)
 
-def insert_buffer():
+def insert_buffer(commit=False):
     global con, cur
-    global buffer, bufferCount
-    
+    global buffer, bitextbuffer, bufferCount, uncommitted, linkCount
+
+    if len(bitextbuffer) > 0:
+        cur.executemany("""INSERT OR IGNORE INTO bitexts(rowid,corpus,version,fromDoc,toDoc) VALUES(?,?,?,?,?)""",
+                        bitextbuffer)
+        bitextbuffer = []
+
     if len(buffer) > 0:
         cur.executemany("""INSERT OR IGNORE INTO links VALUES(?,?,?,?,?,?)""", buffer)
-        con.commit()
+        uncommitted += len(buffer)
+        linkCount += len(buffer)
         buffer = []
-        
+
         bufferCount += 1
         sys.stderr.write('.')
         if not bufferCount % 100:
-            sys.stderr.write(f" {bufferCount} buffers ({buffersize})\n")
+            elapsed = time.time() - startTime
+            sys.stderr.write(f" {bufferCount} buffers ({buffersize}) - {linkCount/elapsed:.0f} links/s\n")
         sys.stderr.flush()
 
+    if commit or uncommitted >= commitInterval:
+        con.commit()
+        uncommitted = 0
+
 
 ## XML parser handles
         
-def end_element(name):
-    if name == 'linkGrp':
-        insert_buffer()
-
 def start_element(name, attrs):
     global bitextID, corpus, version, fromDoc, toDoc
-    global buffer
+    global buffer, bitextbuffer, bitextIDs, nextBitextID
     
     if name == 'linkGrp':
-        insert_buffer()
         if 'fromDoc' in attrs:
             fromDoc = attrs['fromDoc'].replace('.xml.gz','.xml')
             if 'toDoc' in attrs:
@@ -143,15 +180,14 @@ def start_element(name, attrs):
                     tmp = fromDoc
                     fromDoc = toDoc
                     toDoc = tmp
-                    
-                cur.execute(f"""INSERT OR IGNORE INTO bitexts(corpus,version,fromDoc,toDoc) 
-                                       VALUES ('{corpus}','{version}','{fromDoc}','{toDoc}')""")
-                con.commit()
-                cur.execute(f"""SELECT rowid FROM bitexts
-			        WHERE corpus='{corpus}' AND version='{version}' AND
-                                      fromDoc='{fromDoc}' AND toDoc='{toDoc}'""")
-                row = cur.fetchone()
-                bitextID = row[0]
+
+                if (fromDoc,toDoc) in bitextIDs:
+                    bitextID = bitextIDs[(fromDoc,toDoc)]
+                else:
+                    bitextID = nextBitextID
+                    nextBitextID += 1
+                    bitextIDs[(fromDoc,toDoc)] = bitextID
+                    bitextbuffer.append(tuple([bitextID,corpus,version,fromDoc,toDoc]))
         
     elif name == 'link':
         if 'xtargets' in attrs:
@@ -194,18 +230,16 @@ def start_element(name, attrs):
 
 parser = xml.parsers.expat.ParserCreate()
 parser.StartElementHandler = start_element
-parser.EndElementHandler   = end_element
 
-errorCount = 0;
-for line in sys.stdin:
-    try:
-        parser.Parse(line)
-    except:
-        errorCount+=1
-        # sys.stderr.write("x")
+errorCount = parse(parser, sys.stdin.buffer, 'stdin')
 
+insert_buffer(commit=True)
 con.close()
+
+elapsed = time.time() - startTime
+sys.stderr.write(f"\n{linkCount} links processed in {elapsed:.1f} seconds ({linkCount/max(elapsed,0.001):.0f} links/s)\n")
+
 if errorCount:
-    print(f"Could not parse {errorCount} lines")
-    print(sys.argv)
+    sys.stderr.write("Could not parse the complete alignment file\n")
+    sys.stderr.write(f"{sys.argv}\n")
     
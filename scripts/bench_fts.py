@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#
+# compare the default FTS5 tokenizer (FTS5(sentence) as in older xxx.fts5.db files)
+# with the language-dependent tokenizers of sent2fts.py for synthetic sentences
+# of each language class in terms of index size, query latency and results
+#
+#   default:     words separated by spaces, with diacritics
+#   diacritics:  words separated by spaces, diacritics distinguish words (tones)
+#   trigram:     no spaces between words (CJK, Thai)
+#
+# the expected number of hits is counted in Python (sentences that contain
+# the query word, ignoring diacritics in the default class)
+#
+# USAGE: bench_fts.py [-n sentences] [-q queries] [-w workdir]
+
+
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import unicodedata
+
+from sent2fts import TOKENIZERS, FTS5_DEFAULT_TOKENIZER, search
+
+
+parser = argparse.ArgumentParser(prog='bench_fts',
+                                 description='compare FTS5 tokenizers per language class')
+parser.add_argument("-n", "--sentences", type=int, default=100000, help="number of sentences per language class")
+parser.add_argument("-q", "--queries", type=int, default=500, help="number of queries per language class")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic DBs (default: temporary)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='bench_fts_')
+sent2fts = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sent2fts.py')
+
+
+def strip_diacritics(text):
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+
+
+##----------------------------------------------------------------
+## synthetic vocabularies per language class
+##----------------------------------------------------------------
+
+rnd = random.Random(42)
+
+def latin_word():
+    word = ''.join(rnd.choice('abcdefghijklmnoprstuvz') for i in range(rnd.randint(3, 8)))
+    if rnd.random() < 0.3:
+        i = rnd.randrange(len(word))
+        word = word[:i] + rnd.choice('éèêëáàâäóòôöúùüíïçñ') + word[i+1:]
+    return word
+
+def tonal_word():
+    return rnd.choice('bcdghklmnst') + rnd.choice('aàáảãạăằắâầấeèéêềếoòóôồốơờớuùúưừứiìí') + rnd.choice(['', 'n', 'ng', 'nh', 't', 'c'])
+
+def cjk_word():
+    return ''.join(chr(rnd.randint(0x4e00, 0x4fff)) for i in range(rnd.choice((2, 2, 3, 4))))
+
+CLASSES = {'default':    ('fra', [latin_word() for i in range(5000)], ' '),
+           'diacritics': ('vie', [tonal_word() for i in range(3000)], ' '),
+           'trigram':    ('zho', [cjk_word() for i in range(5000)], '')}
+
+
+def expected_hits(sentences, queries, langclass, separator):
+    if langclass == 'trigram':
+        return sum(1 for q in queries for s in sentences if q in s)
+    if langclass == 'default':
+        sentences = [strip_diacritics(s) for s in sentences]
+        queries = [strip_diacritics(q) for q in queries]
+    counts = {}
+    for s in sentences:
+        for word in set(s.split(separator)):
+            counts[word] = counts.get(word, 0) + 1
+    return sum(counts.get(q, 0) for q in queries)
+
+
+print(f"{'class':11s} {'tokenizer':30s} {'size':>10s} {'ms/query':>9s} {'hits':>8s} {'expected':>9s}")
+for langclass in CLASSES:
+    (language, words, separator) = CLASSES[langclass]
+    sentDB = f"{workdir}/{language}.db"
+    if os.path.exists(sentDB):
+        os.unlink(sentDB)
+    sentences = [separator.join(rnd.choice(words) for i in range(rnd.randint(4, 15))) for n in range(args.sentences)]
+    con = sqlite3.connect(sentDB)
+    con.execute("CREATE TABLE IF NOT EXISTS sentences ( sentence TEXT UNIQUE PRIMARY KEY NOT NULL )")
+    con.executemany("INSERT OR IGNORE INTO sentences VALUES (?)", [tuple([s]) for s in sentences])
+    con.commit()
+    sentences = [row[0] for row in con.execute("SELECT sentence FROM sentences")]
+    con.close()
+
+    queries = [rnd.choice(words) for i in range(args.queries)]
+    expected = expected_hits(sentences, queries, langclass, separator)
+
+    for tokenizer in (FTS5_DEFAULT_TOKENIZER, TOKENIZERS[langclass]):
+        ftsDB = f"{workdir}/{language}.{tokenizer.split()[0]}.fts5.db"
+        if os.path.exists(ftsDB):
+            os.unlink(ftsDB)
+        subprocess.run([sys.executable, sent2fts, '-k', tokenizer, sentDB, ftsDB],
+                       check=True, stderr=subprocess.DEVNULL)
+        con = sqlite3.connect(f"file:{ftsDB}?immutable=1", uri=True)
+        hits = 0
+        start = time.perf_counter()
+        for q in queries:
+            hits += len(search(con, q, tokenizer))
+        elapsed = time.perf_counter() - start
+        con.close()
+        print(f"{langclass:11s} {tokenizer:30s} {os.path.getsize(ftsDB):10d} "
+              f"{1000*elapsed/len(queries):9.3f} {hits:8d} {expected:9d}")
+        if langclass == 'trigram' and tokenizer == FTS5_DEFAULT_TOKENIZER:
+            ## substring search is the only way to find words in unsegmented text
+            con = sqlite3.connect(f"file:{ftsDB}?immutable=1", uri=True)
+            hits = 0
+            start = time.perf_counter()
+            for q in queries:
+                hits += len(con.execute("SELECT rowid FROM sentences WHERE sentence LIKE ?", (f"%{q}%",)).fetchall())
+            elapsed = time.perf_counter() - start
+            con.close()
+            print(f"{langclass:11s} {tokenizer + ' (LIKE scan)':30s} {'':10s} "
+                  f"{1000*elapsed/len(queries):9.3f} {hits:8d} {expected:9d}")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+#
+# load test for indexserver.py with a synthetic corpus: concurrent HTTP clients
+# send a mix of requests (sentences, links, search, bitext pages) and the
+# latency percentiles are measured on the client side for
+#
+#   pooled:  the service with pooled connections and batched sentence lookups
+#   cold:    the same service opening a new connection for each query
+#            (like reading the DB files directly for each request)
+#   cached:  pooled connections and an LRU query cache (querycache.py)
+#
+# sentence IDs are drawn from a skewed distribution (--skew) to simulate
+# popular sentences that are requested again and again
+#
+# USAGE: bench_indexserver.py [-d documents] [-n sentences] [-r requests] [-k clients] [-s skew] [-w workdir]
+
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_opus import create_corpus, WORDS
+from indexserver import IndexService, serve
+from querycache import QueryCache
+
+
+parser = argparse.ArgumentParser(prog='bench_indexserver', description='load test for indexserver.py')
+parser.add_argument("-c", "--corpora", type=int, default=2, help="number of synthetic corpora")
+parser.add_argument("-d", "--documents", type=int, default=50, help="number of documents per corpus")
+parser.add_argument("-n", "--sentences", type=int, default=500, help="number of sentences per document")
+parser.add_argument("-r", "--requests", type=int, default=5000, help="number of requests")
+parser.add_argument("-k", "--clients", type=int, default=16, help="number of concurrent clients")
+parser.add_argument("-s", "--skew", type=float, default=1.2, help="Pareto shape of sentence ID popularity")
+parser.add_argument("-C", "--cache-size", type=int, default=100000, help="number of cached results")
+parser.add_argument("-t", "--threads", type=int, default=8, help="number of threads in the service")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic DBs (default: temporary)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='bench_indexserver_')
+linkdir = os.path.join(workdir, 'linkdb')
+scripts = os.path.dirname(os.path.abspath(__file__))
+
+sys.stderr.write(f"creating synthetic corpus in {workdir}\n")
+files = create_corpus(workdir, corpora=args.corpora, documents=args.documents, sentences=args.sentences)
+os.makedirs(linkdir, exist_ok=True)
+for dbfile in (os.path.join(linkdir, 'eng-fin.db'), os.path.join(workdir, 'eng.fts5.db')):
+    if os.path.exists(dbfile):
+        os.unlink(dbfile)
+subprocess.run([sys.executable, os.path.join(scripts, 'alg2links.py'), '-a', files['algdb'], '-s', files['srcids'],
+                '-t', files['trgids'], '-l', os.path.join(linkdir, 'eng-fin.db')],
+               check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+subprocess.run([sys.executable, os.path.join(scripts, 'sent2fts.py'), files['srcdb'], os.path.join(workdir, 'eng.fts5.db')],
+               check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+con = sqlite3.connect(files['srcdb'])
+maxID = con.execute("SELECT MAX(rowid) FROM sentences").fetchone()[0]
+con.close()
+con = sqlite3.connect(os.path.join(linkdir, 'eng-fin.db'))
+maxLink = con.execute("SELECT MAX(linkID) FROM links").fetchone()[0]
+con.close()
+
+rnd = random.Random(42)
+
+def sentence_id():
+    return min(maxID, int(rnd.paretovariate(args.skew)))
+
+requests = []
+for i in range(args.requests):
+    kind = rnd.choice(['sentences', 'sentences', 'links', 'search', 'bitext'])
+    if kind == 'sentences':
+        params = f"lang=eng&ids={','.join(str(sentence_id()) for j in range(10))}"
+    elif kind == 'links':
+        params = f"langpair=eng-fin&ids={','.join(str(sentence_id()) for j in range(5))}"
+    elif kind == 'search':
+        params = f"lang=eng&q={rnd.choice(WORDS)}+{rnd.choice(WORDS)}&limit=10"
+    else:
+        params = f"langpair=eng-fin&offset={rnd.randint(0, maxLink)}&size=20"
+    requests.append((kind, f"/{kind}?{params}"))
+
+
+## the service opening a new connection for each query
+
+class ColdService(IndexService):
+
+    def call(self, filename, version, function, *args):
+        self.pool(filename, version)
+        con = sqlite3.connect(f"file:{filename}?immutable=1", uri=True, check_same_thread=False)
+        try:
+            return function(con, *args)
+        finally:
+            con.close()
+
+
+async def client(port, queue, latencies, results):
+    (reader, writer) = await asyncio.open_connection('127.0.0.1', port)
+    while not queue.empty():
+        (kind, target) = queue.get_nowait()
+        started = time.perf_counter()
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode('latin-1'))
+        await writer.drain()
+        status = (await reader.readline()).split()[1]
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b'\r\n':
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        body = await reader.readexactly(length)
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        results[target] = (status, body)
+    writer.close()
+
+
+async def run(service):
+    server = await asyncio.start_server(serve(service), '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies = {}
+    results = {}
+    started = time.perf_counter()
+    await asyncio.gather(*[client(port, queue, latencies, results) for i in range(args.clients)])
+    elapsed = time.perf_counter() - started
+    server.close()
+    await server.wait_closed()
+    return (elapsed, latencies, results)
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return 1000 * samples[int(p * (len(samples) - 1))]
+
+
+reference = None
+print(f"{'service':8s} {'endpoint':10s} {'requests':>9s} {'p50 ms':>9s} {'p99 ms':>9s}")
+for (name, serviceClass, cache) in (('pooled', IndexService, None), ('cold', ColdService, None),
+                                    ('cached', IndexService, QueryCache(args.cache_size))):
+    service = serviceClass(workdir, linkdir, workers=args.threads, connections=args.threads, cache=cache)
+    (elapsed, latencies, results) = asyncio.run(run(service))
+    service.close()
+    if reference is None:
+        reference = results
+    for kind in sorted(latencies):
+        print(f"{name:8s} {kind:10s} {len(latencies[kind]):9d} "
+              f"{percentile(latencies[kind], 0.5):9.2f} {percentile(latencies[kind], 0.99):9.2f}")
+    errors = sum(1 for (status, body) in results.values() if status != b'200')
+    print(f"{name:8s} {'all':10s} {len(requests):9d} {len(requests)/elapsed:9.0f} requests/s  "
+          f"errors {errors}  {'ok' if results == reference else 'MISMATCH'}")
+    if cache:
+        for (query, counts) in cache.stats()['queries'].items():
+            print(f"{name:8s} {query:20s} hits {counts['hits']:8d} misses {counts['misses']:8d} "
+                  f"hit rate {100*counts['hitrate']:5.1f}%")
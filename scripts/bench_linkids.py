@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#
+# compare link DBs with text and binary sentence IDs (alg2links.py -b)
+# in terms of file size and the time to read and decode all sentence IDs
+#
+# USAGE: bench_linkids.py [-d documents] [-n sentences] [-o rowid-offset] [-w workdir]
+
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_opus import create_corpus
+from linkids import decode_ids
+
+
+parser = argparse.ArgumentParser(prog='bench_linkids',
+                                 description='compare text and binary sentence IDs in link DBs')
+parser.add_argument("-c", "--corpora", type=int, default=2, help="number of synthetic corpora")
+parser.add_argument("-d", "--documents", type=int, default=50, help="number of documents per corpus")
+parser.add_argument("-n", "--sentences", type=int, default=1000, help="number of sentences per document")
+parser.add_argument("-o", "--rowid-offset", type=int, default=100000000,
+                    help="offset of sentence rowids (to simulate large sentence DBs)")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic DBs (default: temporary)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='bench_linkids_')
+sys.stderr.write(f"creating synthetic corpus in {workdir}\n")
+files = create_corpus(workdir, corpora=args.corpora, documents=args.documents,
+                      sentences=args.sentences, rowid_offset=args.rowid_offset)
+
+alg2links = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alg2links.py')
+
+
+def build(linkDB, options):
+    if os.path.exists(linkDB):
+        os.unlink(linkDB)
+    subprocess.run([sys.executable, alg2links, '-a', files['algdb'], '-s', files['srcids'],
+                    '-t', files['trgids'], '-l', linkDB] + options,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    con = sqlite3.connect(linkDB)
+    con.execute("VACUUM")
+    con.close()
+
+
+def read_all(linkDB):
+    con = sqlite3.connect(f"file:{linkDB}?immutable=1", uri=True)
+    start = time.perf_counter()
+    count = 0
+    for row in con.execute("SELECT srcSentIDs,trgSentIDs FROM links"):
+        count += len(decode_ids(row[0])) + len(decode_ids(row[1]))
+    elapsed = time.perf_counter() - start
+    columns = con.execute("SELECT SUM(LENGTH(srcSentIDs)+LENGTH(trgSentIDs)) FROM links").fetchone()[0]
+    con.close()
+    return (count, elapsed, columns)
+
+
+results = {}
+for (name, options) in (('text', []), ('binary', ['-b'])):
+    linkDB = f"{workdir}/links.{name}.db"
+    build(linkDB, options)
+    (count, elapsed, columns) = read_all(linkDB)
+    results[name] = (os.path.getsize(linkDB), columns, count, elapsed)
+
+(textSize, textColumns, textCount, textTime) = results['text']
+print(f"{'format':8s} {'file size':>12s} {'sentID bytes':>13s} {'decode time':>12s}")
+for name in results:
+    (size, columns, count, elapsed) = results[name]
+    print(f"{name:8s} {size:12d} {columns:13d} {elapsed:11.3f}s"
+          f"  ({100*size/textSize:.1f}% file size, {100*columns/textColumns:.1f}% sentID bytes)")
+if results['binary'][2] != textCount:
+    print("MISMATCH in number of decoded sentence IDs")
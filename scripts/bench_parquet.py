@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#
+# compare aggregate queries on a link DB with the same queries on its Parquet
+# export (linkdb2parquet.py, requires pyarrow) for a synthetic corpus
+#
+#   python:   scanning the SQLite rows in Python (as done in the scripts so far)
+#   sqlite:   aggregation in SQL (GROUP BY)
+#   parquet:  vectorized aggregation with pyarrow.compute on the Parquet dataset
+#
+# queries: links per alignType, histogram of alignerScore (10 bins) and
+#          coverage per corpus (number of distinct source sentences)
+#
+# USAGE: bench_parquet.py [-c corpora] [-d documents] [-n sentences] [-r repeat] [-w workdir]
+
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_opus import create_corpus
+from linkids import decode_ids
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    sys.exit("bench_parquet.py needs pyarrow (pip install pyarrow)")
+
+import sqlite3
+
+
+parser = argparse.ArgumentParser(prog='bench_parquet', description='compare aggregate queries on SQLite and Parquet')
+parser.add_argument("-c", "--corpora", type=int, default=4, help="number of synthetic corpora")
+parser.add_argument("-d", "--documents", type=int, default=50, help="number of documents per corpus")
+parser.add_argument("-n", "--sentences", type=int, default=1000, help="number of sentences per document")
+parser.add_argument("-r", "--repeat", type=int, default=3, help="number of runs per query (best time is reported)")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic DBs (default: temporary)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='bench_parquet_')
+scripts = os.path.dirname(os.path.abspath(__file__))
+linkDB = os.path.join(workdir, 'eng-fin.links.db')
+parquetDir = os.path.join(workdir, 'eng-fin.parquet')
+
+if not os.path.exists(linkDB):
+    sys.stderr.write(f"creating synthetic corpus in {workdir}\n")
+    files = create_corpus(workdir, corpora=args.corpora, documents=args.documents, sentences=args.sentences)
+    subprocess.run([sys.executable, os.path.join(scripts, 'alg2links.py'), '-a', files['algdb'], '-s', files['srcids'],
+                    '-t', files['trgids'], '-l', linkDB],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+if not os.path.exists(parquetDir):
+    subprocess.run([sys.executable, os.path.join(scripts, 'linkdb2parquet.py'), linkDB, parquetDir],
+                   check=True, stderr=subprocess.DEVNULL)
+
+con = sqlite3.connect(f"file:{linkDB}?immutable=1", uri=True)
+partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+links = ds.dataset(os.path.join(parquetDir, 'links'), format='parquet', partitioning=partitioning)
+linkedsource = ds.dataset(os.path.join(parquetDir, 'linkedsource'), format='parquet', partitioning=partitioning)
+
+
+## links per alignType
+
+def aligntype_python():
+    counts = {}
+    for (alignType,) in con.execute("SELECT alignType FROM links"):
+        counts[alignType] = counts.get(alignType, 0) + 1
+    return counts
+
+def aligntype_sqlite():
+    return dict(con.execute("SELECT alignType,COUNT(*) FROM links GROUP BY alignType"))
+
+def aligntype_parquet():
+    table = links.to_table(columns=['alignType']).unify_dictionaries()
+    table = table.group_by('alignType').aggregate([('alignType', 'count')])
+    return dict(zip(table['alignType'].to_pylist(), table['alignType_count'].to_pylist()))
+
+
+## histogram of aligner scores (10 bins, scores of 1.0 in the last bin)
+
+def histogram_python():
+    counts = {}
+    for (score,) in con.execute("SELECT alignerScore FROM links WHERE alignerScore IS NOT NULL"):
+        b = min(int(score * 10), 9)
+        counts[b] = counts.get(b, 0) + 1
+    return counts
+
+def histogram_sqlite():
+    return dict(con.execute("""SELECT MIN(CAST(alignerScore * 10 AS INTEGER), 9) AS b,COUNT(*) FROM links
+                               WHERE alignerScore IS NOT NULL GROUP BY b"""))
+
+def histogram_parquet():
+    scores = links.to_table(columns=['alignerScore'])['alignerScore'].drop_null()
+    bins = pc.min_element_wise(pc.cast(pc.floor(pc.multiply(scores, 10)), 'int64'), 9)
+    counts = pc.value_counts(bins)
+    return dict(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()))
+
+
+## coverage: distinct source sentences per corpus
+
+def coverage_python():
+    sentences = {}
+    for (corpus, srcSentIDs) in con.execute("""SELECT corpus,srcSentIDs FROM links
+                                               INNER JOIN bitexts USING (bitextID)"""):
+        sentences.setdefault(corpus, set()).update(decode_ids(srcSentIDs))
+    return {corpus: len(sentences[corpus]) for corpus in sentences}
+
+def coverage_sqlite():
+    return dict(con.execute("""SELECT corpus,COUNT(DISTINCT sentID) FROM linkedsource
+                               INNER JOIN corpora USING (corpusID) GROUP BY corpus"""))
+
+def coverage_parquet():
+    table = linkedsource.to_table(columns=['corpus', 'sentID']).unify_dictionaries()
+    table = table.group_by('corpus').aggregate([('sentID', 'count_distinct')])
+    return dict(zip(table['corpus'].to_pylist(), table['sentID_count_distinct'].to_pylist()))
+
+
+def best_time(function):
+    best = None
+    for i in range(args.repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return (best, result)
+
+
+nrLinks = con.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+parquetSize = sum(os.path.getsize(os.path.join(d, f)) for (d, subdirs, files) in os.walk(parquetDir) for f in files)
+print(f"{nrLinks} links, {os.path.getsize(linkDB)} bytes in SQLite, {parquetSize} bytes in Parquet")
+print()
+print(f"{'query':10s} {'method':8s} {'seconds':>9s} {'speedup':>8s}")
+for query in ('aligntype', 'histogram', 'coverage'):
+    reference = None
+    for method in ('python', 'sqlite', 'parquet'):
+        (elapsed, result) = best_time(globals()[f"{query}_{method}"])
+        if reference is None:
+            (reference, baseline) = (result, elapsed)
+        status = 'ok' if result == reference else 'MISMATCH'
+        print(f"{query:10s} {method:8s} {elapsed:9.4f} {baseline/elapsed:7.1f}x  {status}")
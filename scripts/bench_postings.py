@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+# compare linkedsource (one row per sentence and link) with sentence-to-link
+# postings (linkpostings.py) in terms of file size and lookup speed
+#
+#   linked:   SELECT linkID FROM linkedsource WHERE sentID=? (idx_linkedsource_sentid)
+#             and WHERE corpusID=? AND sentID=? for restricted lookups
+#   postings: linkpostings.LinkPostings.lookup
+#
+# USAGE: bench_postings.py [-d documents] [-n sentences] [-q queries] [-w workdir]
+
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_opus import create_corpus
+from linkpostings import add_postings, LinkPostings
+
+
+parser = argparse.ArgumentParser(prog='bench_postings',
+                                 description='compare linkedsource tables with sentence-to-link postings')
+parser.add_argument("-c", "--corpora", type=int, default=2, help="number of synthetic corpora")
+parser.add_argument("-d", "--documents", type=int, default=50, help="number of documents per corpus")
+parser.add_argument("-n", "--sentences", type=int, default=1000, help="number of sentences per document")
+parser.add_argument("-q", "--queries", type=int, default=20000, help="number of lookups")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic DBs (default: temporary)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='bench_postings_')
+sys.stderr.write(f"creating synthetic corpus in {workdir}\n")
+files = create_corpus(workdir, corpora=args.corpora, documents=args.documents, sentences=args.sentences)
+
+alg2links = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alg2links.py')
+linkedDB = f"{workdir}/links.linked.db"
+postingsDB = f"{workdir}/links.postings.db"
+
+for dbfile in (linkedDB, postingsDB):
+    if os.path.exists(dbfile):
+        os.unlink(dbfile)
+subprocess.run([sys.executable, alg2links, '-a', files['algdb'], '-s', files['srcids'],
+                '-t', files['trgids'], '-l', linkedDB],
+               check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+shutil.copyfile(linkedDB, postingsDB)
+con = sqlite3.connect(postingsDB)
+start = time.perf_counter()
+add_postings(con)
+buildTime = time.perf_counter() - start
+con.execute("DROP TABLE linkedsource")
+con.execute("DROP TABLE linkedtarget")
+con.commit()
+con.execute("VACUUM")
+con.close()
+
+con = sqlite3.connect(linkedDB)
+con.execute("VACUUM")
+con.close()
+
+
+linkedCon = sqlite3.connect(f"file:{linkedDB}?immutable=1", uri=True)
+postingsCon = sqlite3.connect(f"file:{postingsDB}?immutable=1", uri=True)
+
+sentIDs = [row[0] for row in linkedCon.execute("SELECT DISTINCT sentID FROM linkedsource")]
+corpusIDs = [row[0] for row in linkedCon.execute("SELECT corpusID FROM corpora")]
+rnd = random.Random(42)
+queries = [(rnd.choice(sentIDs), rnd.choice(corpusIDs)) for i in range(args.queries)]
+
+
+def lookup_linked(restricted):
+    cur = linkedCon.cursor()
+    result = []
+    for (sentID, corpusID) in queries:
+        if restricted:
+            cur.execute("SELECT linkID FROM linkedsource WHERE corpusID=? AND sentID=? ORDER BY linkID",
+                        (corpusID, sentID))
+        else:
+            cur.execute("SELECT linkID FROM linkedsource WHERE sentID=? ORDER BY linkID", (sentID,))
+        result.append([row[0] for row in cur])
+    return result
+
+def lookup_postings(restricted):
+    index = LinkPostings(postingsCon)
+    result = []
+    for (sentID, corpusID) in queries:
+        result.append(index.lookup(sentID, 'source', corpusID if restricted else None))
+    return result
+
+
+print(f"{'layout':10s} {'file size':>12s}")
+print(f"{'linked':10s} {os.path.getsize(linkedDB):12d}")
+print(f"{'postings':10s} {os.path.getsize(postingsDB):12d}  "
+      f"({100*os.path.getsize(postingsDB)/os.path.getsize(linkedDB):.1f}%, built in {buildTime:.3f}s)")
+print()
+
+for restricted in (False, True):
+    reference = None
+    for name, function in (('linked', lookup_linked), ('postings', lookup_postings)):
+        start = time.perf_counter()
+        result = function(restricted)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = result
+            baseline = elapsed
+        status = 'ok' if result == reference else 'MISMATCH'
+        label = f"{name} ({'by corpus' if restricted else 'all'})"
+        print(f"{label:22s} {elapsed:8.3f}s {len(queries)/elapsed:10.0f} lookups/s  "
+              f"speedup {baseline/elapsed:5.1f}x  {status}")
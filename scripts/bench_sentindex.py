@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+# benchmark sentence ID resolution strategies used for building link DBs
+#
+#   select:   one SELECT per OPUS sentence ID (the old way in alg2links.py)
+#   document: load all sentence IDs of a document into memory (sentindex.load_sentids)
+#   chunked:  batched IN-queries per chunk of links (sentindex.lookup_sentids)
+#
+# USAGE: bench_sentindex.py [-d documents] [-n sentences] [-w workdir]
+
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+
+from synthetic_opus import create_corpus
+from sentindex import DocumentSentids
+
+
+parser = argparse.ArgumentParser(prog='bench_sentindex',
+                                 description='benchmark sentence ID lookup for link DB builds')
+parser.add_argument("-c", "--corpora", type=int, default=1, help="number of synthetic corpora")
+parser.add_argument("-d", "--documents", type=int, default=50, help="number of documents per corpus")
+parser.add_argument("-n", "--sentences", type=int, default=1000, help="number of sentences per document")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic DBs (default: temporary)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='bench_sentindex_')
+sys.stderr.write(f"creating synthetic corpus in {workdir}\n")
+files = create_corpus(workdir, corpora=args.corpora, documents=args.documents, sentences=args.sentences)
+
+algDBcon = sqlite3.connect(f"file:{files['algdb']}?immutable=1", uri=True)
+srcDBcon = sqlite3.connect(f"file:{files['srcids']}?immutable=1", uri=True)
+srcDBcur = srcDBcon.cursor()
+
+## all bitexts with their source document IDs and all source sentence IDs in links
+
+bitexts = []
+for bitext in algDBcon.execute("SELECT rowid,corpus,version,fromDoc FROM bitexts").fetchall():
+    docID = srcDBcur.execute("SELECT rowid FROM documents WHERE corpus=? AND version=? AND document=?",
+                             bitext[1:]).fetchone()[0]
+    ids = [s for row in algDBcon.execute("SELECT srcIDs FROM links WHERE bitextID=?", (bitext[0],))
+           for s in row[0].split(' ') if s]
+    bitexts.append((docID, ids))
+
+
+def resolve_select():
+    resolved = []
+    for docID, ids in bitexts:
+        for s in ids:
+            for sent in srcDBcur.execute(f"SELECT id FROM sentids WHERE docID={docID} AND sentID='{s}'"):
+                resolved.append(sent[0])
+    return resolved
+
+def resolve_document():
+    resolved = []
+    for docID, ids in bitexts:
+        index = DocumentSentids(srcDBcur, docID)
+        for s in ids:
+            resolved.append(index.get(s))
+    return resolved
+
+def resolve_chunked():
+    resolved = []
+    for docID, ids in bitexts:
+        index = DocumentSentids(srcDBcur, docID, maxsize=1)
+        index.prefetch(ids)
+        for s in ids:
+            resolved.append(index.get(s))
+    return resolved
+
+
+nrIDs = sum(len(ids) for docID, ids in bitexts)
+print(f"{len(bitexts)} bitexts, {nrIDs} source sentence IDs")
+
+reference = None
+for name, function in (('select', resolve_select), ('document', resolve_document), ('chunked', resolve_chunked)):
+    start = time.perf_counter()
+    resolved = function()
+    elapsed = time.perf_counter() - start
+    if reference is None:
+        reference = resolved
+        baseline = elapsed
+    status = 'ok' if resolved == reference else 'MISMATCH'
+    print(f"{name:10s} {elapsed:8.3f}s {nrIDs/elapsed:12.0f} IDs/s  speedup {baseline/elapsed:6.1f}x  {status}")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#
+# compare sentence retrieval from a sentence DB with the memory-mapped
+# sentence store (sentstore.py) for random batches of rowids
+#
+#   point:     SELECT sentence FROM sentences WHERE rowid=? (one query per sentence)
+#   batch:     SELECT rowid,sentence FROM sentences WHERE rowid IN (...)
+#   sentstore: SentenceStore.get_many
+#
+# USAGE: bench_sentstore.py [-n sentences] [-b batchsize] [-q batches] [-w workdir]
+
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sentstore import export_store, SentenceStore, INDEX_SUFFIX, TEXT_SUFFIX
+
+
+parser = argparse.ArgumentParser(prog='bench_sentstore',
+                                 description='compare sentence retrieval from SQLite and a memory-mapped store')
+parser.add_argument("-n", "--sentences", type=int, default=1000000, help="number of sentences")
+parser.add_argument("-b", "--batch-size", type=int, default=100, help="number of rowids per batch")
+parser.add_argument("-q", "--batches", type=int, default=2000, help="number of batches")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic files (default: temporary)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='bench_sentstore_')
+sentDB = f"{workdir}/xxx.db"
+store = f"{workdir}/xxx"
+
+WORDS = ['the', 'a', 'house', 'cat', 'dog', 'sees', 'runs', 'green', 'small', 'big',
+         'river', 'tree', 'walks', 'under', 'over', 'and', 'but', 'today', 'never', 'light', 'über', '猫']
+
+rnd = random.Random(42)
+if os.path.exists(sentDB):
+    os.unlink(sentDB)
+sys.stderr.write(f"creating {args.sentences} sentences in {sentDB}\n")
+con = sqlite3.connect(sentDB)
+con.execute("CREATE TABLE IF NOT EXISTS sentences ( sentence TEXT UNIQUE PRIMARY KEY NOT NULL )")
+con.executemany("INSERT OR IGNORE INTO sentences VALUES (?)",
+                [tuple([' '.join(rnd.choice(WORDS) for i in range(rnd.randint(3, 25))) + f" ({n})"])
+                 for n in range(args.sentences)])
+con.commit()
+con.close()
+
+start = time.perf_counter()
+export_store(sentDB, store)
+exportTime = time.perf_counter() - start
+
+con = sqlite3.connect(f"file:{sentDB}?immutable=1", uri=True)
+maxID = con.execute("SELECT MAX(rowid) FROM sentences").fetchone()[0]
+batches = [[rnd.randint(1, maxID) for i in range(args.batch_size)] for b in range(args.batches)]
+
+
+def point_queries():
+    cur = con.cursor()
+    result = []
+    for batch in batches:
+        sentences = []
+        for rowid in batch:
+            row = cur.execute("SELECT sentence FROM sentences WHERE rowid=?", (rowid,)).fetchone()
+            sentences.append(row[0] if row else None)
+        result.append(sentences)
+    return result
+
+def batch_queries():
+    cur = con.cursor()
+    result = []
+    for batch in batches:
+        rows = dict(cur.execute(f"SELECT rowid,sentence FROM sentences WHERE rowid IN ({','.join('?' * len(batch))})", batch))
+        result.append([rows.get(rowid) for rowid in batch])
+    return result
+
+def store_queries():
+    sentstore = SentenceStore(store)
+    result = [sentstore.get_many(batch) for batch in batches]
+    sentstore.close()
+    return result
+
+
+print(f"{'file':10s} {'size':>12s}")
+print(f"{'sqlite':10s} {os.path.getsize(sentDB):12d}")
+print(f"{'sentstore':10s} {os.path.getsize(store + INDEX_SUFFIX) + os.path.getsize(store + TEXT_SUFFIX):12d}"
+      f"  (exported in {exportTime:.2f}s)")
+print()
+
+reference = None
+for name, function in (('point', point_queries), ('batch', batch_queries), ('sentstore', store_queries)):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    if reference is None:
+        reference = result
+        baseline = elapsed
+    status = 'ok' if result == reference else 'MISMATCH'
+    lookups = args.batches * args.batch_size
+    print(f"{name:10s} {elapsed:8.3f}s {lookups/elapsed:12.0f} sentences/s  speedup {baseline/elapsed:6.1f}x  {status}")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+#
+# read aligned sentences from link DBs (linkdb/xxx-yyy.db)
+#
+# links are streamed in chunks (ordered by linkID) and the sentences of all
+# links in a chunk are fetched with batched rowid IN (...) queries using the
+# internal sentence IDs in srcSentIDs and trgSentIDs (text or binary, see linkids.py)
+# links of a corpus release are selected by their linkID ranges (corpus_range and
+# corpus_range_extra) and the bitextIDs of the release, so that links of other
+# corpora are left out also if the ranges are not exact
+#
+# sentences are read from the sentence DBs (xxx.db and yyy.db) or from a sentence
+# store (xxx.sentidx and xxx.senttxt, see sentstore.py) if it exists next to
+# the sentence DB and is not older than the DB
+#
+# fetch_bitext yields one tuple per link:
+#   (corpus, version, fromDoc, toDoc, srcIDs, trgIDs, srcSentences, trgSentences)
+
+
+import os
+import sqlite3
+
+from linkids import decode_ids
+from sentstore import SentenceStore, INDEX_SUFFIX, TEXT_SUFFIX
+
+
+maxvariables = 30000
+chunksize = 10000
+
+
+##----------------------------------------------------------------
+## sentences by rowid from a sentence DB or sentence store
+## (fetch_sentences returns a dictionary rowid -> sentence,
+##  missing rowids are left out)
+##----------------------------------------------------------------
+
+def fetch_sentences(con, rowids):
+    rowids = list(dict.fromkeys(rowids))
+    sentences = {}
+    for i in range(0, len(rowids), maxvariables):
+        chunk = rowids[i:i+maxvariables]
+        sentences.update(con.execute(f"""SELECT rowid,sentence FROM sentences
+                                         WHERE rowid IN ({','.join('?' * len(chunk))})""", chunk))
+    return sentences
+
+
+class Sentences:
+
+    def __init__(self, sentDB):
+        self.store = None
+        self.con = None
+        store = os.path.splitext(sentDB)[0]
+        storeFiles = [store + INDEX_SUFFIX, store + TEXT_SUFFIX]
+        if all(os.path.exists(f) for f in storeFiles) and \
+           (not os.path.exists(sentDB) or min(os.path.getmtime(f) for f in storeFiles) >= os.path.getmtime(sentDB)):
+            self.store = SentenceStore(store)
+        else:
+            self.con = sqlite3.connect(f"file:{sentDB}?immutable=1", uri=True)
+
+    def fetch(self, rowids):
+        if self.store:
+            rowids = list(dict.fromkeys(rowids))
+            return {rowid: sentence for (rowid, sentence) in zip(rowids, self.store.get_many(rowids))
+                    if sentence is not None}
+        return fetch_sentences(self.con, rowids)
+
+    def close(self):
+        if self.store:
+            self.store.close()
+        if self.con:
+            self.con.close()
+
+
+##----------------------------------------------------------------
+## linkID ranges of the selected corpus releases (all links if no corpus is given)
+##----------------------------------------------------------------
+
+## the range table of corpora or bitexts (kind), including further ranges in
+## *_range_extra (links that have been added after other corpora, see alg2links.py)
+
+def range_table(linkcon, kind):
+    if linkcon.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (f"{kind}_range_extra",)).fetchone():
+        return f"""(SELECT {kind}ID,start,end FROM {kind}_range UNION ALL
+                    SELECT {kind}ID,start,end FROM {kind}_range_extra)"""
+    return f"{kind}_range"
+
+
+def release_condition(corpus=None, version=None):
+    conditions = []
+    params = []
+    if corpus is not None:
+        conditions.append("corpus=?")
+        params.append(corpus)
+    if version is not None:
+        conditions.append("version=?")
+        params.append(version)
+    return (' AND '.join(conditions), params)
+
+
+## (overlapping ranges are merged)
+
+def link_ranges(linkcon, corpus=None, version=None):
+    if corpus is None and version is None:
+        return [linkcon.execute("SELECT MIN(linkID),MAX(linkID) FROM links").fetchone()]
+    (condition, params) = release_condition(corpus, version)
+    ranges = []
+    for (start, end) in linkcon.execute(f"""SELECT start,end FROM {range_table(linkcon, 'corpus')}
+                                            INNER JOIN corpora USING (corpusID)
+                                            WHERE {condition} ORDER BY start""", params):
+        if ranges and start is not None and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+## bitextIDs of the selected corpus releases (None if no corpus is given)
+
+def link_bitexts(linkcon, corpus=None, version=None):
+    if corpus is None and version is None:
+        return None
+    (condition, params) = release_condition(corpus, version)
+    return set(row[0] for row in linkcon.execute(f"SELECT bitextID FROM bitexts WHERE {condition}", params))
+
+
+## bitextID -> (corpus, version, fromDoc, toDoc)
+
+def load_bitexts(linkcon):
+    bitexts = {}
+    for row in linkcon.execute("SELECT bitextID,corpus,version,fromDoc,toDoc FROM bitexts"):
+        bitexts[row[0]] = row[1:]
+    return bitexts
+
+
+##----------------------------------------------------------------
+## links with start <= linkID <= end in chunks of rows
+## (linkID, bitextID, srcIDs, trgIDs, srcSentIDs, trgSentIDs)
+## optionally only links of the given bitexts (see link_bitexts)
+##----------------------------------------------------------------
+
+def iter_link_chunks(linkcon, start, end, size=chunksize, bitextIDs=None):
+    cur = linkcon.execute("""SELECT linkID,bitextID,srcIDs,trgIDs,srcSentIDs,trgSentIDs FROM links
+                             WHERE linkID BETWEEN ? AND ? ORDER BY linkID""", (start, end))
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            break
+        if bitextIDs is not None:
+            rows = [row for row in rows if row[1] in bitextIDs]
+            if not rows:
+                continue
+        yield rows
+
+
+##----------------------------------------------------------------
+## resolve the sentences of a chunk of links
+##----------------------------------------------------------------
+
+def resolve_chunk(rows, bitexts, srcSentences, trgSentences):
+    srcIDs = [decode_ids(row[4]) for row in rows]
+    trgIDs = [decode_ids(row[5]) for row in rows]
+    srcText = srcSentences.fetch([i for ids in srcIDs for i in ids])
+    trgText = trgSentences.fetch([i for ids in trgIDs for i in ids])
+    for (row, src, trg) in zip(rows, srcIDs, trgIDs):
+        (corpus, version, fromDoc, toDoc) = bitexts.get(row[1], (None, None, None, None))
+        yield (corpus, version, fromDoc, toDoc, row[2], row[3],
+               [srcText[i] for i in src if i in srcText],
+               [trgText[i] for i in trg if i in trgText])
+
+
+##----------------------------------------------------------------
+## all aligned sentences of a language pair (optionally for one corpus / release)
+##----------------------------------------------------------------
+
+def fetch_bitext(langpair, corpus=None, version=None, linkdir='linkdb', sentdir='.', size=chunksize):
+    (srclang, trglang) = langpair.split('-')
+    linkcon = sqlite3.connect(f"file:{os.path.join(linkdir, langpair + '.db')}?immutable=1", uri=True)
+    srcSentences = Sentences(os.path.join(sentdir, srclang + '.db'))
+    trgSentences = Sentences(os.path.join(sentdir, trglang + '.db'))
+    bitexts = load_bitexts(linkcon)
+    bitextIDs = link_bitexts(linkcon, corpus, version)
+    try:
+        for (start, end) in link_ranges(linkcon, corpus, version):
+            if start is None:
+                continue
+            for rows in iter_link_chunks(linkcon, start, end, size, bitextIDs):
+                yield from resolve_chunk(rows, bitexts, srcSentences, trgSentences)
+    finally:
+        srcSentences.close()
+        trgSentences.close()
+        linkcon.close()
+
+
+## the format of show_bitext.py
+
+def format_link(link):
+    (corpus, version, fromDoc, toDoc, srcIDs, trgIDs, srcSentences, trgSentences) = link
+    return (f"-- {corpus}/{srcIDs}-{trgIDs} ------------------------------\n"
+            f"{' '.join(srcSentences)}\n{' '.join(trgSentences)}\n")
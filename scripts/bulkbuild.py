@@ -0,0 +1,91 @@
+#
+# helpers for bulk builds of link DBs (--bulk in alg2links.py, links2sqlite.py and linkdb2iso639_3.py)
+#
+# in bulk mode tables are created without their secondary indeces, rows are
+# inserted into the bare tables and all indeces are created once at the end
+# (one sort per index instead of updating all B-trees with every insert)
+# the resulting schema is the same as with indeces created up-front
+#
+
+
+import sqlite3
+import sys
+import time
+
+
+## remove links that would have been ignored by the unique index idx_links
+## (keep the one with the smallest linkID)
+
+DELETE_DUPLICATE_LINKS = """DELETE FROM links WHERE linkID NOT IN
+                            (SELECT MIN(linkID) FROM links GROUP BY bitextID,srcIDs,trgIDs)"""
+
+
+##----------------------------------------------------------------
+## set pragmas for large builds
+## cachesize is given in MB, memorytemp keeps temporary sort data in memory
+## journalmode and synchronous are only changed if they are given
+##----------------------------------------------------------------
+
+JOURNAL_MODES = ['delete', 'truncate', 'persist', 'memory', 'wal', 'off']
+SYNCHRONOUS = ['off', 'normal', 'full', 'extra']
+
+def set_pragmas(con, cachesize=0, memorytemp=False, journalmode=None, synchronous=None):
+    if cachesize:
+        con.execute(f"PRAGMA cache_size=-{cachesize * 1024}")
+    if memorytemp:
+        con.execute("PRAGMA temp_store=MEMORY")
+    if journalmode:
+        con.execute(f"PRAGMA journal_mode={journalmode}")
+    if synchronous:
+        con.execute(f"PRAGMA synchronous={synchronous}")
+
+
+##----------------------------------------------------------------
+## create indeces from a list of CREATE INDEX statements
+## duplicates maps index names to statements that remove rows violating
+## a unique index (only run if creating the index fails)
+##----------------------------------------------------------------
+
+def create_indexes(con, statements, duplicates=None):
+    if duplicates is None:
+        duplicates = {}
+    for statement in statements:
+        try:
+            con.execute(statement)
+        except sqlite3.IntegrityError:
+            name = [n for n in duplicates if f" {n} " in statement]
+            if not name:
+                raise
+            sys.stderr.write(f"removing duplicates violating {name[0]}\n")
+            con.execute(duplicates[name[0]])
+            con.execute(statement)
+    con.commit()
+
+
+##----------------------------------------------------------------
+## wall-clock time per build phase
+##----------------------------------------------------------------
+
+class PhaseTimer:
+
+    def __init__(self):
+        self.phases = []
+        self.name = None
+        self.started = 0
+
+    def start(self, name):
+        self.stop()
+        self.name = name
+        self.started = time.perf_counter()
+
+    def stop(self):
+        if self.name is not None:
+            self.phases.append((self.name, time.perf_counter() - self.started))
+            self.name = None
+
+    def report(self, out=sys.stderr):
+        self.stop()
+        for (name, elapsed) in self.phases:
+            out.write(f"{name:12s} {elapsed:10.2f} seconds\n")
+        out.write(f"{'total':12s} {sum(e for n, e in self.phases):10.2f} seconds\n")
+        out.flush()
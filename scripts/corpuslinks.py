@@ -6,6 +6,8 @@
 import sys
 import sqlite3
 
+from sentindex import DocumentIndex
+
 if len(sys.argv) != 7:
     print("USAGE: corpuslinks.py xx-yy.db xx.ids.db yy.ids.db xx-yy.linked.db corpus version")
     exit()
@@ -29,6 +31,11 @@ srcDBcur = srcDBcon.cursor()
 trgDBcon = sqlite3.connect(f"file:{trgDB}?immutable=1",uri=True)
 trgDBcur = trgDBcon.cursor()
 
+## document ID lookup tables (loaded once for this corpus release)
+
+srcDocIndex = DocumentIndex(srcDBcon.cursor(), srcDB)
+trgDocIndex = DocumentIndex(trgDBcon.cursor(), trgDB)
+
 ##----------------------------------------------------------------
 # create DB that shows what sentences are included in what kind of alignment units
 ##----------------------------------------------------------------
@@ -127,10 +134,12 @@ for bitext in bitextDBcur.execute(f"SELECT rowid,fromDoc,toDoc FROM bitexts WHER
     bitextID = bitext[0]
     fromDoc = bitext[1]
     toDoc = bitext[2]
-    for doc in srcDBcur.execute(f"SELECT rowid FROM documents WHERE corpus='{corpus}' AND version='{version}' AND document='{fromDoc}'"):
-        fromDocID = doc[0]
-    for doc in trgDBcur.execute(f"SELECT rowid FROM documents WHERE corpus='{corpus}' AND version='{version}' AND document='{toDoc}'"):
-        toDocID = doc[0]
+    fromDocID = srcDocIndex.get(corpus, version, fromDoc)
+    toDocID = trgDocIndex.get(corpus, version, toDoc)
+
+    # skip bitexts with documents that are not in the sentence index
+    if fromDocID is None or toDocID is None:
+        continue
 
     
     # run through alignments in this bitext
@@ -181,4 +190,7 @@ for bitext in bitextDBcur.execute(f"SELECT rowid,fromDoc,toDoc FROM bitexts WHER
 # final insert if necessary
 insert_links()
 
+srcDocIndex.report()
+trgDocIndex.report()
+
 
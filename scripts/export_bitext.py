@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+#
+# export the aligned sentences of a language pair (or of one corpus / release)
+# from the link DB (linkdb/xxx-yyy.db) as plain parallel text
+#
+#   moses:  one file per language with one link per line (prefix.xxx and prefix.yyy)
+#   tsv:    one file with source and target sentences separated by TAB (prefix.tsv)
+#
+# the linkID ranges of the selected corpora (corpus_range and corpus_range_extra)
+# are split into tasks along bitext boundaries (bitext_range and bitext_range_extra)
+# with at most --task-size links each; tasks are processed by a pool of processes,
+# each with its own read-only connections and batched sentence lookups (see
+# bitextdb.py), keep only links of the bitexts of the selected corpora and write
+# one shard per task (prefix.00001.xxx, ...)
+#
+# shards are concatenated into the final files in linkID order at the end
+# (gzipped shards are concatenated as multi-member gzip files) unless --keep-shards
+# is given; throughput is reported on stderr
+#
+# USAGE: export_bitext.py [-f moses|tsv] [-z] [-j jobs] [-o prefix] langpair [corpus [version]]
+
+
+import argparse
+import gzip
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+from bitextdb import Sentences, link_ranges, link_bitexts, range_table, iter_link_chunks, resolve_chunk
+
+
+##----------------------------------------------------------------
+## split the linkID ranges into tasks of at most tasksize links,
+## preferably at bitext boundaries (large bitexts and gaps between
+## bitexts are split as well)
+##----------------------------------------------------------------
+
+def split_ranges(linkcon, ranges, tasksize):
+    tasks = []
+    for (start, end) in ranges:
+        if start is None:
+            continue
+        first = start
+        for (bitextStart, bitextEnd) in linkcon.execute(f"""SELECT start,end FROM {range_table(linkcon, 'bitext')}
+                                                            WHERE start>=? AND end<=? ORDER BY start""", (start, end)):
+            while bitextEnd - first + 1 > tasksize:
+                if bitextStart > first and tasksize // 2 <= bitextStart - first <= tasksize:
+                    last = bitextStart - 1
+                else:
+                    last = first + tasksize - 1
+                tasks.append((first, last))
+                first = last + 1
+        if first <= end:
+            tasks.append((first, end))
+    return tasks
+
+
+##----------------------------------------------------------------
+## worker processes: connections are opened once per process
+##----------------------------------------------------------------
+
+linkcon = None
+bitextIDs = None
+srcSentences = None
+trgSentences = None
+
+
+def init_worker(linkDB, srcDB, trgDB, bitexts=None):
+    global linkcon, bitextIDs, srcSentences, trgSentences
+    linkcon = sqlite3.connect(f"file:{linkDB}?immutable=1", uri=True)
+    bitextIDs = bitexts
+    srcSentences = Sentences(srcDB)
+    trgSentences = Sentences(trgDB)
+
+
+def shard_files(prefix, shard, srclang, trglang, fileformat, compress):
+    suffix = '.gz' if compress else ''
+    name = f"{prefix}.{shard:05d}" if shard else prefix
+    if fileformat == 'tsv':
+        return [f"{name}.tsv{suffix}"]
+    return [f"{name}.{srclang}{suffix}", f"{name}.{trglang}{suffix}"]
+
+
+def open_output(filename, compress, level):
+    if compress:
+        return gzip.open(filename, 'wt', encoding='utf-8', compresslevel=level)
+    return open(filename, 'w', encoding='utf-8')
+
+
+def export_task(shard, start, end, files, batchsize, compress, level):
+    started = time.perf_counter()
+    outputs = [open_output(f, compress, level) for f in files]
+    count = 0
+    for rows in iter_link_chunks(linkcon, start, end, batchsize, bitextIDs):
+        for link in resolve_chunk(rows, {}, srcSentences, trgSentences):
+            srcText = ' '.join(link[6])
+            trgText = ' '.join(link[7])
+            if len(outputs) == 1:
+                outputs[0].write(f"{srcText.replace(chr(9), ' ')}\t{trgText.replace(chr(9), ' ')}\n")
+            else:
+                outputs[0].write(srcText + '\n')
+                outputs[1].write(trgText + '\n')
+        count += len(rows)
+    for f in outputs:
+        f.close()
+    return (shard, count, time.perf_counter() - started)
+
+
+def run_task(task):
+    return export_task(*task)
+
+
+##----------------------------------------------------------------
+## concatenate shards into the final files
+##----------------------------------------------------------------
+
+def merge_shards(shards, files):
+    for (i, filename) in enumerate(files):
+        with open(filename + '.tmp', 'wb') as out:
+            for shard in shards:
+                with open(shard[i], 'rb') as f:
+                    shutil.copyfileobj(f, out, 16 * 1024 * 1024)
+        os.replace(filename + '.tmp', filename)
+    for shard in shards:
+        for filename in shard:
+            os.unlink(filename)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='export_bitext', description='export aligned sentences from a link DB as parallel text')
+    parser.add_argument("langpair", type=str, help="language pair (xxx-yyy)")
+    parser.add_argument("corpus", type=str, nargs='?', help="corpus name")
+    parser.add_argument("version", type=str, nargs='?', help="corpus release")
+    parser.add_argument("-l", "--linkdir", type=str, default='linkdb', help="directory of the link DBs")
+    parser.add_argument("-d", "--sentdir", type=str, default='.', help="directory of the sentence DBs")
+    parser.add_argument("-o", "--output", type=str,
+                        help="prefix of the output files (default: [corpus.][version.]langpair)")
+    parser.add_argument("-f", "--format", type=str, choices=['moses', 'tsv'], default='moses', help="output format")
+    parser.add_argument("-z", "--gzip", action='store_true', help="gzip-compress the output files")
+    parser.add_argument("-Z", "--compress-level", type=int, default=6, help="gzip compression level (default: 6)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of processes")
+    parser.add_argument("-t", "--task-size", type=int, default=1000000, help="number of links per task and shard")
+    parser.add_argument("-b", "--batch-size", type=int, default=10000, help="number of links per sentence lookup")
+    parser.add_argument("-k", "--keep-shards", action='store_true', help="keep the shards and do not merge them")
+    args = parser.parse_args()
+    if args.task_size < 2:
+        sys.exit("the task size needs to be at least 2")
+
+    (srclang, trglang) = args.langpair.split('-')
+    linkDB = os.path.join(args.linkdir, args.langpair + '.db')
+    srcDB = os.path.join(args.sentdir, srclang + '.db')
+    trgDB = os.path.join(args.sentdir, trglang + '.db')
+    prefix = args.output if args.output else '.'.join([p for p in (args.corpus, args.version) if p] + [args.langpair])
+
+    con = sqlite3.connect(f"file:{linkDB}?immutable=1", uri=True)
+    ranges = split_ranges(con, link_ranges(con, args.corpus, args.version), args.task_size)
+    bitexts = link_bitexts(con, args.corpus, args.version)
+    con.close()
+    if not ranges:
+        sys.exit(f"no links found in {linkDB}")
+
+    tasks = []
+    for (i, (start, end)) in enumerate(ranges):
+        files = shard_files(prefix, i + 1, srclang, trglang, args.format, args.gzip)
+        tasks.append((i + 1, start, end, files, args.batch_size, args.gzip, args.compress_level))
+    sys.stderr.write(f"export links {ranges[0][0]}-{ranges[-1][1]} of {linkDB} in {len(tasks)} tasks\n")
+
+    started = time.perf_counter()
+    total = 0
+    if args.jobs > 1:
+        context = multiprocessing.get_context('fork')
+        pool = context.Pool(args.jobs, init_worker, (linkDB, srcDB, trgDB, bitexts))
+        results = pool.imap_unordered(run_task, tasks)
+    else:
+        init_worker(linkDB, srcDB, trgDB, bitexts)
+        results = map(run_task, tasks)
+    for (shard, count, elapsed) in results:
+        total += count
+        sys.stderr.write(f"shard {shard}/{len(tasks)}: {count} links in {elapsed:.1f}s "
+                         f"({count/max(elapsed, 1e-9):.0f} links/s), "
+                         f"{total/(time.perf_counter()-started):.0f} links/s in total\n")
+    if args.jobs > 1:
+        pool.close()
+        pool.join()
+    exportTime = time.perf_counter() - started
+
+    shards = [task[3] for task in tasks]
+    files = shard_files(prefix, 0, srclang, trglang, args.format, args.gzip)
+    if not args.keep_shards:
+        merge_shards(shards, files)
+        shards = [files]
+    totalTime = time.perf_counter() - started
+    size = sum(os.path.getsize(f) for shard in shards for f in shard)
+
+    sys.stderr.write(f"{total} links exported in {exportTime:.1f}s "
+                     f"({total/max(exportTime, 1e-9):.0f} links/s with {args.jobs} jobs)\n")
+    sys.stderr.write(f"{size} bytes written in {totalTime:.1f}s ({size/max(totalTime, 1e-9)/1e6:.1f} MB/s) "
+                     f"to {' '.join(files) if not args.keep_shards else str(len(tasks)) + ' shards'}\n")
@@ -0,0 +1,719 @@
+#!/usr/bin/env python3
+#
+# asyncio HTTP/JSON service for the index DBs (only the standard library)
+#
+# the DB files are opened read-only (immutable=1) and kept open in a pool of
+# connections per file that is shared by the threads of a thread pool, so
+# requests do not pay for opening files and find warm page caches; queries run
+# in the thread pool and the event loop only parses requests and writes JSON
+#
+# endpoints (GET with URL parameters or POST with a JSON object, lists of IDs
+# are comma-separated in URLs):
+#
+#   /sentences   lang, ids                        sentences by rowid (xxx.db)
+#   /opusids     lang, corpus, version, document, ids
+#                                                 sentences by OPUS sentence IDs (xxx.ids.db)
+#   /links       langpair, ids [, side, corpus, version, text]
+#                                                 links of sentences (linkdb/xxx-yyy.db)
+#   /search      lang, q [, limit]                full-text search (xxx.fts5.db)
+#   /bitext      langpair [, corpus, version, offset, size, text]
+#                                                 a page of aligned sentences
+#
+# translations run as a pipeline of three batched queries for all sentences of
+# a request (rowids of the sentences, their links, the text of the aligned
+# sentences) and the latency of each hop is reported separately in /metrics
+#   /translations lang, target, sentences [, corpus, version]
+#                                                 translations of sentences (xxx.db -> linkdb/xxx-yyy.db -> yyy.db)
+#   /metrics                                      number of requests and latency per endpoint
+#
+# connections get a page cache and memory-mapped I/O according to the kind of DB file
+# (see FILE_PRAGMAS, can be changed with -M kind=cacheMB:mmapMB)
+#
+# concurrent sentence lookups for the same sentence DB that arrive within a short
+# time window (--batch-window) are combined into one rowid IN (...) query
+#
+# query results and sentences can be cached in an LRU cache (--cache-size, see
+# querycache.py) that is saved to a file at shutdown (--cache-file); DB files that
+# change on disk get new connections and their cached results are dropped
+#
+# IndexService.query(endpoint, params) runs the same requests in-process without HTTP
+#
+# USAGE: indexserver.py [-a address] [-p port] [-d sentdir] [-l linkdir] [-w workers] [-c connections]
+#                       [-C cachesize] [-F cachefile] [-M kind=cacheMB:mmapMB]
+
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import queue
+import re
+import signal
+import sqlite3
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+
+from bitextdb import fetch_sentences, link_ranges, maxvariables, release_condition
+from linkids import decode_ids
+from linkpostings import LinkPostings
+from querycache import QueryCache
+from sentdb import lookup_sentences
+from sent2fts import get_tokenizer, search
+
+
+maxbatch = 10000        # max number of IDs per request
+maxpage = 1000          # max number of links per bitext page and search results
+batchwindow = 0.002     # seconds for collecting concurrent sentence lookups
+metricsize = 100000     # number of latencies per endpoint kept for percentiles
+
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+## page cache size and mmap size in MB per kind of DB file
+## (sentences are read by rowid from all over the file, link DBs are the largest
+##  files and the index pages of their linked tables are read most often)
+
+FILE_PRAGMAS = {'sentences': (64, 4096),
+                'ids':       (16, 0),
+                'fts':       (64, 1024),
+                'links':     (128, 8192)}
+
+LINK_COLUMNS = ['linkID', 'corpus', 'version', 'fromDoc', 'toDoc', 'srcIDs', 'trgIDs',
+                'srcSentIDs', 'trgSentIDs', 'alignType', 'alignerScore', 'cleanerScore']
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+##----------------------------------------------------------------
+## read-only connections to one version of a DB file
+## (at most size connections, idle connections are reused last-in first-out
+##  so that the most recently used page caches stay warm; connections that
+##  are released after the pool has been closed are closed as well)
+##----------------------------------------------------------------
+
+class ConnectionPool:
+
+    def __init__(self, filename, size, version=None, pragmas=(0, 0)):
+        self.filename = filename
+        self.version = version
+        self.pragmas = pragmas
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+        self.closed = False
+
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            self.opened += 1
+            con = sqlite3.connect(f"file:{self.filename}?immutable=1", uri=True, check_same_thread=False)
+            (cachesize, mmapsize) = self.pragmas
+            if cachesize:
+                con.execute(f"PRAGMA cache_size=-{cachesize * 1024}")
+            if mmapsize:
+                con.execute(f"PRAGMA mmap_size={mmapsize * 1024 * 1024}")
+            return con
+
+    def release(self, con):
+        if self.closed:
+            con.close()
+        else:
+            self.idle.put(con)
+        self.slots.release()
+
+    def close(self):
+        self.closed = True
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+##----------------------------------------------------------------
+## request latencies of one endpoint
+##----------------------------------------------------------------
+
+class Latencies:
+
+    def __init__(self, size=metricsize):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.errors = 0
+
+    def add(self, seconds, error=False):
+        self.samples.append(seconds)
+        self.count += 1
+        if error:
+            self.errors += 1
+
+    def summary(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {'requests': self.count, 'errors': self.errors}
+        return {'requests': self.count, 'errors': self.errors,
+                'mean_ms': round(1000 * sum(samples) / len(samples), 3),
+                'p50_ms': round(1000 * samples[int(0.50 * (len(samples) - 1))], 3),
+                'p99_ms': round(1000 * samples[int(0.99 * (len(samples) - 1))], 3),
+                'max_ms': round(1000 * samples[-1], 3)}
+
+
+##----------------------------------------------------------------
+## combine concurrent sentence lookups for one sentence DB
+##----------------------------------------------------------------
+
+class SentenceBatcher:
+
+    def __init__(self, service, filename, window):
+        self.service = service
+        self.filename = filename
+        self.window = window
+        self.pending = []
+        self.size = 0
+        self.timer = None
+
+    async def fetch(self, rowids):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((rowids, future))
+        self.size += len(rowids)
+        if self.size >= maxvariables:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        (pending, self.pending, self.size, self.timer) = (self.pending, [], 0, None)
+        if pending:
+            asyncio.ensure_future(self.run(pending))
+
+    async def run(self, pending):
+        try:
+            sentences = await self.service.execute(self.filename, fetch_sentences,
+                                                   [i for (rowids, future) in pending for i in rowids])
+        except Exception as e:
+            for (rowids, future) in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (rowids, future) in pending:
+            if not future.done():
+                future.set_result(sentences)
+
+
+##----------------------------------------------------------------
+## queries (run in the thread pool with a connection from the pool)
+##----------------------------------------------------------------
+
+def lookup_opusids(con, corpus, version, document, sentIDs):
+    row = con.execute("SELECT rowid FROM documents WHERE corpus=? AND version=? AND document=?",
+                      (corpus, version, document)).fetchone()
+    if not row:
+        return {}
+    ids = {}
+    for i in range(0, len(sentIDs), maxvariables):
+        chunk = sentIDs[i:i+maxvariables]
+        ids.update(con.execute(f"""SELECT sentID,id FROM sentids
+                                   WHERE docID=? AND sentID IN ({','.join('?' * len(chunk))})""", [row[0]] + list(chunk)))
+    return ids
+
+
+def select_links(con, linkIDs):
+    links = []
+    for i in range(0, len(linkIDs), maxvariables):
+        chunk = linkIDs[i:i+maxvariables]
+        for row in con.execute(f"""SELECT {','.join(LINK_COLUMNS)} FROM links INNER JOIN bitexts USING (bitextID)
+                                   WHERE linkID IN ({','.join('?' * len(chunk))}) ORDER BY linkID""", chunk):
+            link = dict(zip(LINK_COLUMNS, row))
+            link['srcSentIDs'] = decode_ids(link['srcSentIDs'])
+            link['trgSentIDs'] = decode_ids(link['trgSentIDs'])
+            links.append(link)
+    return links
+
+
+## links of sentences from linkedsource/linkedtarget or from the postings tables
+## (restricted to the linkID ranges of a corpus or release and to the links of
+##  its bitexts, ranges may include links of other corpora)
+
+def sentence_links(con, sentIDs, side, corpus, version):
+    ranges = None
+    if corpus is not None or version is not None:
+        ranges = link_ranges(con, corpus, version)
+    table = f"linked{side}"
+    linkIDs = {}
+    if con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+        for i in range(0, len(sentIDs), maxvariables):
+            chunk = sentIDs[i:i+maxvariables]
+            for (sentID, linkID) in con.execute(f"""SELECT sentID,linkID FROM {table}
+                                                    WHERE sentID IN ({','.join('?' * len(chunk))})""", chunk):
+                linkIDs.setdefault(sentID, []).append(linkID)
+    else:
+        postings = LinkPostings(con)
+        for sentID in dict.fromkeys(sentIDs):
+            linkIDs[sentID] = postings.lookup(sentID, side)
+    if ranges is not None:
+        for sentID in linkIDs:
+            linkIDs[sentID] = [l for l in linkIDs[sentID] if any(start <= l <= end for (start, end) in ranges)]
+
+    links = {link['linkID']: link for link in select_links(con, sorted({l for ids in linkIDs.values() for l in ids}))
+             if (corpus is None or link['corpus'] == corpus) and (version is None or link['version'] == version)}
+    return {sentID: [links[l] for l in sorted(linkIDs.get(sentID, [])) if l in links] for sentID in sentIDs}
+
+
+## a page of links (offset counts links in the selected corpora)
+## links in the linkID ranges of a corpus or release are restricted to its bitexts
+
+def release_links(corpus, version):
+    if corpus is None and version is None:
+        return ('', [])
+    (condition, params) = release_condition(corpus, version)
+    return (f" AND bitextID IN (SELECT bitextID FROM bitexts WHERE {condition})", params)
+
+
+def bitext_page(con, corpus, version, offset, size):
+    (condition, params) = release_links(corpus, version)
+    linkIDs = []
+    for (start, end) in link_ranges(con, corpus, version):
+        if start is None or len(linkIDs) >= size:
+            continue
+        rows = con.execute(f"""SELECT linkID FROM links WHERE linkID BETWEEN ? AND ?{condition}
+                               ORDER BY linkID LIMIT ? OFFSET ?""",
+                           [start, end] + params + [size - len(linkIDs), offset]).fetchall()
+        if rows:
+            linkIDs.extend(row[0] for row in rows)
+            offset = 0
+        elif offset:
+            offset -= con.execute(f"SELECT COUNT(*) FROM links WHERE linkID BETWEEN ? AND ?{condition}",
+                                  [start, end] + params).fetchone()[0]
+    return select_links(con, linkIDs)
+
+
+def count_links(con, corpus, version):
+    (condition, params) = release_links(corpus, version)
+    return sum(con.execute(f"SELECT COUNT(*) FROM links WHERE linkID BETWEEN ? AND ?{condition}",
+                           [start, end] + params).fetchone()[0]
+               for (start, end) in link_ranges(con, corpus, version) if start is not None)
+
+
+def search_sentences(con, term, limit):
+    try:
+        return search(con, term, get_tokenizer(con), limit)
+    except (sqlite3.OperationalError, UnicodeEncodeError) as e:
+        raise RequestError(400, f"invalid query: {e}")
+
+
+##----------------------------------------------------------------
+## request parameters
+##----------------------------------------------------------------
+
+def get_param(params, name, default=None, required=False):
+    value = params.get(name, default)
+    if value is None and required:
+        raise RequestError(400, f"missing parameter {name}")
+    return value
+
+
+def get_name(params, name):
+    value = get_param(params, name, required=True)
+    if not NAME_PATTERN.match(str(value).replace('-', '_')):
+        raise RequestError(400, f"invalid {name} {value}")
+    return value
+
+
+def get_int(params, name, default, maximum=None):
+    try:
+        value = int(get_param(params, name, default))
+    except (TypeError, ValueError):
+        raise RequestError(400, f"{name} needs to be an integer")
+    if value < 0:
+        raise RequestError(400, f"{name} needs to be a non-negative integer")
+    return min(value, maximum) if maximum else value
+
+
+def get_ids(params, convert=int):
+    value = get_param(params, 'ids', required=True)
+    if isinstance(value, str):
+        value = [v for v in value.split(',') if v]
+    if not isinstance(value, list):
+        raise RequestError(400, "ids need to be a list")
+    if len(value) > maxbatch:
+        raise RequestError(413, f"more than {maxbatch} ids")
+    try:
+        return [convert(v) for v in value]
+    except (TypeError, ValueError):
+        raise RequestError(400, "invalid ids")
+
+
+def get_flag(params, name, default=True):
+    value = params.get(name, default)
+    if isinstance(value, str):
+        return value.lower() not in ('0', 'false', 'no', '')
+    return bool(value)
+
+
+##----------------------------------------------------------------
+## the service
+##----------------------------------------------------------------
+
+class IndexService:
+
+    def __init__(self, sentdir='.', linkdir='linkdb', workers=8, connections=8, window=batchwindow, cache=None,
+                 pragmas=None):
+        self.sentdir = sentdir
+        self.linkdir = linkdir
+        self.pragmas = dict(FILE_PRAGMAS, **(pragmas if pragmas else {}))
+        self.connections = connections
+        self.window = window
+        self.cache = cache if cache else QueryCache(maxsize=0)
+        self.executor = ThreadPoolExecutor(workers)
+        self.pools = {}
+        self.batchers = {}
+        self.latencies = collections.defaultdict(Latencies)
+        self.lock = threading.Lock()
+        self.endpoints = {'sentences': self.sentences, 'opusids': self.opusids, 'links': self.links,
+                          'search': self.search, 'bitext': self.bitext, 'translations': self.translations,
+                          'metrics': self.metrics}
+
+    def kind(self, filename):
+        if filename.endswith('.fts5.db'):
+            return 'fts'
+        if filename.endswith('.ids.db'):
+            return 'ids'
+        if os.path.dirname(filename) == os.path.normpath(self.linkdir):
+            return 'links'
+        return 'sentences'
+
+    ## connection pool for the given version of a DB file
+    ## (the version is taken once per request and also used for the cache keys,
+    ##  so results are cached under the version of the file they come from)
+
+    def pool(self, filename, version):
+        with self.lock:
+            pool = self.pools.get(filename)
+            if pool is None or pool.version != version:
+                if version is None or not os.path.isfile(filename):
+                    raise RequestError(404, f"{os.path.basename(filename)} not found")
+                if pool is not None:
+                    pool.close()
+                pool = self.pools[filename] = ConnectionPool(filename, self.connections, version,
+                                                             self.pragmas[self.kind(filename)])
+            return pool
+
+    def call(self, filename, version, function, *args):
+        pool = self.pool(filename, version)
+        con = pool.acquire()
+        try:
+            return function(con, *args)
+        finally:
+            pool.release(con)
+
+    async def execute(self, filename, function, *args, version=None):
+        if version is None:
+            version = self.cache.version(filename)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.call, filename, version,
+                                                                function, *args)
+
+    ## cached query (args need to be hashable)
+
+    async def run(self, filename, function, *args):
+        version = self.cache.version(filename)
+        if not self.cache.maxsize:
+            return await self.execute(filename, function, *args, version=version)
+        (found, value) = self.cache.get(filename, function.__name__, args, version)
+        if not found:
+            value = await self.execute(filename, function, *args, version=version)
+            self.cache.put(filename, function.__name__, args, value, version)
+        return value
+
+    def sentDB(self, lang, suffix='.db'):
+        return os.path.join(self.sentdir, lang + suffix)
+
+    def linkDB(self, langpair):
+        return os.path.join(os.path.normpath(self.linkdir), langpair + '.db')
+
+    ## sentences by rowid (cached per sentence, the others are fetched in batches)
+
+    async def fetch(self, lang, rowids):
+        filename = self.sentDB(lang)
+        sentences = {}
+        missing = rowids
+        if self.cache.maxsize:
+            version = self.cache.version(filename)
+            missing = []
+            for i in rowids:
+                (found, sentence) = self.cache.get(filename, 'sentence', i, version)
+                if found:
+                    sentences[i] = sentence
+                else:
+                    missing.append(i)
+        if missing:
+            if filename not in self.batchers:
+                self.batchers[filename] = SentenceBatcher(self, filename, self.window)
+            fetched = await self.batchers[filename].fetch(missing)
+            for i in missing:
+                sentences[i] = fetched.get(i)
+                if self.cache.maxsize:
+                    self.cache.put(filename, 'sentence', i, sentences[i], version)
+        return [sentences[i] for i in rowids]
+
+    ## copies of links with the text of source and target sentences
+    ## (links may come from the cache and are not changed)
+
+    async def add_text(self, langpair, links):
+        (srclang, trglang) = langpair.split('-')
+        (srcText, trgText) = await asyncio.gather(
+            self.fetch(srclang, [i for link in links for i in link['srcSentIDs']]),
+            self.fetch(trglang, [i for link in links for i in link['trgSentIDs']]))
+        (srcPos, trgPos) = (0, 0)
+        result = []
+        for link in links:
+            link = dict(link)
+            link['srcText'] = ' '.join(s for s in srcText[srcPos:srcPos+len(link['srcSentIDs'])] if s is not None)
+            link['trgText'] = ' '.join(s for s in trgText[trgPos:trgPos+len(link['trgSentIDs'])] if s is not None)
+            srcPos += len(link['srcSentIDs'])
+            trgPos += len(link['trgSentIDs'])
+            result.append(link)
+        return result
+
+    ## endpoints
+
+    async def sentences(self, params):
+        return {'sentences': await self.fetch(get_name(params, 'lang'), get_ids(params))}
+
+    async def opusids(self, params):
+        lang = get_name(params, 'lang')
+        sentIDs = get_ids(params, str)
+        ids = await self.run(self.sentDB(lang, '.ids.db'), lookup_opusids, get_param(params, 'corpus', required=True),
+                             get_param(params, 'version', required=True), get_param(params, 'document', required=True),
+                             tuple(sentIDs))
+        sentences = await self.fetch(lang, [ids[s] for s in sentIDs if s in ids])
+        text = dict(zip([ids[s] for s in sentIDs if s in ids], sentences))
+        return {'sentences': [{'sentID': s, 'id': ids.get(s), 'sentence': text.get(ids.get(s))} for s in sentIDs]}
+
+    async def links(self, params):
+        langpair = get_name(params, 'langpair')
+        side = get_param(params, 'side', 'source')
+        if side not in ('source', 'target'):
+            raise RequestError(400, "side needs to be source or target")
+        sentIDs = get_ids(params)
+        links = await self.run(self.linkDB(langpair), sentence_links, tuple(sentIDs), side,
+                               get_param(params, 'corpus'), get_param(params, 'version'))
+        if get_flag(params, 'text'):
+            unique = {l['linkID']: l for ls in links.values() for l in ls}
+            unique = {l['linkID']: l for l in await self.add_text(langpair, list(unique.values()))}
+            links = {s: [unique[l['linkID']] for l in links[s]] for s in links}
+        return {'links': [links[s] for s in sentIDs]}
+
+    async def search(self, params):
+        rows = await self.run(self.sentDB(get_name(params, 'lang'), '.fts5.db'), search_sentences,
+                              str(get_param(params, 'q', required=True)), get_int(params, 'limit', 10, maxpage))
+        return {'sentences': [{'id': rowid, 'sentence': sentence} for (rowid, sentence) in rows]}
+
+    async def bitext(self, params):
+        langpair = get_name(params, 'langpair')
+        (corpus, version) = (get_param(params, 'corpus'), get_param(params, 'version'))
+        (links, total) = await asyncio.gather(
+            self.run(self.linkDB(langpair), bitext_page, corpus, version,
+                     get_int(params, 'offset', 0), get_int(params, 'size', 20, maxpage)),
+            self.run(self.linkDB(langpair), count_links, corpus, version))
+        if get_flag(params, 'text'):
+            links = await self.add_text(langpair, links)
+        return {'total': total, 'links': links}
+
+    ## the link DB is named after the sorted language pair, sentences of
+    ## the second language are on the target side
+
+    async def translations(self, params):
+        (lang, trglang) = (get_name(params, 'lang'), get_name(params, 'target'))
+        sentences = get_param(params, 'sentences', required=True)
+        if isinstance(sentences, str):
+            sentences = [s for s in sentences.split('\n') if s]
+        if not isinstance(sentences, list):
+            raise RequestError(400, "sentences need to be a list")
+        if len(sentences) > maxbatch:
+            raise RequestError(413, f"more than {maxbatch} sentences")
+        sentences = [str(s) for s in sentences]
+        (langpair, side, other) = (f"{lang}-{trglang}", 'source', 'trgSentIDs') if lang < trglang else \
+                                  (f"{trglang}-{lang}", 'target', 'srcSentIDs')
+
+        started = time.perf_counter()
+        rowids = await self.run(self.sentDB(lang), lookup_sentences, tuple(sentences))
+        hop1 = time.perf_counter()
+        links = await self.run(self.linkDB(langpair), sentence_links,
+                               tuple(dict.fromkeys(rowids[s] for s in sentences if s in rowids)), side,
+                               get_param(params, 'corpus'), get_param(params, 'version'))
+        hop2 = time.perf_counter()
+        trgIDs = list(dict.fromkeys(i for ls in links.values() for l in ls for i in l[other]))
+        text = dict(zip(trgIDs, await self.fetch(trglang, trgIDs)))
+        hop3 = time.perf_counter()
+
+        result = []
+        for sentence in sentences:
+            translations = {}
+            for link in links.get(rowids.get(sentence), []):
+                ids = tuple(link[other])
+                if ids not in translations:
+                    translations[ids] = {'translation': ' '.join(text[i] for i in ids if text[i] is not None),
+                                         'ids': list(ids), 'count': 0, 'corpora': []}
+                translations[ids]['count'] += 1
+                if link['corpus'] not in translations[ids]['corpora']:
+                    translations[ids]['corpora'].append(link['corpus'])
+            result.append({'sentence': sentence, 'id': rowids.get(sentence),
+                           'translations': sorted(translations.values(), key=lambda t: -t['count'])})
+
+        hops = (('sentences', started, hop1), ('links', hop1, hop2), ('text', hop2, hop3))
+        for (hop, start, end) in hops:
+            self.latencies[f"translations.{hop}"].add(end - start)
+        return {'translations': result,
+                'hops_ms': {hop: round(1000 * (end - start), 3) for (hop, start, end) in hops}}
+
+    async def metrics(self, params):
+        return {'endpoints': {name: self.latencies[name].summary() for name in sorted(self.latencies)},
+                'connections': {os.path.basename(f): self.pools[f].opened for f in sorted(self.pools)},
+                'cache': self.cache.stats()}
+
+    ## run a request in-process, returns status and result
+
+    async def query(self, endpoint, params):
+        started = time.perf_counter()
+        status = 200
+        try:
+            if endpoint not in self.endpoints:
+                raise RequestError(404, f"unknown endpoint {endpoint}")
+            result = await self.endpoints[endpoint](params)
+        except RequestError as e:
+            (status, result) = (e.status, {'error': str(e)})
+        except (sqlite3.Error, ValueError) as e:
+            (status, result) = (500, {'error': str(e)})
+        if endpoint in self.endpoints and endpoint != 'metrics':
+            self.latencies[endpoint].add(time.perf_counter() - started, status != 200)
+        return (status, result)
+
+    def close(self):
+        if self.cache.maxsize and self.cache.filename:
+            self.cache.save()
+        self.executor.shutdown()
+        for pool in self.pools.values():
+            pool.close()
+
+
+##----------------------------------------------------------------
+## HTTP/1.1 with keep-alive
+##----------------------------------------------------------------
+
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    (method, target, version) = line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        (key, sep, value) = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return (method, target, version, headers, body)
+
+
+def serve(service):
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                (method, target, version, headers, body) = request
+                url = urlsplit(target)
+                params = dict(parse_qsl(url.query))
+                if method == 'POST' and body:
+                    try:
+                        params.update(json.loads(body))
+                    except (ValueError, TypeError):
+                        params = None
+                if params is None or not isinstance(params, dict):
+                    (status, result) = (400, {'error': 'request body needs to be a JSON object'})
+                else:
+                    (status, result) = await service.query(url.path.strip('/'), params)
+                data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+                keepalive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keepalive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keepalive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='indexserver', description='HTTP/JSON service for sentence, FTS and link DBs')
+    parser.add_argument("-a", "--address", type=str, default='127.0.0.1', help="address to listen on")
+    parser.add_argument("-p", "--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("-d", "--sentdir", type=str, default='.', help="directory of xxx.db, xxx.ids.db and xxx.fts5.db")
+    parser.add_argument("-l", "--linkdir", type=str, default='linkdb', help="directory of the link DBs")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="number of threads for queries")
+    parser.add_argument("-c", "--connections", type=int, default=8, help="max number of connections per DB file")
+    parser.add_argument("-b", "--batch-window", type=float, default=batchwindow * 1000,
+                        help="milliseconds for combining concurrent sentence lookups (0: no waiting)")
+    parser.add_argument("-C", "--cache-size", type=int, default=0, help="max number of cached results (0: no cache)")
+    parser.add_argument("-F", "--cache-file", type=str, help="file for saving the cache at shutdown and loading it at start")
+    parser.add_argument("-M", "--memory", type=str, action='append', default=[],
+                        help=f"cache and mmap size in MB per kind of DB file, kind=cacheMB:mmapMB "
+                             f"(kinds: {', '.join(FILE_PRAGMAS)})")
+    args = parser.parse_args()
+
+    pragmas = {}
+    for setting in args.memory:
+        (kind, sep, sizes) = setting.partition('=')
+        if kind not in FILE_PRAGMAS:
+            sys.exit(f"unknown kind of DB file {kind}")
+        try:
+            (cachesize, mmapsize) = (int(size) for size in sizes.split(':'))
+        except ValueError:
+            sys.exit(f"sizes need to be given as cacheMB:mmapMB ({setting})")
+        pragmas[kind] = (cachesize, mmapsize)
+
+    cache = QueryCache(args.cache_size, args.cache_file) if args.cache_size else None
+    if cache and cache.entries:
+        sys.stderr.write(f"{len(cache.entries)} cached results loaded from {args.cache_file}\n")
+    service = IndexService(args.sentdir, args.linkdir, args.workers, args.connections, args.batch_window / 1000, cache,
+                           pragmas)
+
+    async def main():
+        server = await asyncio.start_server(serve(service), args.address, args.port)
+        sys.stderr.write(f"listening on {args.address}:{args.port}\n")
+        async with server:
+            await server.serve_forever()
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    for (name, summary) in sorted(service.latencies.items()):
+        sys.stderr.write(f"{name}: {json.dumps(summary.summary())}\n")
+    if cache:
+        sys.stderr.write(f"cache: {json.dumps(cache.stats())}\n")
+    service.close()
@@ -4,7 +4,7 @@
 #  this will merge several language pairs that correspond to the same
 #  ISO-639-3 macro-language codes of
 #
-# USAGE: linkdb2iso639_3.py dir xx yy xxx yyy [newLinkDb]
+# USAGE: linkdb2iso639_3.py [-B] [-C cachesize] [-M] dir xx yy xxx yyy [newLinkDb]
 #
 #  dir = directory where the DBs are located
 #
@@ -15,24 +15,43 @@
 #  yyy = three-letter target language code (macro-language if available)
 #
 # newLinkDb = filename of the new linkDB (optional)
+#
+# -B = bulk mode: create indeces on links and linked tables after copying all links
+# -C = SQLite page cache size in MB
+# -M = keep temporary data (index sorting) in memory
 
 
+import argparse
 import sys
 import sqlite3
 import os, traceback
 import os.path
 
-if len(sys.argv) < 6:
-    print("USAGE: linkdb2iso639_3.py dir xx yy xxx yyy [newlinkdb]")
-    exit()
+from bulkbuild import DELETE_DUPLICATE_LINKS, set_pragmas, create_indexes, PhaseTimer
+
+parser = argparse.ArgumentParser(prog='linkdb2iso639_3',
+                                 description='copy link tables to a link DB with ISO-639-3 language codes')
+parser.add_argument("dir", type=str, help="directory where the DBs are located")
+parser.add_argument("srclang", type=str, help="source language code (original OPUS code)")
+parser.add_argument("trglang", type=str, help="target language code (original OPUS code)")
+parser.add_argument("srclang3", type=str, help="three-letter source language code")
+parser.add_argument("trglang3", type=str, help="three-letter target language code")
+parser.add_argument("newlinkdb", type=str, nargs='?', help="filename of the new link DB")
+parser.add_argument("-B", "--bulk", action='store_true',
+                    help="create indeces on links and linked tables after copying all links (for new link DBs)")
+parser.add_argument("-C", "--cache-size", type=int, default=0, help="SQLite page cache size in MB (default: SQLite default)")
+parser.add_argument("-M", "--memory-temp", action='store_true', help="keep temporary data (index sorting) in memory")
+args = parser.parse_args()
 
-dbDir = sys.argv[1]
+dbDir = args.dir
 
-srcLangOld = sys.argv[2]
-trgLangOld = sys.argv[3]
+srcLangOld = args.srclang
+trgLangOld = args.trglang
 
-srcLangNew = sys.argv[4]
-trgLangNew = sys.argv[5]
+srcLangNew = args.srclang3
+trgLangNew = args.trglang3
+
+bulk = args.bulk
 
 
 oldLinkDB = f"{dbDir}/{srcLangOld}-{trgLangOld}.db"
@@ -55,22 +74,23 @@ if not os.path.isfile(oldLinkDB):
     
 ## overwrite new linkDB file name
     
-if len(sys.argv) > 6:
-    linkDB = sys.argv[6]
+if args.newlinkdb:
+    linkDB = args.newlinkdb
 
-    
-buffersize = 100000
-srcbuffer = []
-trgbuffer = []
-linkbuffer = []
 
 
 ##----------------------------------------------------------------
 # create new link db
+# (one connection with the old link DB attached as 'old')
 ##----------------------------------------------------------------
 
-linksDBcon = sqlite3.connect(linkDB, timeout=7200)
+timer = PhaseTimer()
+timer.start('schema')
+
+linksDBcon = sqlite3.connect(linkDB, timeout=7200, uri=True)
 linksDBcur = linksDBcon.cursor()
+set_pragmas(linksDBcon, args.cache_size, args.memory_temp)
+linksDBcur.execute("ATTACH DATABASE ? AS old", (f"file:{oldLinkDB}?immutable=1",))
 
 
 ## save all original language pairs that will be covered by this link DB
@@ -88,129 +108,60 @@ linksDBcur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bitexts ON bitexts ( c
 linksDBcur.execute("CREATE TABLE IF NOT EXISTS linkedsource ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, PRIMARY KEY(linkID,sentID) )")
 linksDBcur.execute("CREATE TABLE IF NOT EXISTS linkedtarget ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, PRIMARY KEY(linkID,sentID) )")
 
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_bitext ON linkedsource (bitextID,sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_bitext ON linkedtarget (bitextID,sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_linkid ON linkedsource (linkID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_linkid ON linkedtarget (linkID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_sentid ON linkedsource (sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_sentid ON linkedtarget (sentID)")
+## secondary indeces on links and linked tables (created at the end in bulk mode)
+
+indexes = ["CREATE INDEX IF NOT EXISTS idx_linkedsource_bitext ON linkedsource (bitextID,sentID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedtarget_bitext ON linkedtarget (bitextID,sentID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedsource_linkid ON linkedsource (linkID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedtarget_linkid ON linkedtarget (linkID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedsource_sentid ON linkedsource (sentID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedtarget_sentid ON linkedtarget (sentID)"]
 
 ## the original alignment table, now also with internal sentence IDs
 
 linksDBcur.execute("""CREATE TABLE IF NOT EXISTS links ( linkID INTEGER NOT NULL PRIMARY KEY, bitextID, 
                                                          srcIDs TEXT, trgIDs TEXT, srcSentIDs TEXT, trgSentIDs TEXT,
                                                          alignType TEXT, alignerScore REAL, cleanerScore REAL)""")
-linksDBcur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_links ON links ( bitextID, srcIDs, trgIDs )")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_aligntype ON links ( bitextID, alignType )")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_bitextid ON links ( bitextID )")
+indexes.extend(["CREATE UNIQUE INDEX IF NOT EXISTS idx_links ON links ( bitextID, srcIDs, trgIDs )",
+                "CREATE INDEX IF NOT EXISTS idx_aligntype ON links ( bitextID, alignType )",
+                "CREATE INDEX IF NOT EXISTS idx_bitextid ON links ( bitextID )"])
 linksDBcur.execute("CREATE TABLE IF NOT EXISTS bitext_range (bitextID INTEGER NOT NULL PRIMARY KEY,start INTEGER,end INTEGER)")
 linksDBcur.execute("CREATE TABLE IF NOT EXISTS corpus_range (corpus TEXT, version TEXT,start INTEGER,end INTEGER)")
 linksDBcur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_corpus ON corpus_range ( corpus, version )")
 
+if not bulk:
+    create_indexes(linksDBcon, indexes)
+
 linksDBcon.commit()
 linksDBcur.close()
 
 
 
-
-def insert_linkedsource():
-    global linkDB, srcbuffer
-    if len(srcbuffer) > 0:
-        linksDBcon = sqlite3.connect(linkDB, timeout=7200)
-        linksDBcur = linksDBcon.cursor()
-        linksDBcur.executemany("""INSERT OR IGNORE INTO linkedsource VALUES(?,?,?)""", srcbuffer)
-        linksDBcon.commit()
-        linksDBcur.close()
-        srcbuffer = []
-
-def insert_linkedtarget():
-    global linkDB, trgbuffer
-    if len(trgbuffer) > 0:
-        linksDBcon = sqlite3.connect(linkDB, timeout=7200)
-        linksDBcur = linksDBcon.cursor()
-        linksDBcur.executemany("""INSERT OR IGNORE INTO linkedtarget VALUES(?,?,?)""", trgbuffer)
-        linksDBcon.commit()
-        linksDBcur.close()
-        trgbuffer = []
-
-def insert_links():
-    global linkDB, linkbuffer
-    if len(linkbuffer) > 0:
-        linksDBcon = sqlite3.connect(linkDB, timeout=7200)
-        linksDBcur = linksDBcon.cursor()
-        linksDBcur.executemany("""INSERT OR IGNORE INTO links VALUES(?,?,?,?,?,?,?,?,?)""", linkbuffer)
-        linksDBcon.commit()
-        linksDBcur.close()
-        linkbuffer = []
-
-def print_progress():
-    global count
-    count+=1
-    if not count % 5000:
-        sys.stderr.write('.')
-        if not count % 100000:
-            sys.stderr.write(f" {count}\n")
-        sys.stderr.flush()
-
-
-
-def insert_range(bitextID):
-    global linkDB
-    linksDBcon = sqlite3.connect(linkDB, timeout=7200)
-    linksDBcur = linksDBcon.cursor()
-
-    for rowids in linksDBcur.execute(f"SELECT MIN(rowid),MAX(rowid) FROM links WHERE bitextID={bitextID}"):
-        start = rowids[0]
-        end = rowids[1]
-        if start and end:
-            linksDBcur.execute(f"INSERT OR IGNORE INTO bitext_range VALUES ({bitextID},{start},{end})")
-        
-    linksDBcon.commit()
-    linksDBcur.close()
-
-
-# get the bitext ID in the new database
-# - insert new entries if necessary
-# - chache of IDs in an associative list
-    
-bitextIDs = dict()
-def new_bitextID(oldID):
-    global bitextIDs, bitextDBcur, linkDB, linksDBcon, linksDBcur
-    if oldID in bitextIDs:
-        return bitextIDs[oldID]
-    else:
-        bitextDBcur.execute(f"SELECT * FROM bitexts WHERE rowid={oldID}");
-        row = bitextDBcur.fetchone()
-        linksDBcon = sqlite3.connect(linkDB, timeout=7200)
-        linksDBcur = linksDBcon.cursor()
-        linksDBcur.execute('INSERT OR IGNORE INTO bitexts VALUES (?,?,?,?)', row)
-        linksDBcon.commit()
-        linksDBcur.execute(f"SELECT rowid FROM bitexts WHERE corpus='{row[0]}' AND version='{row[1]}' AND fromDoc='{row[2]}' AND toDoc='{row[3]}'");
-        row = linksDBcur.fetchone()
-        bitextIDs[oldID] = row[0]
-        linksDBcur.close()
-        # print(f"new bitext inserted - oldID={oldID} - newID={bitextIDs[oldID]}")
-        return bitextIDs[oldID]
-
-
 ##----------------------------------------------------------------
-# run through all bitexts and copy the links
+# copy bitexts that have links and map their IDs to the new bitextIDs
+# (old bitextIDs are rowids of the bitexts table in the old DB)
 ##----------------------------------------------------------------
 
-oldLinkDBcon = sqlite3.connect(f"file:{oldLinkDB}?immutable=1",uri=True)
-oldLinkDBcur = oldLinkDBcon.cursor()
-bitextDBcur = oldLinkDBcon.cursor()
-
-
-bitextID = 0
-fromDocID = 0
-toDocID = 0
-count = 0
-
+timer.start('bitexts')
+print(f"copying bitexts table")
 
+linksDBcur = linksDBcon.cursor()
+linksDBcur.execute("""INSERT OR IGNORE INTO main.bitexts (corpus,version,fromDoc,toDoc)
+                      SELECT corpus,version,fromDoc,toDoc FROM old.bitexts
+                      WHERE EXISTS (SELECT 1 FROM old.links WHERE old.links.bitextID = old.bitexts.rowid)
+                      ORDER BY rowid""")
+
+linksDBcur.execute("CREATE TEMP TABLE bitextmap (oldID INTEGER NOT NULL PRIMARY KEY, newID INTEGER)")
+linksDBcur.execute("""INSERT INTO temp.bitextmap
+                      SELECT o.rowid, n.rowid FROM old.bitexts o
+                      JOIN main.bitexts n ON n.corpus = o.corpus AND n.version = o.version
+                                         AND n.fromDoc = o.fromDoc AND n.toDoc = o.toDoc""")
+linksDBcon.commit()
 
 
+##----------------------------------------------------------------
 ## copy the linkedsource and linkedtarget tables (reverse if necessary)
+##----------------------------------------------------------------
 
 if reverse:
     srclinktable = 'linkedtarget'
@@ -219,69 +170,53 @@ else:
     srclinktable = 'linkedsource'
     trglinktable = 'linkedtarget'
 
-print(f"copying linkedsource table")
-for row in oldLinkDBcur.execute(f"SELECT sentID,linkID,bitextID FROM {srclinktable}"):
-    print_progress()
-    bitextID = new_bitextID(row[2])
-    linked = list(row)
-    linked[2] = bitextID
-    srcbuffer.append(linked)
-    if len(srcbuffer) >= buffersize:
-        insert_linkedsource()
-        
-insert_linkedsource()
-
-
-print(f"copying linkedtarget table")
-for row in oldLinkDBcur.execute(f"SELECT sentID,linkID,bitextID FROM {trglinktable}"):
-    print_progress()
-    bitextID = new_bitextID(row[2])
-    linked = list(row)
-    linked[2] = bitextID
-    trgbuffer.append(linked)
-    if len(trgbuffer) >= buffersize:
-        insert_linkedtarget()
-        
-insert_linkedtarget()
+timer.start('links')
+for (newtable, oldtable) in (('linkedsource', srclinktable), ('linkedtarget', trglinktable)):
+    print(f"copying {newtable} table")
+    linksDBcur.execute(f"""INSERT OR IGNORE INTO main.{newtable} (sentID,linkID,bitextID)
+                           SELECT l.sentID, l.linkID, m.newID FROM old.{oldtable} l
+                           JOIN temp.bitextmap m ON m.oldID = l.bitextID""")
+    linksDBcon.commit()
+
 
+## copy the links table (swap source and target if necessary)
+
+if reverse:
+    columns = """l.trgIDs, l.srcIDs, l.trgSentIDs, l.srcSentIDs,
+                 substr(l.alignType, instr(l.alignType,'-')+1) || '-' || substr(l.alignType, 1, instr(l.alignType,'-')-1)"""
+else:
+    columns = "l.srcIDs, l.trgIDs, l.srcSentIDs, l.trgSentIDs, l.alignType"
 
 print(f"copying links table")
-for row in oldLinkDBcur.execute(f"SELECT * FROM links"):
-    print_progress()
-    if (reverse):
-        srcID = row[2]
-        trgID = row[3]
-        srcSentID = row[4]
-        trgSentID = row[5]
-        nrSents = row[6].split('-')
-        alignType = str(nrSents[1]) + '-' + str(nrSents[0]) 
-
-        row = list(row)
-        row[2] = trgID
-        row[3] = srcID
-        row[4] = trgSentID
-        row[5] = srcSentID
-        row[6] = alignType
-
-    linkbuffer.append(row)
-    if len(linkbuffer) >= buffersize:
-        insert_links()
-    
-insert_links()
-insert_range(bitextID)
+linksDBcur.execute(f"""INSERT OR IGNORE INTO main.links
+                       SELECT l.linkID, m.newID, {columns}, l.alignerScore, l.cleanerScore FROM old.links l
+                       JOIN temp.bitextmap m ON m.oldID = l.bitextID
+                       ORDER BY l.linkID""")
+linksDBcon.commit()
 
+if bulk:
+    timer.start('indexes')
+    create_indexes(linksDBcon, indexes, {'idx_links': DELETE_DUPLICATE_LINKS})
 
-## finally: add corpus range information
 
-linksDBcon = sqlite3.connect(linkDB, timeout=7200)
-linksDBcur = linksDBcon.cursor()
+## add the rowid ranges of all copied bitexts
+
+timer.start('ranges')
+linksDBcur.execute("""INSERT OR IGNORE INTO bitext_range
+                      SELECT bitextID, MIN(linkID), MAX(linkID) FROM main.links
+                      WHERE bitextID IN (SELECT newID FROM temp.bitextmap)
+                      GROUP BY bitextID""")
+linksDBcon.commit()
 
-for bitext in bitextDBcur.execute(f"SELECT DISTINCT corpus,version FROM bitexts"):
+
+## finally: add corpus range information
+
+for bitext in linksDBcur.execute(f"SELECT DISTINCT corpus,version FROM old.bitexts").fetchall():
     corpus = bitext[0]
     version = bitext[1]
     print(f"Now processing {corpus}/{version}")
 
-    for rowids in linksDBcur.execute(f"SELECT MIN(rowid),MAX(rowid) FROM links WHERE bitextID IN (SELECT rowid FROM bitexts WHERE corpus='{corpus}' AND version='{version}')"):
+    for rowids in linksDBcur.execute(f"SELECT MIN(rowid),MAX(rowid) FROM main.links WHERE bitextID IN (SELECT rowid FROM main.bitexts WHERE corpus='{corpus}' AND version='{version}')").fetchall():
         start = rowids[0]
         end = rowids[1]
         if (start and end):
@@ -290,3 +225,6 @@ for bitext in bitextDBcur.execute(f"SELECT DISTINCT corpus,version FROM bitexts"
 
 linksDBcon.commit()
 linksDBcur.close()
+linksDBcon.close()
+
+timer.report()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+#
+# export a link DB (linkdb/xxx-yyy.db) into Parquet files for vectorized analytics
+# (requires pyarrow, which is not needed by any other script)
+#
+#   outdir/links/corpus=C/version=V/part-0.parquet         links of corpus release C/V
+#   outdir/linkedsource/corpus=C/version=V/part-0.parquet  sentID, linkID, bitextID
+#   outdir/linkedtarget/corpus=C/version=V/part-0.parquet  sentID, linkID, bitextID
+#   outdir/bitexts.parquet
+#   outdir/corpora.parquet
+#
+# links and linked tables are partitioned by corpus and version (hive-style
+# directories, values are URL-encoded) using the linkID ranges in corpus_range
+# and corpus_range_extra, keeping only links of the bitexts of each release;
+# srcSentIDs and trgSentIDs are stored as lists of integers (text or binary IDs,
+# see linkids.py), the linked tables are created from them (they do not need to
+# exist in the link DB) and string columns with few distinct values are
+# dictionary-encoded
+#
+# the files can be read with pyarrow.dataset (partitioning='hive'), see bench_parquet.py
+#
+# USAGE: linkdb2parquet.py [-b batchsize] [-c compression] [-L] linkdb outdir
+
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from urllib.parse import quote
+
+from bitextdb import range_table, link_bitexts
+from linkids import decode_ids
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+buffersize = 1000000
+
+
+def dictionary_type():
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def link_schema():
+    return pa.schema([('linkID', pa.int64()), ('bitextID', pa.int64()),
+                      ('srcIDs', pa.string()), ('trgIDs', pa.string()),
+                      ('srcSentIDs', pa.list_(pa.int64())), ('trgSentIDs', pa.list_(pa.int64())),
+                      ('alignType', dictionary_type()), ('alignerScore', pa.float64()), ('cleanerScore', pa.float64())])
+
+
+def linked_schema():
+    return pa.schema([('sentID', pa.int64()), ('linkID', pa.int64()), ('bitextID', pa.int64())])
+
+
+def partition_dir(outdir, table, corpus, version):
+    return os.path.join(outdir, table, f"corpus={quote(str(corpus), safe='')}", f"version={quote(str(version), safe='')}")
+
+
+##----------------------------------------------------------------
+## one Parquet writer per table and corpus release
+## (several corpora rows can share the same corpus and version)
+##----------------------------------------------------------------
+
+class PartitionWriters:
+
+    def __init__(self, outdir, compression):
+        self.outdir = outdir
+        self.compression = compression
+        self.writers = {}
+
+    def write(self, table, corpus, version, data, schema):
+        key = (table, corpus, version)
+        if key not in self.writers:
+            directory = partition_dir(self.outdir, table, corpus, version)
+            os.makedirs(directory, exist_ok=True)
+            self.writers[key] = pq.ParquetWriter(os.path.join(directory, 'part-0.parquet'), schema,
+                                                 compression=self.compression)
+        self.writers[key].write_table(pa.Table.from_pydict(data, schema=schema))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+##----------------------------------------------------------------
+## export links with start <= linkID <= end in batches
+## (optionally only links of the given bitexts)
+##----------------------------------------------------------------
+
+def export_range(con, writers, corpus, version, start, end, batchsize, linked=True, bitextIDs=None):
+    cur = con.execute("""SELECT linkID,bitextID,srcIDs,trgIDs,srcSentIDs,trgSentIDs,alignType,alignerScore,cleanerScore
+                         FROM links WHERE linkID BETWEEN ? AND ? ORDER BY linkID""", (start, end))
+    count = 0
+    while True:
+        rows = cur.fetchmany(batchsize)
+        if not rows:
+            break
+        if bitextIDs is not None:
+            rows = [row for row in rows if row[1] in bitextIDs]
+            if not rows:
+                continue
+        columns = list(zip(*rows))
+        srcSentIDs = [decode_ids(ids) for ids in columns[4]]
+        trgSentIDs = [decode_ids(ids) for ids in columns[5]]
+        writers.write('links', corpus, version,
+                      {'linkID': columns[0], 'bitextID': columns[1], 'srcIDs': columns[2], 'trgIDs': columns[3],
+                       'srcSentIDs': srcSentIDs, 'trgSentIDs': trgSentIDs, 'alignType': columns[6],
+                       'alignerScore': columns[7], 'cleanerScore': columns[8]}, link_schema())
+        if linked:
+            for (table, sentIDs) in (('linkedsource', srcSentIDs), ('linkedtarget', trgSentIDs)):
+                pairs = [(sentID, linkID, bitextID) for (ids, linkID, bitextID) in zip(sentIDs, columns[0], columns[1])
+                         for sentID in ids]
+                (sentID, linkID, bitextID) = zip(*pairs) if pairs else ((), (), ())
+                writers.write(table, corpus, version,
+                              {'sentID': sentID, 'linkID': linkID, 'bitextID': bitextID}, linked_schema())
+        count += len(rows)
+    return count
+
+
+def export_table(con, outdir, table, query, schema, compression):
+    rows = con.execute(query).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    data = {field.name: column for (field, column) in zip(schema, columns)}
+    pq.write_table(pa.Table.from_pydict(data, schema=schema), os.path.join(outdir, f"{table}.parquet"),
+                   compression=compression)
+    return len(rows)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='linkdb2parquet', description='export a link DB into partitioned Parquet files')
+    parser.add_argument("linkdb", type=str, help="link database file")
+    parser.add_argument("outdir", type=str, help="output directory")
+    parser.add_argument("-b", "--batch-size", type=int, default=buffersize, help="number of links per row group")
+    parser.add_argument("-c", "--compression", type=str, default='zstd', help="Parquet compression (default: zstd)")
+    parser.add_argument("-L", "--no-linked", action='store_true', help="do not export linkedsource and linkedtarget")
+    args = parser.parse_args()
+
+    if pa is None:
+        sys.exit("linkdb2parquet.py needs pyarrow (pip install pyarrow)")
+    if os.path.exists(os.path.join(args.outdir, 'links')):
+        sys.exit(f"{args.outdir} contains an export already")
+    os.makedirs(args.outdir, exist_ok=True)
+
+    con = sqlite3.connect(f"file:{args.linkdb}?immutable=1", uri=True)
+    started = time.perf_counter()
+
+    dictionary = dictionary_type()
+    export_table(con, args.outdir, 'corpora',
+                 "SELECT corpusID,corpus,version,srclang,trglang,srclang3,trglang3,latest FROM corpora ORDER BY corpusID",
+                 pa.schema([('corpusID', pa.int64()), ('corpus', dictionary), ('version', dictionary),
+                            ('srclang', dictionary), ('trglang', dictionary), ('srclang3', dictionary),
+                            ('trglang3', dictionary), ('latest', pa.int64())]), args.compression)
+    export_table(con, args.outdir, 'bitexts',
+                 "SELECT bitextID,corpus,version,fromDoc,toDoc FROM bitexts ORDER BY bitextID",
+                 pa.schema([('bitextID', pa.int64()), ('corpus', dictionary), ('version', dictionary),
+                            ('fromDoc', pa.string()), ('toDoc', pa.string())]), args.compression)
+
+    ranges = con.execute(f"""SELECT corpus,version,start,end FROM {range_table(con, 'corpus')}
+                             INNER JOIN corpora USING (corpusID) ORDER BY start""").fetchall()
+    if not ranges:
+        sys.exit(f"no corpus ranges in {args.linkdb} (see add_corpus_range.py)")
+
+    writers = PartitionWriters(args.outdir, args.compression)
+    bitexts = {}
+    total = 0
+    for (corpus, version, start, end) in ranges:
+        if (corpus, version) not in bitexts:
+            bitexts[(corpus, version)] = link_bitexts(con, corpus, version)
+        count = export_range(con, writers, corpus, version, start, end, args.batch_size, not args.no_linked,
+                             bitexts[(corpus, version)])
+        total += count
+        elapsed = time.perf_counter() - started
+        sys.stderr.write(f"{corpus}/{version}: {count} links ({total/elapsed:.0f} links/s)\n")
+    writers.close()
+    con.close()
+
+    size = sum(os.path.getsize(os.path.join(d, f)) for (d, subdirs, files) in os.walk(args.outdir) for f in files)
+    sys.stderr.write(f"{total} links exported in {time.perf_counter()-started:.1f}s "
+                     f"({size} bytes in {args.outdir}, {os.path.getsize(args.linkdb)} bytes in {args.linkdb})\n")
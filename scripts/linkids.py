@@ -0,0 +1,77 @@
+#
+# compact binary encoding of internal sentence IDs in link DBs
+#
+# srcSentIDs and trgSentIDs in the links table are stored either as
+# space-separated text (the default) or as BLOBs created by encode_ids:
+# the first ID is stored as it is and every following ID as the difference
+# to its predecessor (zigzag-encoded to allow negative differences),
+# all numbers are written as LEB128 varints (7 bits per byte)
+#
+# decode_ids accepts both formats and SQL functions for reading them
+# can be registered with register_functions(con)
+#
+
+
+def encode_varint(number, out):
+    while number > 127:
+        out.append((number & 127) | 128)
+        number >>= 7
+    out.append(number)
+
+
+def encode_ids(ids):
+    out = bytearray()
+    last = 0
+    for i in ids:
+        i = int(i)
+        delta = i - last
+        encode_varint((delta << 1) if delta >= 0 else ((-delta << 1) - 1), out)
+        last = i
+    return bytes(out)
+
+
+def decode_ids(data):
+    if data is None:
+        return []
+    if isinstance(data, str):
+        return [int(i) for i in data.split()]
+    ids = []
+    last = 0
+    number = 0
+    shift = 0
+    for byte in data:
+        number |= (byte & 127) << shift
+        if byte & 128:
+            shift += 7
+            continue
+        delta = (number >> 1) if not number & 1 else -((number + 1) >> 1)
+        last += delta
+        ids.append(last)
+        number = 0
+        shift = 0
+    return ids
+
+
+## convert between the text and the binary format
+
+def ids2text(data):
+    return ' '.join(str(i) for i in decode_ids(data))
+
+def text2ids(text):
+    return encode_ids(decode_ids(text))
+
+
+##----------------------------------------------------------------
+## SQL functions for reading sentence IDs in either format:
+##
+##   sentids_text(x)    space-separated text
+##   sentids_blob(x)    binary encoding
+##   sentids_count(x)   number of sentence IDs
+##   sentids_has(x,id)  1 if id is among the sentence IDs, else 0
+##----------------------------------------------------------------
+
+def register_functions(con):
+    con.create_function('sentids_text', 1, ids2text, deterministic=True)
+    con.create_function('sentids_blob', 1, text2ids, deterministic=True)
+    con.create_function('sentids_count', 1, lambda x: len(decode_ids(x)), deterministic=True)
+    con.create_function('sentids_has', 2, lambda x, i: int(i in decode_ids(x)), deterministic=True)
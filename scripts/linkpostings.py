@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+#
+# inverted index from internal sentence IDs to links (alternative to linkedsource/linkedtarget)
+#
+#   sourcepostings (sentID INTEGER PRIMARY KEY, linkIDs BLOB)
+#   targetpostings (sentID INTEGER PRIMARY KEY, linkIDs BLOB)
+#
+# each row holds the sorted list of all linkIDs a sentence appears in, encoded
+# with linkids.encode_ids (delta-encoded varints), so there is one row per sentence
+# instead of one row per sentence and link plus three extra indeces
+#
+# bitextID and corpusID are not stored: links of a bitext and of a corpus form
+# ranges of linkIDs (bitext_range and corpus_range, and *_range_extra for links
+# added later), which are used for restricting lookups; these blocks are exact
+# (alg2links.py does not merge blocks over links of other bitexts or corpora),
+# only the single ranges of link DBs without *_range_extra may overlap with
+# other ranges (see check_corpus_ranges.py) and then the bitextIDs of the
+# selected links are checked in the links table
+#
+# USAGE: linkpostings.py [-d] [-q sentID [-t]] linkdb
+
+
+import argparse
+import bisect
+import sqlite3
+import sys
+
+from linkids import encode_ids, decode_ids
+from bitextdb import range_table
+
+
+maxvariables = 30000
+buffersize = 1000000
+
+SIDES = {'source': 'sourcepostings',
+         'target': 'targetpostings'}
+
+
+def create_tables(con):
+    for side in SIDES:
+        con.execute(f"CREATE TABLE IF NOT EXISTS {SIDES[side]} ( sentID INTEGER NOT NULL PRIMARY KEY, linkIDs BLOB )")
+    con.commit()
+
+
+##----------------------------------------------------------------
+## merge new postings (sentID -> sorted list of linkIDs) into a postings table
+##----------------------------------------------------------------
+
+def merge_postings(cur, table, postings):
+    sentIDs = list(postings)
+    for i in range(0, len(sentIDs), maxvariables):
+        chunk = sentIDs[i:i+maxvariables]
+        for (sentID, data) in cur.execute(f"""SELECT sentID,linkIDs FROM {table}
+                                              WHERE sentID IN ({','.join('?' * len(chunk))})""", chunk).fetchall():
+            old = decode_ids(data)
+            new = postings[sentID]
+            if old[-1] < new[0]:
+                postings[sentID] = old + new
+            else:
+                postings[sentID] = sorted(set(old).union(new))
+    cur.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?,?)",
+                    [(sentID, encode_ids(postings[sentID])) for sentID in sentIDs])
+
+
+##----------------------------------------------------------------
+## add postings for all links with linkID between start and end
+## (all links if no range is given)
+## returns the number of links that have been indexed
+##----------------------------------------------------------------
+
+def add_postings(con, start=None, end=None):
+    create_tables(con)
+    cur = con.cursor()
+    linkcur = con.cursor()
+    if start is None or end is None:
+        linkcur.execute("SELECT linkID,srcSentIDs,trgSentIDs FROM links ORDER BY linkID")
+    else:
+        linkcur.execute("""SELECT linkID,srcSentIDs,trgSentIDs FROM links
+                           WHERE linkID BETWEEN ? AND ? ORDER BY linkID""", (start, end))
+
+    count = 0
+    while True:
+        rows = linkcur.fetchmany(buffersize)
+        if not rows:
+            break
+        for side, column in ((SIDES['source'], 1), (SIDES['target'], 2)):
+            postings = {}
+            for row in rows:
+                for sentID in decode_ids(row[column]):
+                    postings.setdefault(sentID, []).append(row[0])
+            merge_postings(cur, side, postings)
+        count += len(rows)
+
+    con.commit()
+    return count
+
+
+##----------------------------------------------------------------
+## look up all links of a sentence (side is 'source' or 'target')
+## optionally restricted to a corpus (corpusID) or bitext (bitextID)
+##
+## lookup returns a sorted list of linkIDs and links the rows from the links table
+## linkID ranges and bitextIDs of corpora are cached when they are first used
+##----------------------------------------------------------------
+
+## linkIDs (sorted) within the given ranges
+
+def select_ranges(linkIDs, ranges):
+    selected = []
+    for (start, end) in ranges:
+        selected.extend(linkIDs[bisect.bisect_left(linkIDs, start):bisect.bisect_right(linkIDs, end)])
+    return sorted(set(selected)) if len(ranges) > 1 else selected
+
+
+class LinkPostings:
+
+    def __init__(self, con):
+        self.con = con
+        self.cur = con.cursor()
+        self.ranges = {'corpus': {}, 'bitext': {}}
+        self.exact = {'corpus': {}, 'bitext': {}}
+        self.bitexts = {}
+        self.legacy = not con.execute("""SELECT name FROM sqlite_master
+                                         WHERE type='table' AND name='corpus_range_extra'""").fetchone()
+
+    def range(self, kind, ID):
+        if ID not in self.ranges[kind]:
+            self.ranges[kind][ID] = self.cur.execute(f"""SELECT start,end FROM {range_table(self.con, kind)}
+                                                         WHERE {kind}ID=? ORDER BY start""", (ID,)).fetchall()
+        return self.ranges[kind][ID]
+
+    ## ranges of legacy link DBs are not exact if they overlap with the range of
+    ## another bitext or corpus (alignments that have been appended later)
+
+    def is_exact(self, kind, ID):
+        if not self.legacy:
+            return True
+        if ID not in self.exact[kind]:
+            self.exact[kind][ID] = not any(self.cur.execute(f"""SELECT 1 FROM {kind}_range
+                                                                WHERE {kind}ID<>? AND start<=? AND end>=? LIMIT 1""",
+                                                             (ID, end, start)).fetchone()
+                                           for (start, end) in self.range(kind, ID))
+        return self.exact[kind][ID]
+
+    def corpus_bitexts(self, corpusID):
+        if corpusID not in self.bitexts:
+            self.bitexts[corpusID] = set(row[0] for row in self.cur.execute(
+                """SELECT bitextID FROM bitexts INNER JOIN corpora USING (corpus,version)
+                   WHERE corpusID=? AND fromDoc LIKE srclang || '/%' AND toDoc LIKE trglang || '/%'""", (corpusID,)))
+        return self.bitexts[corpusID]
+
+    def lookup(self, sentID, side='source', corpusID=None, bitextID=None):
+        row = self.cur.execute(f"SELECT linkIDs FROM {SIDES[side]} WHERE sentID=?", (sentID,)).fetchone()
+        if not row:
+            return []
+        linkIDs = decode_ids(row[0])
+        if corpusID is None and bitextID is None:
+            return linkIDs
+
+        exact = True
+        if corpusID is not None:
+            linkIDs = select_ranges(linkIDs, self.range('corpus', corpusID))
+            exact = self.is_exact('corpus', corpusID)
+        if bitextID is not None:
+            linkIDs = select_ranges(linkIDs, self.range('bitext', bitextID))
+            exact = exact and self.is_exact('bitext', bitextID)
+        if exact or not linkIDs:
+            return linkIDs
+
+        if corpusID is not None:
+            bitextIDs = self.corpus_bitexts(corpusID)
+            if bitextID is not None:
+                bitextIDs = bitextIDs & {bitextID}
+        else:
+            bitextIDs = {bitextID}
+        selected = []
+        for i in range(0, len(linkIDs), maxvariables):
+            chunk = linkIDs[i:i+maxvariables]
+            selected.extend(row[0] for row in self.cur.execute(f"""SELECT linkID,bitextID FROM links
+                                                                  WHERE linkID IN ({','.join('?' * len(chunk))})
+                                                                  ORDER BY linkID""", chunk)
+                            if row[1] in bitextIDs)
+        return selected
+
+    def links(self, sentID, side='source', corpusID=None, bitextID=None):
+        linkIDs = self.lookup(sentID, side, corpusID, bitextID)
+        rows = []
+        for i in range(0, len(linkIDs), maxvariables):
+            chunk = linkIDs[i:i+maxvariables]
+            rows.extend(self.cur.execute(f"""SELECT * FROM links WHERE linkID IN ({','.join('?' * len(chunk))})
+                                             ORDER BY linkID""", chunk).fetchall())
+        return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='linkpostings',
+                                     description='add sentence-to-link postings to a link database')
+    parser.add_argument("linkdb", type=str, help="link database file")
+    parser.add_argument("-d", "--drop", action='store_true',
+                        help="drop the linkedsource and linkedtarget tables after creating the postings")
+    parser.add_argument("-q", "--query", type=int, help="print the links of a sentence instead")
+    parser.add_argument("-t", "--target", action='store_true', help="query target sentences instead of source sentences")
+    args = parser.parse_args()
+
+    if args.query is not None:
+        con = sqlite3.connect(f"file:{args.linkdb}?immutable=1", uri=True)
+        for row in LinkPostings(con).links(args.query, 'target' if args.target else 'source'):
+            print('\t'.join(str(x) for x in row))
+    else:
+        con = sqlite3.connect(args.linkdb, timeout=7200)
+        count = add_postings(con)
+        sys.stderr.write(f"{count} links indexed in {args.linkdb}\n")
+        if args.drop:
+            con.execute("DROP TABLE IF EXISTS linkedsource")
+            con.execute("DROP TABLE IF EXISTS linkedtarget")
+            con.commit()
+    con.close()
@@ -1,23 +1,39 @@
 #!/usr/bin/env python3
 #
-# arguments: xx-yy.db xx.ids.db yy.ids.db xx-yy.linked.db corpus version
+# arguments: xx-yy.db xx.ids.db yy.ids.db xx-yy.linked.db corpus version [-B] [-C cachesize] [-M]
 #
 
+import argparse
 import sys
 import sqlite3
 import os, traceback
 
-if len(sys.argv) != 7:
-    print("USAGE: links2sqlite.py xx-yy.db xx.ids.db yy.ids.db xx-yy.linked.db corpus version")
-    print(sys.argv)
-    exit()
-
-algDB = sys.argv[1]
-srcDB = sys.argv[2]
-trgDB = sys.argv[3]
-linkDB = sys.argv[4]
-corpus = sys.argv[5]
-version = sys.argv[6]
+from sentindex import DocumentIndex
+from bulkbuild import DELETE_DUPLICATE_LINKS, set_pragmas, create_indexes, PhaseTimer
+
+parser = argparse.ArgumentParser(prog='links2sqlite',description='add links of a corpus release to a link database')
+parser.add_argument("algdb", type=str, help="alignment database file (xx-yy.db)")
+parser.add_argument("srcids", type=str, help="source sentence ID database file (xx.ids.db)")
+parser.add_argument("trgids", type=str, help="target sentence ID database file (yy.ids.db)")
+parser.add_argument("linkdb", type=str, help="link database file (output)")
+parser.add_argument("corpus", type=str, help="name of the OPUS corpus")
+parser.add_argument("version", type=str, help="release of the corpus")
+parser.add_argument("-B", "--bulk", action='store_true',
+                    help="create indeces on links and linked tables after inserting all links (for new link DBs)")
+parser.add_argument("-C", "--cache-size", type=int, default=0, help="SQLite page cache size in MB (default: SQLite default)")
+parser.add_argument("-M", "--memory-temp", action='store_true', help="keep temporary data (index sorting) in memory")
+args = parser.parse_args()
+
+algDB = args.algdb
+srcDB = args.srcids
+trgDB = args.trgids
+linkDB = args.linkdb
+corpus = args.corpus
+version = args.version
+bulk = args.bulk
+
+timer = PhaseTimer()
+timer.start('schema')
 
 buffersize = 100000
 
@@ -31,35 +47,45 @@ srcDBcur = srcDBcon.cursor()
 trgDBcon = sqlite3.connect(f"file:{trgDB}?immutable=1",uri=True)
 trgDBcur = trgDBcon.cursor()
 
+## document ID lookup tables (loaded once for this corpus release)
+
+srcDocIndex = DocumentIndex(srcDBcon.cursor(), srcDB)
+trgDocIndex = DocumentIndex(trgDBcon.cursor(), trgDB)
+
 ##----------------------------------------------------------------
 # create DB that shows what sentences are included in what kind of alignment units
 ##----------------------------------------------------------------
 
 linksDBcon = sqlite3.connect(linkDB, timeout=7200)
 linksDBcur = linksDBcon.cursor()
+set_pragmas(linksDBcon, args.cache_size, args.memory_temp)
 
 ## tables that map sentences to links
 
 linksDBcur.execute("CREATE TABLE IF NOT EXISTS linkedsource ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, corpusID INTEGER, PRIMARY KEY(linkID,sentID) )")
 linksDBcur.execute("CREATE TABLE IF NOT EXISTS linkedtarget ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, corpusID INTEGER, PRIMARY KEY(linkID,sentID) )")
 
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_bitext ON linkedsource (corpusID,bitextID,sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_bitext ON linkedtarget (corpusID,bitextID,sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_linkid ON linkedsource (linkID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_linkid ON linkedtarget (linkID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedsource_sentid ON linkedsource (sentID)")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_linkedtarget_sentid ON linkedtarget (sentID)")
+## secondary indeces on links and linked tables (created at the end in bulk mode)
+
+indexes = ["CREATE INDEX IF NOT EXISTS idx_linkedsource_bitext ON linkedsource (corpusID,bitextID,sentID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedtarget_bitext ON linkedtarget (corpusID,bitextID,sentID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedsource_linkid ON linkedsource (linkID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedtarget_linkid ON linkedtarget (linkID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedsource_sentid ON linkedsource (sentID)",
+           "CREATE INDEX IF NOT EXISTS idx_linkedtarget_sentid ON linkedtarget (sentID)"]
 
 ## the original alignment table, now also with internal sentence IDs
 
 linksDBcur.execute("""CREATE TABLE IF NOT EXISTS links ( linkID INTEGER NOT NULL PRIMARY KEY, bitextID, 
                                                          srcIDs TEXT, trgIDs TEXT, srcSentIDs TEXT, trgSentIDs TEXT,
                                                          alignType TEXT, alignerScore REAL, cleanerScore REAL)""")
-linksDBcur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_links ON links ( bitextID, srcIDs, trgIDs )")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_aligntype ON links ( bitextID, alignType )")
-linksDBcur.execute("CREATE INDEX IF NOT EXISTS idx_bitextid ON links ( bitextID )")
+indexes.extend(["CREATE UNIQUE INDEX IF NOT EXISTS idx_links ON links ( bitextID, srcIDs, trgIDs )",
+                "CREATE INDEX IF NOT EXISTS idx_aligntype ON links ( bitextID, alignType )",
+                "CREATE INDEX IF NOT EXISTS idx_bitextid ON links ( bitextID )"])
 linksDBcur.execute("CREATE TABLE IF NOT EXISTS bitext_range (bitextID INTEGER NOT NULL PRIMARY KEY,start INTEGER,end INTEGER)")
 
+if not bulk:
+    create_indexes(linksDBcon, indexes)
 
 linksDBcur.close()
 
@@ -79,9 +105,8 @@ trgbuffer = []
 linkbuffer = []
 
 def insert_links():
-    global linkDB, srcbuffer, trgbuffer, linkbuffer
+    global linkDB, linksDBcon, srcbuffer, trgbuffer, linkbuffer
     if len(srcbuffer) > 0 or len(trgbuffer) > 0:
-        linksDBcon = sqlite3.connect(linkDB, timeout=7200)
         linksDBcur = linksDBcon.cursor()
         if len(srcbuffer) > 0:
             linksDBcur.executemany("""INSERT OR IGNORE INTO linkedsource VALUES(?,?,?)""", srcbuffer)
@@ -105,12 +130,18 @@ def insert_links():
 
 
 
-def insert_range(bitextID):
-    global linkDB
-    linksDBcon = sqlite3.connect(linkDB, timeout=7200)
+## in bulk mode the range is taken from the links of the bitext that have been buffered
+## (there is no index on bitextID yet)
+
+def insert_range(bitextID, linkRange):
+    global linkDB, linksDBcon
     linksDBcur = linksDBcon.cursor()
 
-    for rowids in linksDBcur.execute(f"SELECT MIN(rowid),MAX(rowid) FROM links WHERE bitextID={bitextID}"):
+    if bulk:
+        ranges = [linkRange]
+    else:
+        ranges = linksDBcur.execute(f"SELECT MIN(rowid),MAX(rowid) FROM links WHERE bitextID={bitextID}").fetchall()
+    for rowids in ranges:
         start = rowids[0]
         end = rowids[1]
         if start and end:
@@ -132,7 +163,7 @@ toDocID = 0
 count = 0
 
 
-
+timer.start('links')
 for bitext in bitextDBcur.execute(f"SELECT rowid,fromDoc,toDoc FROM bitexts WHERE corpus='{corpus}' AND version='{version}'"):
     
     # find document IDs (fromDocID and toDocID)
@@ -140,16 +171,20 @@ for bitext in bitextDBcur.execute(f"SELECT rowid,fromDoc,toDoc FROM bitexts WHER
     bitextID = bitext[0]
     fromDoc = bitext[1]
     toDoc = bitext[2]
-    for doc in srcDBcur.execute(f"SELECT rowid FROM documents WHERE corpus='{corpus}' AND version='{version}' AND document='{fromDoc}'"):
-        fromDocID = doc[0]
-    for doc in trgDBcur.execute(f"SELECT rowid FROM documents WHERE corpus='{corpus}' AND version='{version}' AND document='{toDoc}'"):
-        toDocID = doc[0]
+    fromDocID = srcDocIndex.get(corpus, version, fromDoc)
+    toDocID = trgDocIndex.get(corpus, version, toDoc)
+
+    # skip bitexts with documents that are not in the sentence index
+    if fromDocID is None or toDocID is None:
+        continue
     
     # run through alignments in this bitext
 
     # sys.stderr.write(f"links from bitext {bitextID} ({fromDoc} - {toDoc})\n")
     # sys.stderr.flush()
 
+    linkRange = (None, None)
+
     for row in algDBcur.execute(f"SELECT rowid,srcIDs,trgIDs,alignType,alignerScore,cleanerScore FROM links WHERE bitextID={bitextID}"):
         count+=1
         if not count % 5000:
@@ -193,15 +228,24 @@ for bitext in bitextDBcur.execute(f"SELECT rowid,fromDoc,toDoc FROM bitexts WHER
         trgSentID = ' '.join(trgSentIDs)
 
         linkbuffer.append([linkID,bitextID,srcID,trgID,srcSentID,trgSentID,row[3],row[4],row[5]])
+        linkRange = (min(linkRange[0] or linkID, linkID), max(linkRange[1] or linkID, linkID))
 
         if len(srcbuffer) >= buffersize or len(trgbuffer) >= buffersize:
             insert_links()
 
     insert_links()
-    insert_range(bitextID)
+    insert_range(bitextID, linkRange)
 
 
 # final insert if necessary (should not be necessary)
 insert_links()
 
+if bulk:
+    timer.start('indexes')
+    create_indexes(linksDBcon, indexes, {'idx_links': DELETE_DUPLICATE_LINKS})
+
+srcDocIndex.report()
+trgDocIndex.report()
+timer.report()
+
 
@@ -0,0 +1,76 @@
+#
+# schema of link DBs (linkdb/xxx-yyy.db, created by alg2links.py and pivot.py)
+#
+# all statements use IF NOT EXISTS and can be run on existing link DBs;
+# secondary indeces are kept in separate lists, so that bulk builds can
+# create them at the end (see bulkbuild.py)
+#
+
+
+## tables that map sentences to links
+## (not used with sentence-to-link postings, see linkpostings.py)
+
+LINKED_TABLES = [
+    "CREATE TABLE IF NOT EXISTS linkedsource ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, corpusID INTEGER, PRIMARY KEY(linkID,sentID) )",
+    "CREATE TABLE IF NOT EXISTS linkedtarget ( sentID INTEGER, linkID INTEGER, bitextID INTEGER, corpusID INTEGER, PRIMARY KEY(linkID,sentID) )"
+]
+
+LINKED_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_linkedsource_bitext ON linkedsource (corpusID,bitextID,sentID)",
+    "CREATE INDEX IF NOT EXISTS idx_linkedtarget_bitext ON linkedtarget (corpusID,bitextID,sentID)",
+    "CREATE INDEX IF NOT EXISTS idx_linkedsource_linkid ON linkedsource (linkID)",
+    "CREATE INDEX IF NOT EXISTS idx_linkedtarget_linkid ON linkedtarget (linkID)",
+    "CREATE INDEX IF NOT EXISTS idx_linkedsource_sentid ON linkedsource (sentID)",
+    "CREATE INDEX IF NOT EXISTS idx_linkedtarget_sentid ON linkedtarget (sentID)"
+]
+
+
+## the original alignment table, now also with internal sentence IDs
+
+LINK_TABLES = [
+    """CREATE TABLE IF NOT EXISTS links ( linkID INTEGER NOT NULL PRIMARY KEY, bitextID,
+                                         srcIDs TEXT, trgIDs TEXT, srcSentIDs TEXT, trgSentIDs TEXT,
+                                         alignType TEXT, alignerScore REAL, cleanerScore REAL)"""
+]
+
+LINK_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_links ON links ( bitextID, srcIDs, trgIDs )",
+    "CREATE INDEX IF NOT EXISTS idx_aligntype ON links ( bitextID, alignType )",
+    "CREATE INDEX IF NOT EXISTS idx_bitextid ON links ( bitextID )"
+]
+
+
+## corpus and bitext tables and their linkID ranges
+##
+## further linkID ranges of bitexts and corpora that got new alignments after
+## other corpora had been added are stored in *_range_extra (linkIDs are rowids
+## of the alignment DB, so appended links are not next to the existing ones)
+
+CORPUS_TABLES = [
+    """CREATE TABLE IF NOT EXISTS corpora (corpusID INTEGER NOT NULL PRIMARY KEY,
+                                           corpus TEXT,version TEXT,srclang TEXT,trglang TEXT,
+                                           srclang3 TEXT,trglang3 TEXT,latest INTEGER)""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_corpora ON corpora (corpus,version,srclang,trglang,srclang3,trglang3,latest)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_release ON corpora (corpus,version,srclang,trglang)",
+    """CREATE TABLE IF NOT EXISTS bitexts (bitextID INTEGER NOT NULL PRIMARY KEY,
+                                           corpus TEXT,version TEXT,fromDoc TEXT,toDoc TEXT)""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_bitexts ON bitexts (corpus,version,fromDoc,toDoc)",
+    "CREATE TABLE IF NOT EXISTS bitext_range (bitextID INTEGER NOT NULL PRIMARY KEY,start INTEGER,end INTEGER)",
+    "CREATE TABLE IF NOT EXISTS corpus_range (corpusID INTEGER NOT NULL PRIMARY KEY,start INTEGER,end INTEGER)",
+    """CREATE TABLE IF NOT EXISTS bitext_range_extra (bitextID INTEGER NOT NULL,start INTEGER,end INTEGER,
+                                                      PRIMARY KEY(bitextID,start))""",
+    """CREATE TABLE IF NOT EXISTS corpus_range_extra (corpusID INTEGER NOT NULL,start INTEGER,end INTEGER,
+                                                      PRIMARY KEY(corpusID,start))"""
+]
+
+
+## watermarks: the last alignment (rowid in the alignment DB) that has been processed
+## for each corpus and bitext and whether it has been finished (see alg2links.py)
+
+WATERMARK_TABLES = [
+    """CREATE TABLE IF NOT EXISTS watermarks (bitextID INTEGER NOT NULL PRIMARY KEY,corpusID INTEGER,
+                                              linkID INTEGER,done INTEGER)""",
+    "CREATE INDEX IF NOT EXISTS idx_watermarks_corpus ON watermarks (corpusID)",
+    """CREATE TABLE IF NOT EXISTS corpus_watermarks (corpusID INTEGER NOT NULL PRIMARY KEY,
+                                                     bitextID INTEGER,linkID INTEGER,done INTEGER)"""
+]
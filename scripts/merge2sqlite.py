@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+#
+# build or extend a sentence DB (xxx.db) from sorted and de-duplicated files
+# (the *.dedup files created with sort -u or their merged xxx.dedup.gz)
+#
+# the input files are merged (k-way merge with heapq) and duplicates are removed
+# on the fly; new DBs are filled in one transaction with dense rowids in sorted
+# order and the unique index on sentences is created at the end
+#
+# existing DBs are extended (append mode): sentences that appear in the sorted
+# files given with -e (for example the previous xxx.dedup.gz that the DB has been
+# built from) are skipped without looking them up in the DB, all other sentences
+# are added with INSERT OR IGNORE; DBs that lack the unique index (an earlier
+# build that has been interrupted) get it before anything is added
+#
+# input files need to be sorted in byte order (LC_ALL=C sort -u); lines that
+# are out of order are collected in a temporary table and added at the end
+#
+# new DBs can be created with hash-keyed sentences (-H, see sentdb.py),
+# existing DBs are always extended in their own schema
+#
+# USAGE: merge2sqlite.py [-H] [-e existing.dedup.gz] sentdb file1.dedup [file2.dedup.gz ...]
+
+
+import argparse
+import gzip
+import heapq
+import itertools
+import sqlite3
+import sys
+import time
+
+from bulkbuild import set_pragmas
+from sentdb import create_index, open_table, new_table, add_sentences, sentence_hash
+
+
+buffersize = 1000000
+
+
+##----------------------------------------------------------------
+## read sentences from a sorted file (gzipped if the name ends with .gz)
+## lines that cannot be decoded are counted in errors and skipped,
+## lines that are out of order are moved to the list unsorted
+##----------------------------------------------------------------
+
+def read_sorted(filename, unsorted, errors):
+    last = ''
+    openfile = gzip.open if filename.endswith('.gz') else open
+    with openfile(filename, 'rb') as f:
+        for line in f:
+            try:
+                sentence = line.decode('utf-8').rstrip()
+            except UnicodeDecodeError:
+                errors[filename] = errors.get(filename, 0) + 1
+                continue
+            if not sentence:
+                continue
+            if sentence < last:
+                unsorted.append(sentence)
+                continue
+            last = sentence
+            yield sentence
+
+
+##----------------------------------------------------------------
+## merge sorted streams, skip duplicates and sentences in the existing streams
+##----------------------------------------------------------------
+
+def merge_new(streams, existing, skipped):
+    known = heapq.merge(*existing)
+    current = next(known, None)
+    last = None
+    for sentence in heapq.merge(*streams):
+        if sentence == last:
+            continue
+        last = sentence
+        while current is not None and current < sentence:
+            current = next(known, None)
+        if current == sentence:
+            skipped[0] += 1
+            continue
+        yield sentence
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='merge2sqlite',
+                                     description='merge sorted sentence files into a sentence database')
+    parser.add_argument("sentdb", type=str, help="sentence database file")
+    parser.add_argument("files", type=str, nargs='+', help="sorted files with one sentence per line (.gz for gzipped files)")
+    parser.add_argument("-e", "--existing", type=str, action='append', default=[],
+                        help="sorted file with sentences that are already in the DB (can be repeated)")
+    parser.add_argument("-H", "--hashed", action='store_true', help="create new DBs with hash-keyed sentences (see sentdb.py)")
+    parser.add_argument("-C", "--cache-size", type=int, default=0, help="SQLite page cache size in MB (default: SQLite default)")
+    parser.add_argument("-M", "--memory-temp", action='store_true', help="keep temporary data (index sorting) in memory")
+    args = parser.parse_args()
+
+    con = sqlite3.connect(args.sentdb, timeout=7200)
+    set_pragmas(con, args.cache_size, args.memory_temp)
+    cur = con.cursor()
+
+    newDB = new_table(con)
+    hashed = open_table(con, args.hashed, index=not newDB)
+    if newDB:
+        sys.stderr.write(f"create {args.sentdb} from {len(args.files)} files\n")
+    else:
+        sys.stderr.write(f"append to {args.sentdb} from {len(args.files)} files "
+                         f"(skipping sentences in {len(args.existing)} existing files)\n")
+    cur.execute("CREATE TEMP TABLE unsorted ( sentence TEXT )")
+
+    unsorted = []
+    errors = {}
+    skipped = [0]
+    streams = [read_sorted(f, unsorted, errors) for f in args.files]
+    existing = [read_sorted(f, [], errors) for f in args.existing]
+    sentences = merge_new(streams, existing, skipped)
+
+    added = 0
+    countUnsorted = 0
+    started = time.perf_counter()
+    while True:
+        batch = list(itertools.islice(sentences, buffersize))
+        if batch and not newDB:
+            added += add_sentences(con, batch)
+        elif batch and hashed:
+            cur.executemany("INSERT INTO sentences (sentence,hash) VALUES (?,?)", [(s, sentence_hash(s)) for s in batch])
+            added += cur.rowcount
+        elif batch:
+            cur.executemany("INSERT INTO sentences (sentence) VALUES (?)", [tuple([s]) for s in batch])
+            added += cur.rowcount
+        if unsorted:
+            cur.executemany("INSERT INTO temp.unsorted VALUES (?)", [tuple([s]) for s in unsorted])
+            countUnsorted += len(unsorted)
+            unsorted.clear()
+        if not batch:
+            break
+        elapsed = time.perf_counter() - started
+        sys.stderr.write(f"{added} sentences added ({added/elapsed:.0f} sentences/s, "
+                         f"{skipped[0]} existing skipped)\n")
+        sys.stderr.flush()
+    con.commit()
+
+    if newDB:
+        sys.stderr.write("create index on sentences\n")
+        create_index(con, hashed)
+
+    if countUnsorted:
+        sys.stderr.write(f"{countUnsorted} lines out of order (input not sorted with LC_ALL=C?), add them now\n")
+        lastID = 0
+        while True:
+            rows = cur.execute("SELECT rowid,sentence FROM temp.unsorted WHERE rowid>? ORDER BY rowid LIMIT ?",
+                               (lastID, buffersize)).fetchall()
+            if not rows:
+                break
+            lastID = rows[-1][0]
+            added += add_sentences(con, [row[1] for row in rows])
+
+    for filename in errors:
+        sys.stderr.write(f"{errors[filename]} lines with encoding errors in {filename}\n")
+    sys.stderr.write(f"{added} sentences added to {args.sentdb} in {time.perf_counter()-started:.1f}s\n")
+    con.close()
@@ -11,7 +11,9 @@ import base64
 import json
 
 from os.path import exists
-from xml.parsers.expat import ParserCreate, ExpatError, errors
+from xml.parsers.expat import ParserCreate
+
+from xmlstream import parse
 
 
 
@@ -170,14 +172,7 @@ for filename in lzip.namelist():
         if verbose:
             sys.stderr.write(f"process {filename} ({count} sentences / {docCount} documents done)\n")
         with lzip.open(filename, 'r') as f:
-            for line in f:
-                try:
-                    parser.Parse(line)
-                except:
-                    errorCount += 1
-                    if verbose:
-                        sys.stderr.write("Error:", errors.messages[err.code])
-                        sys.stderr.write(f"error parsing {line}\n")
+            errorCount = parse(parser, f, filename)
 
         if pars:
             print_document(pars)
@@ -186,7 +181,7 @@ for filename in lzip.namelist():
 
         count += sentCount
         if errorCount > 0:
-            sys.stderr.write(f"XML parsing errors for {filename}: {errorCount} lines\n")
+            sys.stderr.write(f"XML parsing errors for {filename}: document is incomplete\n")
 
 
 sys.stderr.write(f"A total of {count} sentences found\n")
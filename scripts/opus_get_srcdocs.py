@@ -12,7 +12,9 @@ import base64
 import json
 
 from os.path import exists
-from xml.parsers.expat import ParserCreate, ExpatError, errors
+from xml.parsers.expat import ParserCreate
+
+from xmlstream import parse, iter_links
 
 
 
@@ -211,14 +213,7 @@ def parse_document(filename):
     if verbose:
         sys.stderr.write(f"process {filename} ({count} sentences / {docCount} documents done)\n")
     with lzip.open(filename, 'r') as f:
-        for line in f:
-            try:
-                parser.Parse(line)
-            except:
-                errorCount += 1
-                if verbose:
-                    sys.stderr.write("Error:", errors.messages[err.code])
-                    sys.stderr.write(f"error parsing {line}\n")
+        errorCount = parse(parser, f, filename)
 
     if pars:
         print_document(pars)
@@ -227,7 +222,7 @@ def parse_document(filename):
 
     count += sentCount
     if errorCount > 0:
-        sys.stderr.write(f"XML parsing errors for {filename}: {errorCount} lines\n")
+        sys.stderr.write(f"XML parsing errors for {filename}: document is incomplete\n")
 
 
 
@@ -246,11 +241,8 @@ sentCount = 0
 errorCount = 0
 
 with gzip.open(align_file,'r') as f:
-    algparser = ParserCreate()
-    algparser.StartElementHandler = align_start_element
-
-    for line in f:
-        algparser.Parse(line)
+    for (name, attrs) in iter_links(f, align_file):
+        align_start_element(name, attrs)
 
 
         
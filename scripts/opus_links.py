@@ -14,7 +14,9 @@ import sqlite3
 import sys
 from os.path import exists
 
-from xml.parsers.expat import ParserCreate, ExpatError, errors
+from xml.parsers.expat import ExpatError
+
+from xmlstream import iter_links
 
 
 storage_url_base = 'https://object.pouta.csc.fi/OPUS-'
@@ -107,22 +109,17 @@ def get_sentence_ids(corpus, release, doc, ids, dbc):
 
 
 
-parser = ParserCreate()
-parser.StartElementHandler = start_element
 errorCount = 0
 
-with gzip.open(data_file,'r') as f:        
-    for line in f:        
-        try:
-            parser.Parse(line)
-        except ExpatError as err:
-            errorCount += 1
-            if verbose:
-                sys.stderr.write("Error:", errors.messages[err.code])
-                sys.stderr.write(f"error parsing {line}\n")
+with gzip.open(data_file,'r') as f:
+    try:
+        for (name, attrs) in iter_links(f, data_file):
+            start_element(name, attrs)
+    except ExpatError:
+        errorCount += 1
 
 
 if errorCount > 0:
-    sys.stderr.write(f"XML parsing errors for {data_file}: {errorCount} lines\n")
+    sys.stderr.write(f"XML parsing errors for {data_file}: alignments are incomplete\n")
 
 os.unlink(data_file)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+#
+# find translation candidates between two languages through a pivot language (English)
+# using the link DBs of both languages with the pivot (linkdb/eng-xxx.db and linkdb/eng-yyy.db)
+#
+# links of both link DBs are joined on identical pivot segments (the same internal
+# sentence IDs on the pivot side): each link DB is read once in a sequential scan and
+# sorted by the pivot sentence IDs (SQLite sorter, spills to temporary files), and
+# the two sorted streams are combined with a merge join; every pair of links with
+# the same pivot segment gives one candidate (non-pivot sentence IDs of both links)
+#
+# very frequent pivot segments (short sentences like "Thank you.") would produce
+# huge numbers of candidates; they are skipped if the product of their link counts
+# is larger than --max-fanout
+#
+# candidates are printed as srcSentIDs, trgSentIDs and score (TAB-separated, the
+# minimum of the aligner scores of both links) or stored in a pivot link DB (-o)
+# with the schema of alg2links.py: duplicates are merged (max score), all links
+# belong to one corpus 'pivot' (version = pivot language) and one bitext, and
+# srcIDs/trgIDs hold the internal sentence IDs (there are no OPUS documents)
+#
+# USAGE: pivot.py [-p eng] [-l linkdir] [-o pivotdb] [-b] [-f maxfanout] lang1 lang2
+
+
+import argparse
+import itertools
+import os
+import sqlite3
+import sys
+import time
+
+from bulkbuild import set_pragmas, create_indexes, PhaseTimer
+from linkids import decode_ids, register_functions
+from linkschema import LINKED_TABLES, LINKED_INDEXES, LINK_TABLES, LINK_INDEXES, CORPUS_TABLES, WATERMARK_TABLES
+
+
+buffersize = 100000
+
+
+## sort key for pivot segments: 8 bytes per sentence ID (big-endian), so that
+## byte order (SQLite BLOB order and Python bytes) equals the order of sentence IDs
+
+def pivot_key(data):
+    return b''.join(i.to_bytes(8, 'big') for i in decode_ids(data))
+
+
+##----------------------------------------------------------------
+## links of a link DB sorted by their pivot segment
+## yields (key, otherSentIDs, alignerScore) and counts rows in stats
+##----------------------------------------------------------------
+
+def sorted_links(linkDB, pivotColumn, otherColumn, stats):
+    con = sqlite3.connect(f"file:{linkDB}?immutable=1", uri=True)
+    con.create_function('pivot_key', 1, pivot_key, deterministic=True)
+    cur = con.execute(f"""SELECT pivot_key({pivotColumn}) AS k,{otherColumn},alignerScore FROM links
+                          WHERE k != x'' ORDER BY k""")
+    while True:
+        rows = cur.fetchmany(buffersize)
+        if not rows:
+            break
+        for (key, other, score) in rows:
+            other = tuple(decode_ids(other))
+            if other:
+                yield (key, other, score)
+        stats['rows'] += len(rows)
+    con.close()
+
+
+##----------------------------------------------------------------
+## merge join of two sorted streams on the pivot key
+##----------------------------------------------------------------
+
+def merge_join(streamA, streamB, maxfanout, stats):
+    groupsA = itertools.groupby(streamA, key=lambda row: row[0])
+    groupsB = itertools.groupby(streamB, key=lambda row: row[0])
+    a = next(groupsA, None)
+    b = next(groupsB, None)
+    while a is not None and b is not None:
+        if a[0] < b[0]:
+            a = next(groupsA, None)
+        elif a[0] > b[0]:
+            b = next(groupsB, None)
+        else:
+            rowsA = list(a[1])
+            rowsB = list(b[1])
+            fanout = len(rowsA) * len(rowsB)
+            stats['keys'] += 1
+            stats['maxfanout'] = max(stats['maxfanout'], fanout)
+            if fanout > maxfanout:
+                stats['skipped'] += 1
+                stats['skippedpairs'] += fanout
+            else:
+                for (keyA, otherA, scoreA) in rowsA:
+                    for (keyB, otherB, scoreB) in rowsB:
+                        score = min(scoreA, scoreB) if scoreA is not None and scoreB is not None else None
+                        yield (otherA, otherB, score)
+                stats['pairs'] += fanout
+            a = next(groupsA, None)
+            b = next(groupsB, None)
+
+
+##----------------------------------------------------------------
+## pivot link DB (schema of alg2links.py, see linkschema.py)
+##----------------------------------------------------------------
+
+## candidates are collected in a bare table and merged into links at the end
+## (sorted by source and target IDs, linkIDs are dense)
+
+def create_pivot_db(pivotDB):
+    con = sqlite3.connect(pivotDB)
+    for statement in LINKED_TABLES + LINK_TABLES + CORPUS_TABLES + WATERMARK_TABLES:
+        con.execute(statement)
+    con.execute("CREATE TABLE candidates ( src TEXT, trg TEXT, score REAL )")
+    con.commit()
+    return con
+
+
+def finish_pivot_db(con, pivot, srclang, trglang, fromDB, toDB, binary):
+    register_functions(con)
+    (srcSentIDs, trgSentIDs) = ('sentids_blob(src)', 'sentids_blob(trg)') if binary else ('src', 'trg')
+    con.execute(f"""INSERT INTO links (bitextID,srcIDs,trgIDs,srcSentIDs,trgSentIDs,alignType,alignerScore,cleanerScore)
+                    SELECT 1,src,trg,{srcSentIDs},{trgSentIDs},
+                           sentids_count(src) || '-' || sentids_count(trg),MAX(score),NULL
+                    FROM candidates GROUP BY src,trg ORDER BY src,trg""")
+    con.execute("DROP TABLE candidates")
+    count = con.execute("SELECT MAX(linkID) FROM links").fetchone()[0] or 0
+
+    cur = con.execute("SELECT linkID,srcSentIDs,trgSentIDs FROM links ORDER BY linkID")
+    while True:
+        rows = cur.fetchmany(buffersize)
+        if not rows:
+            break
+        con.executemany("INSERT INTO linkedsource VALUES (?,?,1,1)",
+                        [(sentID, row[0]) for row in rows for sentID in decode_ids(row[1])])
+        con.executemany("INSERT INTO linkedtarget VALUES (?,?,1,1)",
+                        [(sentID, row[0]) for row in rows for sentID in decode_ids(row[2])])
+
+    con.execute("INSERT INTO corpora VALUES (1,'pivot',?,?,?,?,?,1)", (pivot, srclang, trglang, srclang, trglang))
+    con.execute("INSERT INTO bitexts VALUES (1,'pivot',?,?,?)", (pivot, fromDB, toDB))
+    if count:
+        con.execute("INSERT INTO bitext_range VALUES (1,1,?)", (count,))
+        con.execute("INSERT INTO corpus_range VALUES (1,1,?)", (count,))
+    con.execute("INSERT INTO watermarks VALUES (1,1,?,1)", (count,))
+    con.execute("INSERT INTO corpus_watermarks VALUES (1,1,?,1)", (count,))
+    con.commit()
+    create_indexes(con, LINKED_INDEXES + LINK_INDEXES)
+    return count
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='pivot', description='translation candidates through a pivot language')
+    parser.add_argument("lang1", type=str, help="first language (ISO-639-3)")
+    parser.add_argument("lang2", type=str, help="second language (ISO-639-3)")
+    parser.add_argument("-p", "--pivot", type=str, default='eng', help="pivot language (default: eng)")
+    parser.add_argument("-l", "--linkdir", type=str, default='linkdb', help="directory of the link DBs")
+    parser.add_argument("-o", "--output", type=str, help="pivot link DB to be created (default: print candidates)")
+    parser.add_argument("-b", "--binary-ids", action='store_true', help="store sentence IDs as binary BLOBs (see linkids.py)")
+    parser.add_argument("-f", "--max-fanout", type=int, default=10000,
+                        help="skip pivot segments with more candidates than this (default: 10000)")
+    parser.add_argument("-C", "--cache-size", type=int, default=0, help="SQLite page cache size in MB for the pivot DB")
+    args = parser.parse_args()
+
+    (srclang, trglang) = sorted([args.lang1, args.lang2])
+    if args.pivot in (srclang, trglang):
+        sys.exit("the pivot language needs to be different from both languages")
+    if args.output and os.path.exists(args.output):
+        sys.exit(f"{args.output} exists already")
+
+    streams = []
+    inputs = []
+    stats = {}
+    for lang in (srclang, trglang):
+        linkDB = os.path.join(args.linkdir, '-'.join(sorted([args.pivot, lang])) + '.db')
+        if not os.path.isfile(linkDB):
+            sys.exit(f"{linkDB} not found")
+        (pivotColumn, otherColumn) = ('srcSentIDs', 'trgSentIDs') if args.pivot < lang else ('trgSentIDs', 'srcSentIDs')
+        stats[linkDB] = {'rows': 0}
+        streams.append(sorted_links(linkDB, pivotColumn, otherColumn, stats[linkDB]))
+        inputs.append(linkDB)
+
+    timer = PhaseTimer()
+    started = time.perf_counter()
+    joined = {'keys': 0, 'pairs': 0, 'skipped': 0, 'skippedpairs': 0, 'maxfanout': 0}
+    candidates = merge_join(streams[0], streams[1], args.max_fanout, joined)
+
+    timer.start('join')
+    if args.output:
+        con = create_pivot_db(args.output)
+        set_pragmas(con, args.cache_size)
+        while True:
+            batch = list(itertools.islice(candidates, buffersize))
+            if not batch:
+                break
+            con.executemany("INSERT INTO candidates VALUES (?,?,?)",
+                            [(' '.join(map(str, src)), ' '.join(map(str, trg)), score) for (src, trg, score) in batch])
+            elapsed = time.perf_counter() - started
+            sys.stderr.write(f"{joined['pairs']} candidates from {joined['keys']} pivot segments "
+                             f"({joined['pairs']/elapsed:.0f} candidates/s)\n")
+        con.commit()
+    else:
+        for (src, trg, score) in candidates:
+            print(f"{' '.join(map(str, src))}\t{' '.join(map(str, trg))}\t{'' if score is None else score}")
+    joinTime = time.perf_counter() - started
+
+    if args.output:
+        timer.start('links')
+        count = finish_pivot_db(con, args.pivot, srclang, trglang,
+                                os.path.basename(inputs[0]), os.path.basename(inputs[1]), args.binary_ids)
+        con.close()
+
+    for linkDB in inputs:
+        sys.stderr.write(f"{stats[linkDB]['rows']} links read from {linkDB}\n")
+    rows = sum(stats[linkDB]['rows'] for linkDB in inputs)
+    sys.stderr.write(f"{joined['keys']} shared pivot segments, {joined['pairs']} candidates "
+                     f"(largest segment: {joined['maxfanout']} candidates)\n")
+    sys.stderr.write(f"{joined['skipped']} pivot segments with {joined['skippedpairs']} candidates skipped "
+                     f"(more than {args.max_fanout} candidates)\n")
+    sys.stderr.write(f"sort and join: {rows/max(joinTime, 1e-9):.0f} links/s, "
+                     f"{joined['pairs']/max(joinTime, 1e-9):.0f} candidates/s\n")
+    if args.output:
+        sys.stderr.write(f"{count} distinct links stored in {args.output}\n")
+    timer.report()
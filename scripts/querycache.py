@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#
+# LRU cache for query results on read-only DB files
+#
+# entries are keyed on (DB file, file version, query, params) where the file
+# version is the modification time and size of the DB file; a DB file that is
+# replaced (rsync'd) gets a new version, so old results are never returned and
+# the entries of the old version are dropped when the change is noticed
+# (files are checked with os.stat at most once per check interval)
+#
+# the cache holds at most maxsize entries (least recently used ones are evicted)
+# and can be saved to a file and loaded again (pickle) to keep it across restarts;
+# hits, misses, evictions and invalidations are counted per query name
+#
+# USAGE: querycache.py cachefile   (print statistics of a saved cache)
+
+
+import argparse
+import collections
+import os
+import pickle
+import threading
+import time
+
+
+class QueryCache:
+
+    def __init__(self, maxsize=100000, filename=None, checkinterval=1.0):
+        self.maxsize = maxsize
+        self.filename = filename
+        self.checkinterval = checkinterval
+        self.entries = collections.OrderedDict()
+        self.versions = {}
+        self.counts = collections.defaultdict(lambda: {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0})
+        self.lock = threading.RLock()
+        if filename and os.path.exists(filename):
+            self.load(filename)
+
+    ## version of a DB file: (mtime, size), re-checked after checkinterval seconds
+
+    def version(self, dbfile):
+        now = time.monotonic()
+        with self.lock:
+            if dbfile in self.versions and now - self.versions[dbfile][1] < self.checkinterval:
+                return self.versions[dbfile][0]
+        try:
+            stat = os.stat(dbfile)
+            version = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            version = None
+        with self.lock:
+            if dbfile in self.versions and self.versions[dbfile][0] != version:
+                self.invalidate(dbfile, version)
+            self.versions[dbfile] = (version, now)
+        return version
+
+    ## drop all entries of a DB file that do not have the given version
+
+    def invalidate(self, dbfile, version=None):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == dbfile and key[1] != version]:
+                self.counts[key[2]]['invalidations'] += 1
+                del self.entries[key]
+
+    ## returns (True, value) for cached results and (False, None) otherwise
+    ## (version is the version of the DB file the caller works with, it is
+    ##  looked up if it is not given)
+
+    def get(self, dbfile, query, params, version=None):
+        key = (dbfile, version if version is not None else self.version(dbfile), query, params)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counts[query]['hits'] += 1
+                return (True, self.entries[key])
+            self.counts[query]['misses'] += 1
+        return (False, None)
+
+    def put(self, dbfile, query, params, value, version=None):
+        key = (dbfile, version if version is not None else self.version(dbfile), query, params)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                oldest = self.entries.popitem(last=False)[0]
+                self.counts[oldest[2]]['evictions'] += 1
+
+    ## cached call of function(*args), args need to be hashable
+
+    def call(self, dbfile, function, *args):
+        version = self.version(dbfile)
+        (found, value) = self.get(dbfile, function.__name__, args, version)
+        if not found:
+            value = function(*args)
+            self.put(dbfile, function.__name__, args, value, version)
+        return value
+
+    def stats(self):
+        with self.lock:
+            stats = {query: dict(self.counts[query]) for query in sorted(self.counts)}
+            for query in stats:
+                lookups = stats[query]['hits'] + stats[query]['misses']
+                stats[query]['hitrate'] = round(stats[query]['hits'] / lookups, 4) if lookups else 0.0
+            return {'entries': len(self.entries), 'maxsize': self.maxsize, 'queries': stats}
+
+    ## save and load the cache (entries in LRU order, versions of DB files)
+    ## entries of DB files that have changed in the meantime are not loaded
+
+    def save(self, filename=None):
+        filename = filename if filename else self.filename
+        with self.lock:
+            data = {'entries': list(self.entries.items()),
+                    'versions': {dbfile: self.versions[dbfile][0] for dbfile in self.versions}}
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + '.tmp', filename)
+
+    def load(self, filename):
+        with open(filename, 'rb') as f:
+            data = pickle.load(f)
+        current = {}
+        with self.lock:
+            for (key, value) in data['entries'][-self.maxsize:]:
+                if key[0] not in current:
+                    current[key[0]] = self.version(key[0])
+                if key[1] == current[key[0]]:
+                    self.entries[key] = value
+        return len(self.entries)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='querycache', description='print statistics of a saved query cache')
+    parser.add_argument("cachefile", type=str, help="saved query cache")
+    args = parser.parse_args()
+
+    with open(args.cachefile, 'rb') as f:
+        data = pickle.load(f)
+    counts = collections.Counter((key[0], key[2]) for (key, value) in data['entries'])
+    print(f"{len(data['entries'])} entries")
+    for (dbfile, query) in sorted(counts):
+        print(f"{counts[(dbfile, query)]:10d}  {query:20s} {dbfile}")
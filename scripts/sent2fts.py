@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+#
+# create or update the full-text search DB (xxx.fts5.db) of a sentence DB (xxx.db)
+#
+# sentences are added in batches of rowids (the rowids of the sentence DB are kept)
+# and the last rowid that has been indexed is stored as a watermark in the same
+# transaction, so updates only index the sentences that are new in the sentence DB
+# and interrupted jobs continue where they stopped
+#
+# FTS5 merge parameters (automerge, crisismerge, hashsize) are set for large inserts
+# and new DBs are optimized at the end (all segments merged into one)
+#
+# parallel mode (-j): the rowid range is split into parts that are indexed
+# in temporary FTS DBs; their segments are copied into the FTS DB with new
+# segment IDs (see merge_shards) and merged by the final optimize; this relies
+# on the FTS5 file format (version 4), other versions are indexed serially and
+# merged indexes are checked with the FTS5 integrity-check before they are committed
+#
+# the FTS5 tokenizer is chosen by language (see TOKENIZERS) and stored together
+# with the language in the table metadata
+#
+# USAGE: sent2fts.py [-l language] [-k tokenizer] [-b batchsize] [-j jobs] [-T tmpdir] sentdb ftsdb
+
+
+import argparse
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bulkbuild import set_pragmas
+
+
+## structure and averages records in sentences_data and
+## the bit position of segment IDs in the rowids of data pages (see fts5_index.c)
+
+STRUCTURE_ROWID = 10
+AVERAGES_ROWID = 1
+SEGMENT_SHIFT = 37
+
+## FTS5 format version (sentences_config) that the layout above belongs to
+## (version 5 and structure records starting with 0xffffffff are written with secure-delete)
+
+FTS5_VERSION = 4
+
+
+##----------------------------------------------------------------
+## FTS5 tokenizers per language (ISO-639-3 codes)
+##
+## languages that do not separate words with spaces are indexed with trigrams
+## (substring search, see search for queries with less than 3 characters),
+## languages with distinctive diacritics (tones) keep them and all others use
+## unicode61 with diacritics removed from sentences and queries
+##----------------------------------------------------------------
+
+TOKENIZERS = {'default':    'unicode61 remove_diacritics 2',
+              'diacritics': 'unicode61 remove_diacritics 0',
+              'trigram':    'trigram'}
+
+LANGUAGE_CLASSES = {'zho': 'trigram', 'cmn': 'trigram', 'yue': 'trigram', 'wuu': 'trigram',
+                    'lzh': 'trigram', 'jpn': 'trigram', 'tha': 'trigram', 'lao': 'trigram',
+                    'khm': 'trigram', 'mya': 'trigram', 'bod': 'trigram', 'dzo': 'trigram',
+                    'vie': 'diacritics', 'yor': 'diacritics'}
+
+## tokenizer of FTS5 tables created without tokenize option
+
+FTS5_DEFAULT_TOKENIZER = 'unicode61'
+
+
+def language_tokenizer(language):
+    return TOKENIZERS[LANGUAGE_CLASSES.get(language, 'default')]
+
+
+## tokenizer of an existing FTS DB (from metadata or from the table definition)
+
+def get_tokenizer(con):
+    if con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='metadata'").fetchone():
+        row = con.execute("SELECT value FROM metadata WHERE key='tokenizer'").fetchone()
+        if row:
+            return row[0]
+    row = con.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='sentences'").fetchone()
+    if row:
+        match = re.search(r"tokenize\s*=\s*['\"](.*?)['\"]", row[0])
+        if match:
+            return match.group(1)
+    return FTS5_DEFAULT_TOKENIZER
+
+
+##----------------------------------------------------------------
+## search sentences that include a word or phrase
+## (trigram indexes cannot match strings with less than 3 characters,
+## those are searched with LIKE over all sentences; +sentence keeps
+## the LIKE constraint away from the trigram index, which would not find them)
+##----------------------------------------------------------------
+
+def search(con, term, tokenizer, limit=-1):
+    if tokenizer.split()[0] == 'trigram' and len(term) < 3:
+        return con.execute("SELECT rowid,sentence FROM sentences WHERE +sentence LIKE ? LIMIT ?",
+                           (f"%{term}%", limit)).fetchall()
+    return con.execute("SELECT rowid,sentence FROM sentences WHERE sentences MATCH ? LIMIT ?",
+                       ('"' + term.replace('"', '""') + '"', limit)).fetchall()
+
+
+##----------------------------------------------------------------
+## create the FTS table, the watermark and the metadata
+## (legacy FTS DBs get a watermark from the largest indexed rowid)
+##----------------------------------------------------------------
+
+def create_fts(con, tokenizer=FTS5_DEFAULT_TOKENIZER, language=None):
+    con.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS sentences USING FTS5(sentence, tokenize='{tokenizer}')")
+    con.execute("CREATE TABLE IF NOT EXISTS metadata ( key TEXT NOT NULL PRIMARY KEY, value TEXT )")
+    con.execute("INSERT OR REPLACE INTO metadata VALUES ('tokenizer',?)", (tokenizer,))
+    if language:
+        con.execute("INSERT OR REPLACE INTO metadata VALUES ('language',?)", (language,))
+    con.execute("CREATE TABLE IF NOT EXISTS watermark ( lastID INTEGER NOT NULL )")
+    if not con.execute("SELECT lastID FROM watermark").fetchone():
+        row = con.execute("SELECT rowid FROM sentences ORDER BY rowid DESC LIMIT 1").fetchone()
+        con.execute("INSERT INTO watermark VALUES (?)", (row[0] if row else 0,))
+    con.commit()
+
+
+def get_watermark(con):
+    return con.execute("SELECT lastID FROM watermark").fetchone()[0]
+
+
+def set_merge_options(con, automerge, crisismerge, hashsize):
+    for (option, value) in (('automerge', automerge), ('crisismerge', crisismerge),
+                            ('hashsize', hashsize * 1024 * 1024)):
+        con.execute("INSERT INTO sentences(sentences, rank) VALUES (?,?)", (option, value))
+    con.commit()
+
+
+##----------------------------------------------------------------
+## index sentences with start < rowid <= end from the attached sentence DB
+## (one transaction per batch of rowids, including the watermark)
+##----------------------------------------------------------------
+
+def index_range(con, start, end, batchsize, progress=True):
+    count = 0
+    started = time.perf_counter()
+    while start < end:
+        last = min(start + batchsize, end)
+        cur = con.execute("""INSERT INTO main.sentences (rowid,sentence)
+                             SELECT rowid,sentence FROM org.sentences WHERE rowid>? AND rowid<=?""", (start, last))
+        count += cur.rowcount
+        con.execute("UPDATE watermark SET lastID=?", (last,))
+        con.commit()
+        start = last
+        if progress:
+            elapsed = time.perf_counter() - started
+            sys.stderr.write(f"indexed rowids up to {last} ({count} sentences, {count/elapsed:.0f} sentences/s)\n")
+            sys.stderr.flush()
+    return count
+
+
+def optimize(con):
+    con.execute("INSERT INTO sentences(sentences) VALUES ('optimize')")
+    con.commit()
+
+
+##----------------------------------------------------------------
+## SQLite varints (used in FTS5 structure and averages records)
+##----------------------------------------------------------------
+
+def get_varint(data, i):
+    value = 0
+    for n in range(8):
+        value = (value << 7) | (data[i+n] & 0x7f)
+        if data[i+n] < 0x80:
+            return (value, i+n+1)
+    return ((value << 8) | data[i+8], i+9)
+
+
+def put_varint(value):
+    if value > 0x00ffffffffffffff:
+        data = [value & 0xff]
+        value >>= 8
+        for n in range(8):
+            data.append((value & 0x7f) | 0x80)
+            value >>= 7
+    else:
+        data = [value & 0x7f]
+        value >>= 7
+        while value:
+            data.append((value & 0x7f) | 0x80)
+            value >>= 7
+    return bytes(reversed(data))
+
+
+##----------------------------------------------------------------
+## read and write the FTS5 structure record:
+##   4-byte cookie, nLevel, nSegment, nWriteCounter and for each level
+##   nMerge, nSeg and (segid, pgnoFirst, pgnoLast) for each segment
+##
+## returns (cookie, writeCounter, levels) with levels = [[nMerge, [segments]], ...]
+##----------------------------------------------------------------
+
+def read_structure(con):
+    data = con.execute("SELECT block FROM sentences_data WHERE id=?", (STRUCTURE_ROWID,)).fetchone()[0]
+    if data[4:8] == b'\xff\xff\xff\xff':
+        raise ValueError("FTS5 structure record version 2 (secure-delete) is not supported")
+    (nLevel, i) = get_varint(data, 4)
+    (nSegment, i) = get_varint(data, i)
+    (writeCounter, i) = get_varint(data, i)
+    levels = []
+    for l in range(nLevel):
+        (nMerge, i) = get_varint(data, i)
+        (nSeg, i) = get_varint(data, i)
+        segments = []
+        for s in range(nSeg):
+            (segid, i) = get_varint(data, i)
+            (first, i) = get_varint(data, i)
+            (last, i) = get_varint(data, i)
+            segments.append((segid, first, last))
+        levels.append([nMerge, segments])
+    return (data[:4], writeCounter, levels)
+
+
+def write_structure(con, cookie, writeCounter, levels):
+    data = bytearray(cookie)
+    data += put_varint(len(levels))
+    data += put_varint(sum(len(segments) for (nMerge, segments) in levels))
+    data += put_varint(writeCounter)
+    for (nMerge, segments) in levels:
+        data += put_varint(nMerge)
+        data += put_varint(len(segments))
+        for segment in segments:
+            for value in segment:
+                data += put_varint(value)
+    con.execute("UPDATE sentences_data SET block=? WHERE id=?", (bytes(data), STRUCTURE_ROWID))
+
+
+## averages record: total number of rows and number of tokens per column
+
+def read_averages(con):
+    row = con.execute("SELECT block FROM sentences_data WHERE id=?", (AVERAGES_ROWID,)).fetchone()
+    values = []
+    i = 0
+    while row and i < len(row[0]):
+        (value, i) = get_varint(row[0], i)
+        values.append(value)
+    return values
+
+
+def write_averages(con, values):
+    con.execute("INSERT OR REPLACE INTO sentences_data VALUES (?,?)",
+                (AVERAGES_ROWID, b''.join(put_varint(v) for v in values)))
+
+
+## True if the segments of the FTS DB can be copied by merge_shards
+
+def known_format(con):
+    row = con.execute("SELECT v FROM sentences_config WHERE k='version'").fetchone()
+    if not row or row[0] != FTS5_VERSION:
+        return False
+    row = con.execute("SELECT block FROM sentences_data WHERE id=?", (STRUCTURE_ROWID,)).fetchone()
+    return row is not None and row[0][4:8] != b'\xff\xff\xff\xff'
+
+
+##----------------------------------------------------------------
+## build the FTS index for start < rowid <= end in a temporary DB
+##----------------------------------------------------------------
+
+def build_shard(shard, sentDB, tokenizer, start, end, batchsize, automerge, crisismerge, hashsize):
+    con = sqlite3.connect(shard)
+    create_fts(con, tokenizer)
+    set_merge_options(con, automerge, crisismerge, hashsize)
+    con.execute(f"ATTACH DATABASE 'file:{sentDB}?immutable=1' AS org")
+    count = index_range(con, start, end, batchsize, progress=False)
+    optimize(con)
+    con.close()
+    sys.stderr.write(f"indexed rowids {start+1}-{end} ({count} sentences) in {shard}\n")
+    sys.stderr.flush()
+    return count
+
+
+##----------------------------------------------------------------
+## copy the segments, content and docsize rows of the shards into the FTS DB
+##
+## segment IDs are renumbered (they are part of the rowids of data pages and
+## of the keys in sentences_idx) and all shard segments are appended to
+## level 0 of the structure record; rows counts and token counts are added
+## to the averages record; everything is done in one transaction that is
+## rolled back if a shard has an unknown format or the integrity-check fails
+##
+## returns False if the shards could not be merged
+##----------------------------------------------------------------
+
+def merge_shards(con, shards, lastID):
+    try:
+        copy_shards(con, shards)
+        con.execute("INSERT INTO sentences(sentences) VALUES ('integrity-check')")
+    except (sqlite3.DatabaseError, ValueError) as e:
+        con.rollback()
+        sys.stderr.write(f"could not merge the FTS shards ({e})\n")
+        return False
+    con.execute("UPDATE watermark SET lastID=?", (lastID,))
+    con.commit()
+    return True
+
+
+def copy_shards(con, shards):
+    (cookie, writeCounter, levels) = read_structure(con)
+    averages = read_averages(con)
+    used = set(segment[0] for (nMerge, segments) in levels for segment in segments)
+    if not levels:
+        levels.append([0, []])
+
+    for shard in shards:
+        shardcon = sqlite3.connect(f"file:{shard}?immutable=1", uri=True)
+        if not known_format(shardcon):
+            raise ValueError(f"unknown FTS5 format in {shard}")
+        (shardCookie, shardCounter, shardLevels) = read_structure(shardcon)
+        for (nMerge, segments) in shardLevels:
+            for (segid, first, last) in segments:
+                newid = 1
+                while newid in used:
+                    newid += 1
+                used.add(newid)
+                offset = (newid - segid) << SEGMENT_SHIFT
+                rows = shardcon.execute("SELECT id,block FROM sentences_data WHERE id>=? AND id<?",
+                                        (segid << SEGMENT_SHIFT, (segid+1) << SEGMENT_SHIFT))
+                con.executemany("INSERT INTO sentences_data VALUES (?,?)", ((i+offset, b) for (i, b) in rows))
+                rows = shardcon.execute("SELECT term,pgno FROM sentences_idx WHERE segid=?", (segid,))
+                con.executemany("INSERT INTO sentences_idx VALUES (?,?,?)", ((newid, t, p) for (t, p) in rows))
+                levels[0][1].append((newid, first, last))
+        for table in ('sentences_content', 'sentences_docsize'):
+            con.executemany(f"INSERT INTO {table} VALUES (?,?)", shardcon.execute(f"SELECT * FROM {table}"))
+        shardAverages = read_averages(shardcon)
+        if not averages:
+            averages = [0] * len(shardAverages)
+        averages = [a + b for (a, b) in zip(averages, shardAverages)]
+        writeCounter += shardCounter
+        shardcon.close()
+
+    write_structure(con, cookie, writeCounter, levels)
+    write_averages(con, averages)
+
+
+def index_parallel(ftsDB, sentDB, tokenizer, start, end, jobs, tmpdir, batchsize, automerge, crisismerge, hashsize):
+    step = (end - start + jobs - 1) // jobs
+    shards = []
+    tasks = []
+    for i in range(jobs):
+        first = start + i * step
+        last = min(first + step, end)
+        if first >= last:
+            break
+        (fd, shard) = tempfile.mkstemp(prefix='sent2fts_', suffix='.db', dir=tmpdir)
+        os.close(fd)
+        os.unlink(shard)
+        shards.append(shard)
+        tasks.append((shard, sentDB, tokenizer, first, last, batchsize, automerge, crisismerge, hashsize))
+
+    try:
+        context = multiprocessing.get_context('fork')
+        with context.Pool(len(tasks)) as pool:
+            count = sum(pool.starmap(build_shard, tasks))
+        con = sqlite3.connect(ftsDB, timeout=7200)
+        if not merge_shards(con, shards, end):
+            sys.stderr.write(f"index rowids {start+1}-{end} serially\n")
+            con.execute(f"ATTACH DATABASE 'file:{sentDB}?immutable=1' AS org")
+            count = index_range(con, start, end, batchsize)
+        con.close()
+    finally:
+        for shard in shards:
+            if os.path.exists(shard):
+                os.unlink(shard)
+    return count
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='sent2fts',
+                                     description='create or update a full-text search DB from a sentence DB')
+    parser.add_argument("sentdb", type=str, help="sentence database file (input)")
+    parser.add_argument("ftsdb", type=str, help="full-text search database file (output)")
+    parser.add_argument("-l", "--language", type=str,
+                        help="ISO-639-3 language code for selecting the tokenizer (default: name of sentdb, e.g. eng.db)")
+    parser.add_argument("-k", "--tokenizer", type=str,
+                        help="FTS5 tokenizer for new DBs (default: depending on language, see TOKENIZERS)")
+    parser.add_argument("-b", "--batch-size", type=int, default=1000000,
+                        help="number of rowids per transaction (default: 1000000)")
+    parser.add_argument("-a", "--automerge", type=int, default=8,
+                        help="FTS5 automerge: number of segments per level to be merged (default: 8)")
+    parser.add_argument("-c", "--crisismerge", type=int, default=64,
+                        help="FTS5 crisismerge: max number of segments per level (default: 64)")
+    parser.add_argument("-H", "--hash-size", type=int, default=64,
+                        help="FTS5 hashsize: memory in MB for pending terms before a segment is written (default: 64)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of processes for indexing in parallel")
+    parser.add_argument("-T", "--tmpdir", type=str, help="directory for temporary FTS DBs (default: directory of ftsdb)")
+    parser.add_argument("-O", "--optimize", action='store_true',
+                        help="merge all segments also after incremental updates (default: only for new DBs)")
+    parser.add_argument("-n", "--no-optimize", action='store_true', help="never merge all segments at the end")
+    parser.add_argument("-i", "--integrity-check", action='store_true', help="check the FTS index at the end")
+    parser.add_argument("-C", "--cache-size", type=int, default=0, help="SQLite page cache size in MB (default: SQLite default)")
+    args = parser.parse_args()
+
+    ftsDB = args.ftsdb
+    sentDB = args.sentdb
+    tmpdir = args.tmpdir if args.tmpdir else os.path.dirname(os.path.abspath(ftsDB))
+
+    con = sqlite3.connect(ftsDB, timeout=7200)
+    set_pragmas(con, args.cache_size)
+    language = args.language if args.language else os.path.basename(sentDB).split('.')[0]
+    tokenizer = args.tokenizer if args.tokenizer else language_tokenizer(language)
+    newDB = not con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sentences'").fetchone()
+    if not newDB and get_tokenizer(con) != tokenizer:
+        sys.stderr.write(f"keep tokenizer '{get_tokenizer(con)}' of {ftsDB} (rebuild for '{tokenizer}')\n")
+        tokenizer = get_tokenizer(con)
+    create_fts(con, tokenizer, language)
+    set_merge_options(con, args.automerge, args.crisismerge, args.hash_size)
+    con.execute(f"ATTACH DATABASE 'file:{sentDB}?immutable=1' AS org")
+
+    start = get_watermark(con)
+    end = con.execute("SELECT MAX(rowid) FROM org.sentences").fetchone()[0] or 0
+    if end <= start:
+        sys.stderr.write(f"{ftsDB} is up-to-date (last rowid {start})\n")
+        sys.exit(0)
+    sys.stderr.write(f"indexing rowids {start+1}-{end} of {sentDB}\n")
+
+    started = time.perf_counter()
+    if args.jobs > 1 and not known_format(con):
+        sys.stderr.write(f"unknown FTS5 format in {ftsDB}, index serially\n")
+        args.jobs = 1
+    if args.jobs > 1:
+        con.close()
+        count = index_parallel(ftsDB, sentDB, tokenizer, start, end, args.jobs, tmpdir, args.batch_size,
+                               args.automerge, args.crisismerge, args.hash_size)
+        con = sqlite3.connect(ftsDB, timeout=7200)
+        set_pragmas(con, args.cache_size)
+    else:
+        count = index_range(con, start, end, args.batch_size)
+    sys.stderr.write(f"{count} sentences indexed in {time.perf_counter()-started:.1f}s\n")
+
+    if (newDB or args.optimize) and not args.no_optimize:
+        started = time.perf_counter()
+        optimize(con)
+        sys.stderr.write(f"optimized in {time.perf_counter()-started:.1f}s\n")
+
+    if args.integrity_check:
+        con.execute("INSERT INTO sentences(sentences) VALUES ('integrity-check')")
+        sys.stderr.write("integrity check passed\n")
+    con.close()
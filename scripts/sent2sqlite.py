@@ -1,62 +1,137 @@
 #!/usr/bin/env python3
+#
+# add sentences from STDIN (one per line) to a sentence DB (xxx.db)
+#
+# lines are read as bytes and decoded one by one: lines with encoding errors
+# are counted and skipped, empty lines are skipped
+#
+# --sorted-input: the input is strictly sorted in byte order (LC_ALL=C sort -u)
+# and sentences are inserted without INSERT OR IGNORE; new DBs are created
+# without the unique index, which is added at the end, and existing DBs can
+# only be extended with sentences that sort after the last sentence in the DB
+# (existing DBs without the index, left by an interrupted run, get it first)
+#
+# --hashed: new DBs are created with the hash-keyed schema (see sentdb.py),
+# existing DBs are always updated in their own schema
+#
+# USAGE: sent2sqlite.py [-S] [-H] [-J journalmode] [-Y synchronous] [-C cachesize] dbfile < sentences.txt
 
-import sys
+
+import argparse
 import sqlite3
+import sys
+import time
+
+from bulkbuild import JOURNAL_MODES, SYNCHRONOUS, set_pragmas
+from sentdb import create_index, open_table, new_table, add_sentences, sentence_hash
+
+
+parser = argparse.ArgumentParser(prog='sent2sqlite', description='add sentences from STDIN to a sentence database')
+parser.add_argument("dbfile", type=str, help="sentence database file")
+parser.add_argument("-b", "--buffer-size", type=int, default=100000, help="number of sentences per transaction (default: 100000)")
+parser.add_argument("-S", "--sorted-input", action='store_true',
+                    help="input is strictly sorted in byte order and unique (insert without uniqueness check)")
+parser.add_argument("-H", "--hashed", action='store_true', help="create new DBs with hash-keyed sentences (see sentdb.py)")
+parser.add_argument("-J", "--journal-mode", type=str, choices=JOURNAL_MODES, help="SQLite journal mode (default: unchanged)")
+parser.add_argument("-Y", "--synchronous", type=str, choices=SYNCHRONOUS, help="SQLite synchronous mode (default: unchanged)")
+parser.add_argument("-C", "--cache-size", type=int, default=0, help="SQLite page cache size in MB (default: SQLite default)")
+args = parser.parse_args()
+
+dbfile = args.dbfile
+buffersize = args.buffer_size
+sortedInput = args.sorted_input
 
-dbfile = sys.argv[1]
 con = sqlite3.connect(dbfile, timeout=7200)
+set_pragmas(con, args.cache_size, journalmode=args.journal_mode, synchronous=args.synchronous)
 cur = con.cursor()
-cur.execute("CREATE TABLE IF NOT EXISTS sentences ( sentence TEXT UNIQUE PRIMARY KEY NOT NULL )")
-con.commit()
-cur.close()
+
+newDB = new_table(con)
+hashed = open_table(con, args.hashed, index=not (sortedInput and newDB))
+
+if sortedInput and hashed and not newDB:
+    sys.stderr.write("no sorted input mode for existing DBs with hashed sentences, look up all sentences\n")
+    sortedInput = False
+if sortedInput:
+    last = '' if newDB else cur.execute("SELECT MAX(sentence) FROM sentences").fetchone()[0] or ''
+
+
+## insert a list of sentences, returns the number of new sentences
+
+def insert(sentences):
+    if not sortedInput:
+        return add_sentences(con, sentences)
+    if hashed:
+        cur.executemany("INSERT INTO sentences (sentence,hash) VALUES (?,?)", [(s, sentence_hash(s)) for s in sentences])
+    else:
+        cur.executemany("INSERT INTO sentences (sentence) VALUES (?)", [tuple([s]) for s in sentences])
+    con.commit()
+    return cur.rowcount
+
+
+## create the index of new DBs that are built from sorted input
+
+def finish():
+    if sortedInput and newDB:
+        create_index(con, hashed)
 
 
 buffer = []
-buffersize = 100000
 bufferCount = 0
+lineCount = 0
+rowCount = 0
+errors = 0
+skipped = 0
+started = time.perf_counter()
+
+def insert_buffer():
+    global buffer, bufferCount, rowCount
+    rowCount += insert(buffer)
+    buffer = []
+
+    bufferCount += 1
+    sys.stderr.write('.')
+    if not bufferCount % 100:
+        elapsed = time.perf_counter() - started
+        sys.stderr.write(f" {bufferCount} * {buffersize} ({rowCount/elapsed:.0f} rows/s)\n")
+    sys.stderr.flush()
 
-while True:
+
+for line in sys.stdin.buffer:
+    lineCount += 1
     try:
-        line = sys.stdin.readline()
-        if line == '':
-            break
-        buffer.append(tuple([line.rstrip()]))
-        if len(buffer) >= buffersize:
-            con = sqlite3.connect(dbfile, timeout=7200)
-            cur = con.cursor()
-            cur.executemany("""INSERT OR IGNORE INTO sentences VALUES(?)""", buffer)
-            con.commit()
-            cur.close()
-            buffer = []
-        
-            bufferCount += 1
-            sys.stderr.write('.')
-            if not bufferCount % 100:
-                sys.stderr.write(f" {bufferCount} * {buffersize}\n")
-            sys.stderr.flush()
-    except:
-        sys.stderr.write("Something wrong with the input. Ignore this line.\n")
-        sys.stderr.flush()
-        
-
-# for line in sys.stdin:
-#     buffer.append(tuple([line.rstrip()]))
-#     if len(buffer) >= buffersize:
-#         cur.executemany("""INSERT OR IGNORE INTO sentences VALUES(?)""", buffer)
-#         con.commit()
-#         buffer = []
-        
-#         bufferCount += 1
-#         sys.stderr.write('.')
-#         if not bufferCount % 100:
-#             sys.stderr.write(f" {bufferCount} * {buffersize}\n")
-#         sys.stderr.flush()
-
-
-
-if len(buffer) > 0:
-    con = sqlite3.connect(dbfile, timeout=7200)
-    cur = con.cursor()
-    cur.executemany("""INSERT OR IGNORE INTO sentences VALUES(?)""", buffer)
-    con.commit()
-    cur.close()
+        sentence = line.decode('utf-8').rstrip()
+    except UnicodeDecodeError as e:
+        errors += 1
+        if errors <= 10:
+            sys.stderr.write(f"\nencoding error in line {lineCount}: {e}. Ignore this line.\n")
+        continue
+    if not sentence:
+        continue
+
+    if sortedInput:
+        if sentence <= last:
+            if sentence == last:
+                skipped += 1
+                continue
+            if buffer:
+                insert_buffer()
+            finish()
+            sys.exit(f"\ninput is not sorted in line {lineCount} ({rowCount} sentences added), "
+                     "run again without --sorted-input")
+        last = sentence
+
+    buffer.append(sentence)
+    if len(buffer) >= buffersize:
+        insert_buffer()
+
+if buffer:
+    insert_buffer()
+finish()
+con.close()
+
+elapsed = time.perf_counter() - started
+sys.stderr.write(f"\n{rowCount} sentences added from {lineCount} lines in {elapsed:.1f}s ({rowCount/elapsed:.0f} rows/s)\n")
+if skipped:
+    sys.stderr.write(f"{skipped} duplicate lines skipped\n")
+if errors:
+    sys.stderr.write(f"{errors} lines with encoding errors skipped\n")
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+#
+# functions for sentence DBs (xxx.db)
+#
+# sentences are resolved in batches: they are loaded into a temporary table
+# that is joined with the sentences table, missing sentences are inserted in
+# one transaction and their rowids are fetched back with the same join
+#
+# there are two schemas for the sentences table:
+#
+#   plain:   sentences ( sentence TEXT UNIQUE PRIMARY KEY NOT NULL )
+#   hashed:  sentences ( id INTEGER PRIMARY KEY, sentence TEXT NOT NULL, hash INTEGER NOT NULL )
+#            with a (non-unique) index idx_sentences_hash on hash
+#
+# the plain schema stores each sentence twice (table and unique index), the hashed
+# schema only stores a 64-bit hash in the index; sentences are looked up by hash
+# and sentence, so hash collisions are possible and resolved by comparing the text
+# id is an alias of rowid (stable, also after VACUUM) and all readers that
+# select rowid and sentence work with both schemas
+#
+# USAGE: sentdb.py plain.db hashed.db   (convert a sentence DB, keeping rowids)
+
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+
+
+## 64-bit hash of a sentence (signed to fit into an SQLite INTEGER)
+
+def sentence_hash(sentence):
+    return int.from_bytes(hashlib.blake2b(sentence.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def register_functions(con):
+    con.create_function('sentence_hash', 1, sentence_hash, deterministic=True)
+
+
+##----------------------------------------------------------------
+## create the sentences table (plain or hashed)
+## the index can be left out for bulk inserts and created with create_index
+## (plain tables without index get a unique index idx_sentences instead
+##  of the primary key)
+##----------------------------------------------------------------
+
+def create_table(con, hashed=False, index=True):
+    if hashed:
+        con.execute("CREATE TABLE IF NOT EXISTS sentences ( id INTEGER PRIMARY KEY, sentence TEXT NOT NULL, hash INTEGER NOT NULL )")
+        if index:
+            create_index(con, hashed)
+    elif index:
+        con.execute("CREATE TABLE IF NOT EXISTS sentences ( sentence TEXT UNIQUE PRIMARY KEY NOT NULL )")
+    else:
+        con.execute("CREATE TABLE IF NOT EXISTS sentences ( sentence TEXT NOT NULL )")
+    con.commit()
+
+
+def create_index(con, hashed=False):
+    if has_index(con, hashed):
+        return
+    if hashed:
+        con.execute("CREATE INDEX IF NOT EXISTS idx_sentences_hash ON sentences (hash)")
+    else:
+        con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sentences ON sentences (sentence)")
+    con.commit()
+
+
+def is_hashed(con, schema='main'):
+    return 'hash' in [row[1] for row in con.execute(f"PRAGMA {schema}.table_info(sentences)")]
+
+
+## unique index on sentence (plain) or index on hash (hashed), including the
+## automatic index of sentence TEXT UNIQUE PRIMARY KEY
+
+def has_index(con, hashed=False):
+    column = 'hash' if hashed else 'sentence'
+    for (seq, name, unique, *rest) in con.execute("PRAGMA index_list(sentences)").fetchall():
+        if (unique or hashed) and [row[2] for row in con.execute(f"PRAGMA index_info('{name}')")] == [column]:
+            return True
+    return False
+
+
+def has_table(con):
+    return con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sentences'").fetchone() is not None
+
+
+## True if there is no sentences table or the table is empty
+## (tables of bulk builds that were interrupted before anything was committed)
+
+def new_table(con):
+    if not has_table(con):
+        return True
+    return con.execute("SELECT 1 FROM sentences LIMIT 1").fetchone() is None
+
+
+##----------------------------------------------------------------
+## open the sentences table for inserts, returns True for hashed tables
+##
+## new tables are created in the given schema (see create_table), existing
+## tables keep their own schema and get their index if it is missing (bulk
+## builds that have been interrupted before the index was created at the end),
+## so that existing sentences are found and not inserted again
+##----------------------------------------------------------------
+
+def open_table(con, hashed=False, index=True):
+    if not has_table(con):
+        create_table(con, hashed, index)
+        return hashed
+    if hashed and not is_hashed(con):
+        sys.stderr.write("existing sentence DB with plain sentences, -H/--hashed is ignored\n")
+    hashed = is_hashed(con)
+    if index and not has_index(con, hashed):
+        sys.stderr.write("create the missing index on sentences\n")
+        create_index(con, hashed)
+    return hashed
+
+
+##----------------------------------------------------------------
+## map a list of sentences to their rowids in the sentence DB
+##
+## returns a dictionary sentence -> rowid and the list of sentences
+## that had to be inserted (in the order of insertion)
+## new sentences are inserted in order of their first occurrence
+##----------------------------------------------------------------
+
+def resolve_sentences(con, sentences, insert=True):
+    if is_hashed(con):
+        return resolve_hashed(con, sentences, insert)
+
+    cur = con.cursor()
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (sentence TEXT NOT NULL PRIMARY KEY, id INTEGER)")
+    cur.execute("DELETE FROM temp.lookup")
+    cur.executemany("INSERT OR IGNORE INTO temp.lookup (sentence) VALUES (?)",
+                    [tuple([s]) for s in dict.fromkeys(sentences)])
+    cur.execute("""UPDATE temp.lookup SET id = (SELECT rowid FROM main.sentences
+                                                WHERE main.sentences.sentence = temp.lookup.sentence)""")
+
+    new = []
+    if insert:
+        new = [row[0] for row in cur.execute("SELECT sentence FROM temp.lookup WHERE id IS NULL ORDER BY rowid")]
+        if new:
+            cur.execute("""INSERT OR IGNORE INTO main.sentences (sentence)
+                           SELECT sentence FROM temp.lookup WHERE id IS NULL ORDER BY rowid""")
+            cur.execute("""UPDATE temp.lookup SET id = (SELECT rowid FROM main.sentences
+                                                        WHERE main.sentences.sentence = temp.lookup.sentence)
+                           WHERE id IS NULL""")
+
+    rowids = {}
+    for row in cur.execute("SELECT sentence,id FROM temp.lookup WHERE id IS NOT NULL"):
+        rowids[row[0]] = row[1]
+    cur.execute("DELETE FROM temp.lookup")
+    con.commit()
+    cur.close()
+    return (rowids, new)
+
+
+## the same for the hashed schema: sentences are matched by hash and text
+## (there is no unique constraint, so new sentences are only inserted if
+##  they do not exist when the INSERT statement runs)
+
+def resolve_hashed(con, sentences, insert=True):
+    cur = con.cursor()
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS hashlookup (sentence TEXT NOT NULL PRIMARY KEY, hash INTEGER, id INTEGER)")
+    cur.execute("DELETE FROM temp.hashlookup")
+    cur.executemany("INSERT OR IGNORE INTO temp.hashlookup (sentence,hash) VALUES (?,?)",
+                    [(s, sentence_hash(s)) for s in dict.fromkeys(sentences)])
+    update = """UPDATE temp.hashlookup SET id = (SELECT id FROM main.sentences s
+                                                 WHERE s.hash = temp.hashlookup.hash AND s.sentence = temp.hashlookup.sentence)"""
+    cur.execute(update)
+
+    new = []
+    if insert:
+        new = [row[0] for row in cur.execute("SELECT sentence FROM temp.hashlookup WHERE id IS NULL ORDER BY rowid")]
+        if new:
+            cur.execute("""INSERT INTO main.sentences (sentence,hash)
+                           SELECT sentence,hash FROM temp.hashlookup l WHERE id IS NULL
+                           AND NOT EXISTS (SELECT 1 FROM main.sentences s WHERE s.hash = l.hash AND s.sentence = l.sentence)
+                           ORDER BY rowid""")
+            cur.execute(update + " WHERE id IS NULL")
+
+    rowids = {}
+    for row in cur.execute("SELECT sentence,id FROM temp.hashlookup WHERE id IS NOT NULL"):
+        rowids[row[0]] = row[1]
+    cur.execute("DELETE FROM temp.hashlookup")
+    con.commit()
+    cur.close()
+    return (rowids, new)
+
+
+##----------------------------------------------------------------
+## rowids of existing sentences without writing to the DB
+## (works with read-only connections), returns a dictionary sentence -> rowid
+##----------------------------------------------------------------
+
+def lookup_sentences(con, sentences, maxvariables=30000):
+    sentences = list(dict.fromkeys(sentences))
+    rowids = {}
+    if not is_hashed(con):
+        for i in range(0, len(sentences), maxvariables):
+            chunk = sentences[i:i+maxvariables]
+            rowids.update(con.execute(f"""SELECT sentence,rowid FROM sentences
+                                          WHERE sentence IN ({','.join('?' * len(chunk))})""", chunk))
+        return rowids
+
+    hashes = {}
+    for s in sentences:
+        hashes.setdefault(sentence_hash(s), []).append(s)
+    keys = list(hashes)
+    for i in range(0, len(keys), maxvariables):
+        chunk = keys[i:i+maxvariables]
+        for (h, sentence, rowid) in con.execute(f"""SELECT hash,sentence,id FROM sentences
+                                                    WHERE hash IN ({','.join('?' * len(chunk))})""", chunk):
+            if sentence in hashes[h]:
+                rowids[sentence] = rowid
+    return rowids
+
+
+##----------------------------------------------------------------
+## add sentences (no rowids returned), returns the number of new sentences
+##----------------------------------------------------------------
+
+def add_sentences(con, sentences):
+    cur = con.cursor()
+    if not is_hashed(con):
+        cur.executemany("INSERT OR IGNORE INTO sentences (sentence) VALUES (?)", [tuple([s]) for s in sentences])
+        con.commit()
+        return cur.rowcount
+
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS hashlookup (sentence TEXT NOT NULL PRIMARY KEY, hash INTEGER, id INTEGER)")
+    cur.execute("DELETE FROM temp.hashlookup")
+    cur.executemany("INSERT OR IGNORE INTO temp.hashlookup (sentence,hash) VALUES (?,?)",
+                    [(s, sentence_hash(s)) for s in dict.fromkeys(sentences)])
+    cur.execute("""INSERT INTO main.sentences (sentence,hash)
+                   SELECT sentence,hash FROM temp.hashlookup l
+                   WHERE NOT EXISTS (SELECT 1 FROM main.sentences s WHERE s.hash = l.hash AND s.sentence = l.sentence)
+                   ORDER BY rowid""")
+    count = cur.rowcount
+    cur.execute("DELETE FROM temp.hashlookup")
+    con.commit()
+    return count
+
+
+##----------------------------------------------------------------
+## convert a plain sentence DB into a hashed one (rowids are kept)
+##----------------------------------------------------------------
+
+def convert(plainDB, hashedDB):
+    con = sqlite3.connect(hashedDB)
+    register_functions(con)
+    create_table(con, hashed=True, index=False)
+    con.execute(f"ATTACH DATABASE 'file:{plainDB}?immutable=1' AS plain")
+    con.execute("""INSERT INTO main.sentences (id,sentence,hash)
+                   SELECT rowid,sentence,sentence_hash(sentence) FROM plain.sentences ORDER BY rowid""")
+    con.commit()
+    create_index(con, hashed=True)
+    collisions = con.execute("""SELECT COUNT(*) FROM (SELECT hash FROM sentences
+                                                      GROUP BY hash HAVING COUNT(*) > 1)""").fetchone()[0]
+    con.close()
+    return collisions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='sentdb', description='convert a sentence DB to the hashed schema')
+    parser.add_argument("plaindb", type=str, help="sentence DB with the plain schema (input)")
+    parser.add_argument("hasheddb", type=str, help="sentence DB with the hashed schema (output)")
+    args = parser.parse_args()
+
+    if os.path.exists(args.hasheddb):
+        sys.exit(f"{args.hasheddb} exists already")
+    collisions = convert(args.plaindb, args.hasheddb)
+
+    plainSize = os.path.getsize(args.plaindb)
+    hashedSize = os.path.getsize(args.hasheddb)
+    print(f"{'plain':8s} {plainSize:14d} bytes  {args.plaindb}")
+    print(f"{'hashed':8s} {hashedSize:14d} bytes  {args.hasheddb}")
+    print(f"saving   {plainSize-hashedSize:14d} bytes  ({100*(plainSize-hashedSize)/plainSize:.1f}%)")
+    print(f"hash values shared by several sentences: {collisions}")
@@ -2,13 +2,18 @@
 
 
 import argparse
-import xml.parsers.expat
+import itertools
+import multiprocessing
 import zipfile
 import os
 import urllib.request
 import sqlite3
 import sys
 from os.path import exists
+from xml.parsers.expat import ExpatError
+
+from xmlstream import iter_sentences
+from sentdb import resolve_sentences, open_table
 
 
 
@@ -24,6 +29,12 @@ parser.add_argument('-c', '--corpus', help='Corpus name', required=True)
 parser.add_argument('-r', '--release', help='Release version', required=True)
 parser.add_argument('-l', '--language', help='Language', required=True)
 parser.add_argument('-f', '--file_name',help='File name (if not given, prints all files)')
+parser.add_argument('-b', '--batch-size', type=int, default=100000,
+                    help='number of sentences to be resolved in one batch (default: 100000)')
+parser.add_argument('-w', '--workers', type=int, default=1,
+                    help='number of worker processes for parsing documents (default: 1)')
+parser.add_argument('-H', '--hashed', action='store_true',
+                    help='create a new sentence DB with hash-keyed sentences (see sentdb.py)')
 parser.add_argument('-v', '--verbose', help='verbose output', action='store_true', default=False)
 
 args = parser.parse_args()
@@ -54,6 +65,13 @@ buffer = []
 buffersize = 100000
 
 
+## sentences that still need to be resolved: (docID, sentID, sentence)
+## they are collected over several documents and resolved in one batch
+
+pending = []
+batchsize = args.batch_size
+
+
 ## function to insert the current data buffer
 
 def insert_buffer():
@@ -64,58 +82,46 @@ def insert_buffer():
         idxCon.commit()
         buffer = []
 
-def start_element(name, attrs):
-    global inSent, sentStr, sentCount, sentID
-              
-    if name == 's':
-        inSent = True
-        sentCount += 1
-        sentStr = ''
-        if 'id' in attrs:
-            sentID = attrs['id']
-        else:
-            sentID = str(sentCount)
-        if not sentCount % 2000:
-            sys.stderr.write('.')
-            if not sentCount % 100000:
-                sys.stderr.write(f" {sentCount}\n")
-            sys.stderr.flush()
-
-
-
-            
-def end_element(name):
-    global inSent, sentStr, sentID, docID
-    global corpus, release, document
-    global cur, con, verbose
-    global buffer, buffersize
-        
-    if name == 's':
-        inSent = False
-        sentStr = sentStr.lstrip().rstrip()
-        res = cur.execute("""SELECT ROWID FROM sentences WHERE sentence = ?""", [sentStr])
-        record = res.fetchone()
-        if record:
-            buffer.append(tuple([record[0],docID,sentID]))
+
+## add a sentence to the batch of sentences to be resolved
+
+def add_sentence(sentID, sentStr):
+    global docID, sentCount, pending
+
+    sentCount += 1
+    if not sentCount % 2000:
+        sys.stderr.write('.')
+        if not sentCount % 100000:
+            sys.stderr.write(f" {sentCount}\n")
+        sys.stderr.flush()
+
+    pending.append(tuple([docID,sentID,sentStr]))
+
+
+## look up all pending sentences in the sentence DB (insert new ones)
+## and add their internal IDs to the buffer
+
+def resolve_pending():
+    global con, verbose, pending, buffer
+
+    if not pending:
+        return
+
+    (rowids, new) = resolve_sentences(con, [p[2] for p in pending])
+    if verbose:
+        for sentStr in new:
+            sys.stderr.write('NEW SENTENCES: ' + sentStr + "\n")
+
+    for (sentDocID, sentID, sentStr) in pending:
+        if sentStr in rowids:
+            buffer.append(tuple([rowids[sentStr],sentDocID,sentID]))
         else:
-            ## insert a new sentence!
-            if verbose:
-                sys.stderr.write('NEW SENTENCES - ' + sentID + ': ' + sentStr + "\n")
-            cur.execute("""INSERT OR IGNORE INTO sentences VALUES(?)""", [sentStr])
-            con.commit()                
-            res = cur.execute("""SELECT ROWID FROM sentences WHERE sentence = ?""", [sentStr])
-            record = res.fetchone()
-            if record:
-                buffer.append(tuple([record[0],docID,sentID]))
-            else:
-                sys.stderr.write('FAILED TO INSERT - ' + sentID + ': ' + sentStr + "\n")
+            sys.stderr.write('FAILED TO INSERT - ' + sentID + ': ' + sentStr + "\n")
         if len(buffer) >= buffersize:
             insert_buffer()
 
-def char_data(data):
-    global inSent, sentStr
-    if inSent:
-        sentStr = sentStr + data
+    pending = []
+    insert_buffer()
 
 
 
@@ -125,7 +131,7 @@ con = sqlite3.connect(args.database, timeout=7200)
 # con.execute("PRAGMA journal_mode=WAL")
 cur = con.cursor()
 
-cur.execute("CREATE TABLE IF NOT EXISTS sentences ( sentence TEXT UNIQUE PRIMARY KEY NOT NULL )")
+open_table(con, args.hashed)
 
 
 idxCon = sqlite3.connect(args.index, timeout=7200)
@@ -155,50 +161,85 @@ idxCon.commit()
 
 
 
-count = 0
+##----------------------------------------------------------------
+## read all sentences from a document in the zip archive
+## (runs in worker processes, each with its own ZipFile handle)
+##----------------------------------------------------------------
 
+docZip = lzip
 
+def open_zip():
+    global docZip
+    docZip = zipfile.ZipFile(data_file)
 
-for filename in lzip.namelist():
-    if filename[-4:] == '.xml':
+def read_document(filename):
+    sentences = []
+    errorCount = 0
+    with docZip.open(filename, 'r') as f:
+        try:
+            for sentence in iter_sentences(f, filename):
+                sentences.append(sentence)
+        except ExpatError:
+            errorCount += 1
+    return (filename, sentences, errorCount)
 
-        parser = xml.parsers.expat.ParserCreate()
-        parser.StartElementHandler = start_element
-        parser.EndElementHandler = end_element
-        parser.CharacterDataHandler = char_data
 
-        inSent    = False
-        sentStr   = ''
-        sentID    = ''
-        sentCount = 0
-        errorCount = 0
-        
-        document  = '/'.join(filename.split('/')[2:])
+## documents are returned in the same order as in the archive
+## and only the main process writes to the databases
+## (workers get windows of 4 documents per worker and the next window is only
+## started when the main process gets to the current one, so that parsed
+## documents do not pile up in memory if the main process is slower)
 
-        idxCur.execute(f"""INSERT OR IGNORE INTO documents(corpus,version,document) 
-                                     VALUES ('{corpus}','{release}','{document}')""")
-        idxCon.commit()
-        idxCur.execute(f"""SELECT rowid FROM documents
+filenames = [f for f in lzip.namelist() if f[-4:] == '.xml']
+
+def read_documents(pool, filenames, window):
+    files = iter(filenames)
+    current = pool.imap(read_document, list(itertools.islice(files, window)))
+    while current:
+        batch = list(itertools.islice(files, window))
+        following = pool.imap(read_document, batch) if batch else None
+        yield from current
+        current = following
+
+if args.workers > 1:
+    pool = multiprocessing.get_context('fork').Pool(args.workers, initializer=open_zip)
+    documents = read_documents(pool, filenames, 4 * args.workers)
+else:
+    pool = None
+    documents = map(read_document, filenames)
+
+
+count = 0
+
+for (filename, sentences, errorCount) in documents:
+    sentCount = 0
+    
+    document  = '/'.join(filename.split('/')[2:])
+
+    idxCur.execute(f"""INSERT OR IGNORE INTO documents(corpus,version,document) 
+                                 VALUES ('{corpus}','{release}','{document}')""")
+    idxCur.execute(f"""SELECT rowid FROM documents
 	                   WHERE corpus='{corpus}' AND version='{release}' AND document='{document}'""")
-        row = idxCur.fetchone()
-        docID = row[0]
-
-        if verbose:
-            sys.stderr.write(f"process {filename} ({count} sentences done)\n")
-        with lzip.open(filename, 'r') as f:
-            for line in f:
-                try:
-                    parser.Parse(line)
-                except:
-                    errorCount += 1
-                    if verbose:
-                        sys.stderr.write(f"error parsing {line}\n")
-
-        insert_buffer()
-        count += sentCount
-        if errorCount > 0:
-            sys.stderr.write(f"XML parsing errors for {filename}: {errorCount} lines\n")
+    row = idxCur.fetchone()
+    docID = row[0]
+
+    if verbose:
+        sys.stderr.write(f"process {filename} ({count} sentences done)\n")
+    for (sentID, sentStr) in sentences:
+        add_sentence(sentID, sentStr)
 
+    if len(pending) >= batchsize:
+        resolve_pending()
+    count += sentCount
+    if errorCount > 0:
+        sys.stderr.write(f"XML parsing errors for {filename}: only {sentCount} sentences indexed\n")
+
+
+resolve_pending()
+idxCon.commit()
+if pool:
+    pool.close()
+    pool.join()
 
 sys.stderr.write(f"A total of {count} sentences found\n")
 os.unlink(data_file)
@@ -0,0 +1,116 @@
+#
+# lookup functions for sentence index DBs (xxx.ids.db)
+#
+# instead of running one query per OPUS sentence ID we load all sentence IDs
+# of a document at once and resolve links from an in-memory dictionary
+# document IDs are also cached for each corpus release
+#
+
+import sys
+
+
+## max number of SQL variables used in one query (the SQLite default limit is 32766)
+
+maxvariables = 30000
+
+
+##----------------------------------------------------------------
+## load all OPUS sentence IDs of a document into a dictionary
+## that maps them to internal sentence IDs (rowids in the sentence DB)
+##
+## returns None if the document has more than maxsize sentences
+## (use lookup_sentids for those instead)
+##----------------------------------------------------------------
+
+def load_sentids(cur, docID, maxsize=0):
+    sentids = {}
+    if maxsize:
+        query = "SELECT sentID,id FROM sentids WHERE docID=? LIMIT ?"
+        params = (docID, maxsize + 1)
+    else:
+        query = "SELECT sentID,id FROM sentids WHERE docID=?"
+        params = (docID,)
+    for row in cur.execute(query, params):
+        sentids[row[0]] = row[1]
+    if maxsize and len(sentids) > maxsize:
+        return None
+    return sentids
+
+
+##----------------------------------------------------------------
+## batched lookup of selected OPUS sentence IDs in a document
+## (for very large documents that do not fit into memory)
+##----------------------------------------------------------------
+
+def lookup_sentids(cur, docID, ids):
+    sentids = {}
+    ids = list(set(ids))
+    for i in range(0, len(ids), maxvariables):
+        batch = ids[i:i+maxvariables]
+        placeholders = ','.join(['?'] * len(batch))
+        for row in cur.execute(f"SELECT sentID,id FROM sentids WHERE docID=? AND sentID IN ({placeholders})",
+                               [docID] + batch):
+            sentids[row[0]] = row[1]
+    return sentids
+
+
+##----------------------------------------------------------------
+## sentence ID resolver for one document
+##
+## keeps the complete mapping for the document in memory if it is smaller than maxsize,
+## otherwise, sentence IDs need to be prefetched in chunks with prefetch()
+##----------------------------------------------------------------
+
+class DocumentSentids:
+
+    def __init__(self, cur, docID, maxsize=0):
+        self.cur = cur
+        self.docID = docID
+        self.sentids = load_sentids(cur, docID, maxsize)
+        self.complete = self.sentids is not None
+        if not self.complete:
+            self.sentids = {}
+
+    # fetch all given OPUS sentence IDs (only necessary for large documents)
+    def prefetch(self, ids):
+        if not self.complete:
+            self.sentids = lookup_sentids(self.cur, self.docID, ids)
+
+    def get(self, sentID):
+        return self.sentids.get(sentID)
+
+
+##----------------------------------------------------------------
+## document ID lookup: (corpus, version, document) -> docID
+##
+## all documents of a corpus release are loaded at once the first time
+## that release is requested, documents that cannot be found are counted
+##----------------------------------------------------------------
+
+def load_docids(cur, corpus, version):
+    docids = {}
+    for row in cur.execute("SELECT document,rowid FROM documents WHERE corpus=? AND version=?", (corpus, version)):
+        docids[row[0]] = row[1]
+    return docids
+
+
+class DocumentIndex:
+
+    def __init__(self, cur, name=''):
+        self.cur = cur
+        self.name = name
+        self.releases = {}
+        self.missing = set()
+
+    def get(self, corpus, version, document):
+        if (corpus, version) not in self.releases:
+            self.releases[(corpus, version)] = load_docids(self.cur, corpus, version)
+        docID = self.releases[(corpus, version)].get(document)
+        if docID is None:
+            self.missing.add((corpus, version, document))
+        return docID
+
+    # print the number of documents that could not be found in the index
+    def report(self, out=sys.stderr):
+        out.write(f"{len(self.missing)} bitext documents missing in sentence index {self.name}\n")
+        out.flush()
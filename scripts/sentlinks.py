@@ -6,6 +6,8 @@
 import sys
 import sqlite3
 
+from sentindex import DocumentIndex
+
 
 algDB = sys.argv[1]
 srcDB = sys.argv[2]
@@ -21,6 +23,11 @@ srcDBcur = srcDBcon.cursor()
 trgDBcon = sqlite3.connect(trgDB)
 trgDBcur = trgDBcon.cursor()
 
+## document ID lookup tables (loaded once per corpus release)
+
+srcDocIndex = DocumentIndex(srcDBcon.cursor(), srcDB)
+trgDocIndex = DocumentIndex(trgDBcon.cursor(), trgDB)
+
 # create DB that shows what sentences are included in what kind of alignment units
 
 linksDBcon = sqlite3.connect(linkDB)
@@ -79,10 +86,12 @@ for row in algDBcur.execute("SELECT rowid,bitextID,srcIDs,trgIDs FROM links ORDE
             for resource in linksDBcur.execute(f"SELECT rowid FROM corpora WHERE corpus='{corpus}' AND version='{version}'"):
                 corpusID = resource[0]
 
-            for doc in srcDBcur.execute(f"SELECT rowid FROM documents WHERE corpus='{corpus}' AND version='{version}' AND document='{fromDoc}'"):
-                fromDocID = doc[0]
-            for doc in trgDBcur.execute(f"SELECT rowid FROM documents WHERE corpus='{corpus}' AND version='{version}' AND document='{toDoc}'"):
-                toDocID = doc[0]
+            fromDocID = srcDocIndex.get(corpus, version, fromDoc)
+            toDocID = trgDocIndex.get(corpus, version, toDoc)
+
+    # skip links of bitexts with documents that are not in the sentence index
+    if fromDocID is None or toDocID is None:
+        continue
 
     linkID = row[0]
     srcIDs = row[2].split(' ')
@@ -126,3 +135,7 @@ if len(srcbuffer) > 0:
 if len(trgbuffer) > 0:
     linksDBcur.executemany("""INSERT OR IGNORE INTO linkedtarget VALUES(?,?,?)""", trgbuffer)
     linksDBcon.commit()
+
+
+srcDocIndex.report()
+trgDocIndex.report()
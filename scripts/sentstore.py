@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+#
+# read-only sentence store for fast retrieval of sentences by rowid
+#
+# a sentence DB (xxx.db) is exported into two files:
+#
+#   xxx.sentidx   first rowid (uint64) followed by one uint64 offset per rowid
+#                 from the first to the last rowid plus the end offset
+#   xxx.senttxt   concatenated UTF-8 text of all sentences in rowid order
+#
+# the text of rowid i is senttxt[offsets[i-first]:offsets[i-first+1]]; rowids
+# that do not exist in the DB have empty ranges with the highest bit of their
+# offset set (MISSING), so that they are not confused with empty sentences;
+# numbers are stored in native byte order (the files are meant to be created
+# and read on the same platform)
+#
+# SentenceStore maps both files into memory: get_bytes returns memoryviews
+# of the mapped text without copying, get and get_many return decoded sentences
+#
+# USAGE: sentstore.py [-o store] sentdb            (export)
+#        sentstore.py -q rowid [-q rowid ...] store (print sentences)
+
+
+import argparse
+import array
+import mmap
+import os
+import sqlite3
+import sys
+
+
+INDEX_SUFFIX = '.sentidx'
+TEXT_SUFFIX = '.senttxt'
+
+buffersize = 100000
+
+MISSING = 1 << 63
+
+
+##----------------------------------------------------------------
+## export a sentence DB into a sentence store
+## (written to temporary files that are renamed at the end)
+##----------------------------------------------------------------
+
+def export_store(sentDB, store):
+    con = sqlite3.connect(f"file:{sentDB}?immutable=1", uri=True)
+    first = con.execute("SELECT MIN(rowid) FROM sentences").fetchone()[0] or 1
+
+    count = 0
+    offset = 0
+    nextID = first
+    with open(store + INDEX_SUFFIX + '.tmp', 'wb') as idx, open(store + TEXT_SUFFIX + '.tmp', 'wb') as txt:
+        array.array('Q', [first]).tofile(idx)
+        offsets = array.array('Q')
+        cur = con.execute("SELECT rowid,sentence FROM sentences ORDER BY rowid")
+        while True:
+            rows = cur.fetchmany(buffersize)
+            if not rows:
+                break
+            for (rowid, sentence) in rows:
+                while nextID < rowid:
+                    offsets.append(offset | MISSING)
+                    nextID += 1
+                offsets.append(offset)
+                data = sentence.encode('utf-8')
+                txt.write(data)
+                offset += len(data)
+                nextID += 1
+            offsets.tofile(idx)
+            offsets = array.array('Q')
+            count += len(rows)
+        offsets.append(offset)
+        offsets.tofile(idx)
+    con.close()
+
+    os.replace(store + INDEX_SUFFIX + '.tmp', store + INDEX_SUFFIX)
+    os.replace(store + TEXT_SUFFIX + '.tmp', store + TEXT_SUFFIX)
+    return count
+
+
+##----------------------------------------------------------------
+## memory-mapped reader
+##----------------------------------------------------------------
+
+class SentenceStore:
+
+    def __init__(self, store):
+        self.files = []
+        self.maps = []
+        for suffix in (INDEX_SUFFIX, TEXT_SUFFIX):
+            f = open(store + suffix, 'rb')
+            self.files.append(f)
+            self.maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(store + suffix) else b'')
+        index = memoryview(self.maps[0]).cast('Q')
+        self.first = index[0]
+        self.offsets = index[1:]
+        self.text = memoryview(self.maps[1])
+        self.size = len(self.offsets) - 1
+
+    def __len__(self):
+        return self.size
+
+    def get_bytes(self, rowid):
+        i = rowid - self.first
+        if i < 0 or i >= self.size:
+            return None
+        start = self.offsets[i]
+        if start & MISSING:
+            return None
+        return self.text[start:self.offsets[i+1] & ~MISSING]
+
+    def get(self, rowid):
+        data = self.get_bytes(rowid)
+        return None if data is None else str(data, 'utf-8')
+
+    def get_many(self, rowids):
+        return [self.get(rowid) for rowid in rowids]
+
+    def close(self):
+        self.offsets.release()
+        self.text.release()
+        for m in self.maps:
+            if m:
+                m.close()
+        for f in self.files:
+            f.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='sentstore', description='export a sentence DB into a memory-mapped sentence store')
+    parser.add_argument("db", type=str, help="sentence DB (export) or sentence store (with -q)")
+    parser.add_argument("-o", "--output", type=str, help="name of the sentence store (default: sentence DB without .db)")
+    parser.add_argument("-q", "--query", type=int, action='append', help="print the sentence with this rowid")
+    args = parser.parse_args()
+
+    if args.query:
+        store = SentenceStore(args.db)
+        for rowid in args.query:
+            sentence = store.get(rowid)
+            print(f"{rowid}\t{sentence if sentence is not None else ''}")
+        store.close()
+    else:
+        store = args.output if args.output else os.path.splitext(args.db)[0]
+        count = export_store(args.db, store)
+        sys.stderr.write(f"{count} sentences exported to {store}{INDEX_SUFFIX} and {store}{TEXT_SUFFIX}\n")
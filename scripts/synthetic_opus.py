@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+#
+# create a small synthetic set of OPUS index databases for testing and benchmarking
+#
+#   xxx.db         sentence DBs (source and target language)
+#   xxx.ids.db     sentence index DBs
+#   xxx-yyy.db     bitext alignment DB
+#
+# USAGE: synthetic_opus.py -o dir [-c corpora] [-d documents] [-n sentences]
+
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+
+
+## schemas as created by sent2sqlite.py, sentid2sqlite.py and alg2sqlite.py
+
+SENTENCE_DB_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS sentences ( sentence TEXT UNIQUE PRIMARY KEY NOT NULL )"
+]
+
+INDEX_DB_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS documents ( corpus, version, document )",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_documents ON documents (corpus,version,document)",
+    "CREATE TABLE IF NOT EXISTS sentids ( id INTEGER, docID INTEGER, sentID TEXT)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_sentids ON sentids ( docID, sentID)"
+]
+
+ALIGN_DB_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS bitexts ( corpus TEXT, version TEXT, fromDoc TEXT, toDoc TEXT )",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_bitexts ON bitexts ( corpus, version, fromDoc, toDoc )",
+    """CREATE TABLE IF NOT EXISTS links ( bitextID, srcIDs TEXT, trgIDs TEXT, alignType TEXT,
+                                         alignerScore REAL, cleanerScore REAL)""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_links ON links ( bitextID, srcIDs, trgIDs )",
+    "CREATE INDEX IF NOT EXISTS idx_aligntype ON links ( bitextID, alignType )",
+    "CREATE INDEX IF NOT EXISTS idx_bitextid ON links ( bitextID )",
+    """CREATE TABLE IF NOT EXISTS corpora (corpus TEXT, version TEXT, srclang TEXT, trglang TEXT,
+                                           srclang3 TEXT, trglang3 TEXT, latest INTEGER)""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_corpora ON corpora (corpus,version,srclang,trglang,srclang3,trglang3,latest)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_release ON corpora (corpus,version,srclang,trglang)"
+]
+
+
+WORDS = ['the', 'a', 'house', 'cat', 'dog', 'sees', 'runs', 'green', 'small', 'big',
+         'river', 'tree', 'walks', 'under', 'over', 'and', 'but', 'today', 'never', 'light']
+
+## alignment types and their relative frequencies
+
+ALIGN_TYPES = [((1,1),85), ((2,1),5), ((1,2),5), ((1,0),3), ((0,1),2)]
+
+
+
+def create_db(dbfile, schema):
+    con = sqlite3.connect(dbfile)
+    for statement in schema:
+        con.execute(statement)
+    con.commit()
+    return con
+
+
+def random_sentence(rnd, language, number):
+    length = rnd.randint(3,15)
+    return ' '.join(rnd.choice(WORDS) for i in range(length)) + f" ({language}{number})"
+
+
+##----------------------------------------------------------------
+## add one document with nrSents sentences to the sentence and index DB
+## returns the list of OPUS sentence IDs in that document
+##----------------------------------------------------------------
+
+def add_document(sentCon, idxCon, rnd, language, corpus, version, document, nrSents, offset, rowidOffset=0):
+    sentids = []
+    sentCur = sentCon.cursor()
+    idxCur = idxCon.cursor()
+    idxCur.execute("INSERT INTO documents VALUES (?,?,?)", (corpus, version, document))
+    docID = idxCur.lastrowid
+    for s in range(nrSents):
+        sentence = random_sentence(rnd, language, offset + s)
+        sentCur.execute("""INSERT OR IGNORE INTO sentences (rowid,sentence)
+                           VALUES ((SELECT IFNULL(MAX(rowid),?) + 1 FROM sentences), ?)""", (rowidOffset, sentence))
+        sentCur.execute("SELECT rowid FROM sentences WHERE sentence=?", (sentence,))
+        rowid = sentCur.fetchone()[0]
+        sentID = f"s{s+1}"
+        idxCur.execute("INSERT INTO sentids VALUES (?,?,?)", (rowid, docID, sentID))
+        sentids.append(sentID)
+    return sentids
+
+
+## create sentence alignments between two lists of sentence IDs
+
+def align_documents(rnd, srcIDs, trgIDs):
+    types = [t for t,f in ALIGN_TYPES]
+    weights = [f for t,f in ALIGN_TYPES]
+    links = []
+    s = t = 0
+    while s < len(srcIDs) and t < len(trgIDs):
+        (ns, nt) = rnd.choices(types, weights)[0]
+        src = srcIDs[s:s+ns]
+        trg = trgIDs[t:t+nt]
+        s += ns
+        t += nt
+        links.append((' '.join(src), ' '.join(trg), f"{len(src)}-{len(trg)}"))
+    return links
+
+
+##----------------------------------------------------------------
+## create all databases in outdir
+## returns a dictionary with the file names of all DBs
+##----------------------------------------------------------------
+
+def create_corpus(outdir, srclang='en', trglang='fi', srclang3='eng', trglang3='fin',
+                  corpora=2, documents=20, sentences=200, seed=42, rowid_offset=0):
+
+    os.makedirs(outdir, exist_ok=True)
+    rnd = random.Random(seed)
+
+    files = {'srcdb': f"{outdir}/{srclang3}.db",
+             'trgdb': f"{outdir}/{trglang3}.db",
+             'srcids': f"{outdir}/{srclang3}.ids.db",
+             'trgids': f"{outdir}/{trglang3}.ids.db",
+             'algdb': f"{outdir}/{srclang3}-{trglang3}.db"}
+
+    srcSentCon = create_db(files['srcdb'], SENTENCE_DB_SCHEMA)
+    trgSentCon = create_db(files['trgdb'], SENTENCE_DB_SCHEMA)
+    srcIdxCon = create_db(files['srcids'], INDEX_DB_SCHEMA)
+    trgIdxCon = create_db(files['trgids'], INDEX_DB_SCHEMA)
+    algCon = create_db(files['algdb'], ALIGN_DB_SCHEMA)
+    algCur = algCon.cursor()
+
+    offset = 0
+    for c in range(corpora):
+        corpus = f"Corpus{c+1}"
+        version = 'v1'
+        algCur.execute("INSERT INTO corpora VALUES (?,?,?,?,?,?,?)",
+                       (corpus, version, srclang, trglang, srclang3, trglang3, 1))
+        for d in range(documents):
+            fromDoc = f"{srclang}/doc{d+1}.xml"
+            toDoc = f"{trglang}/doc{d+1}.xml"
+            srcIDs = add_document(srcSentCon, srcIdxCon, rnd, srclang, corpus, version,
+                                  fromDoc, sentences, offset, rowid_offset)
+            trgIDs = add_document(trgSentCon, trgIdxCon, rnd, trglang, corpus, version,
+                                  toDoc, rnd.randint(sentences * 9 // 10, sentences), offset, rowid_offset)
+            offset += sentences
+
+            algCur.execute("INSERT INTO bitexts VALUES (?,?,?,?)", (corpus, version, fromDoc, toDoc))
+            bitextID = algCur.lastrowid
+            links = align_documents(rnd, srcIDs, trgIDs)
+            algCur.executemany("INSERT INTO links VALUES (?,?,?,?,?,?)",
+                               [(bitextID, src, trg, alignType, round(rnd.random(),3), 0.0)
+                                for (src, trg, alignType) in links])
+
+    for con in (srcSentCon, trgSentCon, srcIdxCon, trgIdxCon, algCon):
+        con.commit()
+        con.close()
+
+    return files
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='synthetic_opus',
+                                     description='create synthetic OPUS index databases for testing')
+    parser.add_argument("-o", "--outdir", type=str, required=True, help="output directory")
+    parser.add_argument("-c", "--corpora", type=int, default=2, help="number of corpora")
+    parser.add_argument("-d", "--documents", type=int, default=20, help="number of documents per corpus")
+    parser.add_argument("-n", "--sentences", type=int, default=200, help="number of sentences per document")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--rowid-offset", type=int, default=0, help="first rowid in the sentence DBs minus one")
+    args = parser.parse_args()
+
+    files = create_corpus(args.outdir, corpora=args.corpora, documents=args.documents,
+                          sentences=args.sentences, seed=args.seed, rowid_offset=args.rowid_offset)
+    for name in files:
+        print(f"{name}\t{files[name]}")
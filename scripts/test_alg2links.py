@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+#
+# test incremental updates of link DBs with alg2links.py on a synthetic corpus
+#
+#   append:    alignments appended to a bitext of a corpus that is not the last one
+#              (the new links get linkIDs after all other corpora)
+#   reverse:   corpora added one by one in reverse order (-c)
+#   legacy:    a link DB without watermarks in which the last corpus has only
+#              been built half-way (interrupted job of an older alg2links.py)
+#
+# the updated link DB is compared with a link DB built from scratch (serial,
+# parallel and bulk mode) and the linkID ranges (corpus_range, bitext_range and
+# *_range_extra) are checked: each range may only contain links of its own
+# corpus or bitext and all links need to be covered by the ranges
+#
+# USAGE: test_alg2links.py [-c corpora] [-d documents] [-n sentences] [-w workdir]
+
+
+import argparse
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+from synthetic_opus import create_corpus
+
+
+parser = argparse.ArgumentParser(prog='test_alg2links', description='test incremental updates of link DBs')
+parser.add_argument("-c", "--corpora", type=int, default=3, help="number of synthetic corpora")
+parser.add_argument("-d", "--documents", type=int, default=5, help="number of documents per corpus")
+parser.add_argument("-n", "--sentences", type=int, default=200, help="number of sentences per document")
+parser.add_argument("-w", "--workdir", type=str, help="directory for the synthetic DBs (default: temporary, removed at the end)")
+args = parser.parse_args()
+
+workdir = args.workdir if args.workdir else tempfile.mkdtemp(prefix='test_alg2links_')
+os.makedirs(workdir, exist_ok=True)
+alg2links = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alg2links.py')
+files = create_corpus(os.path.join(workdir, 'opus'), corpora=args.corpora, documents=args.documents, sentences=args.sentences)
+
+
+def run_alg2links(linkDB, *options):
+    subprocess.run([sys.executable, alg2links, '-a', files['algdb'], '-s', files['srcids'],
+                    '-t', files['trgids'], '-l', linkDB] + list(options),
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def all_links(linkDB):
+    con = sqlite3.connect(linkDB)
+    links = con.execute("""SELECT linkID,bitextID,srcIDs,trgIDs,srcSentIDs,trgSentIDs FROM links
+                           ORDER BY linkID""").fetchall()
+    con.close()
+    return links
+
+
+##----------------------------------------------------------------
+## check that the ranges of all corpora and bitexts contain exactly their links
+## returns a list of error messages
+##----------------------------------------------------------------
+
+def check_ranges(linkDB):
+    con = sqlite3.connect(linkDB)
+    owner = {'bitext': dict(con.execute("SELECT linkID,bitextID FROM links"))}
+    corpora = dict(((corpus, version), corpusID) for (corpusID, corpus, version)
+                   in con.execute("SELECT corpusID,corpus,version FROM corpora"))
+    bitextCorpus = dict((bitextID, corpora.get((corpus, version))) for (bitextID, corpus, version)
+                        in con.execute("SELECT bitextID,corpus,version FROM bitexts"))
+    owner['corpus'] = {linkID: bitextCorpus.get(bitextID) for (linkID, bitextID) in owner['bitext'].items()}
+
+    errors = []
+    for kind in ('bitext', 'corpus'):
+        covered = set()
+        for (ID, start, end) in con.execute(f"""SELECT {kind}ID,start,end FROM {kind}_range UNION ALL
+                                                SELECT {kind}ID,start,end FROM {kind}_range_extra"""):
+            for (linkID,) in con.execute("SELECT linkID FROM links WHERE linkID BETWEEN ? AND ?", (start, end)):
+                if owner[kind][linkID] != ID:
+                    errors.append(f"{kind} {ID}: range ({start},{end}) includes link {linkID} of {kind} {owner[kind][linkID]}")
+                    break
+                covered.add(linkID)
+        missing = set(owner[kind]) - covered
+        if missing:
+            errors.append(f"{len(missing)} links are not in any {kind} range")
+    con.close()
+    return errors
+
+
+failed = 0
+
+def report(test, errors):
+    global failed
+    if errors:
+        failed += 1
+        print(f"{test:40s} FAILED")
+        for error in errors[:10]:
+            print(f"    {error}")
+    else:
+        print(f"{test:40s} ok")
+
+
+##----------------------------------------------------------------
+## append: remove the last alignment of the first bitext, build the link DB,
+## add the alignment again (with a new rowid) and update the link DB
+##----------------------------------------------------------------
+
+algcon = sqlite3.connect(files['algdb'])
+(rowid, *alignment) = algcon.execute("""SELECT rowid,bitextID,srcIDs,trgIDs,alignType,alignerScore,cleanerScore
+                                        FROM links WHERE bitextID=1 ORDER BY rowid DESC LIMIT 1""").fetchone()
+algcon.execute("DELETE FROM links WHERE rowid=?", (rowid,))
+algcon.commit()
+
+for (name, options) in (('serial', []), ('parallel', ['-w', '2']), ('bulk', ['-B'])):
+    algcon.execute("DELETE FROM links WHERE bitextID=? AND srcIDs=? AND trgIDs=?", alignment[:3])
+    algcon.commit()
+    updated = os.path.join(workdir, f"append-{name}.db")
+    scratch = os.path.join(workdir, f"scratch-{name}.db")
+    for dbfile in (updated, scratch):
+        if os.path.exists(dbfile):
+            os.unlink(dbfile)
+
+    run_alg2links(updated, *options)
+    algcon.execute("INSERT INTO links VALUES (?,?,?,?,?,?)", alignment)
+    algcon.commit()
+    run_alg2links(updated, *options)
+    run_alg2links(scratch, *options)
+
+    report(f"append ({name}): links", [] if all_links(updated) == all_links(scratch) else
+           ["links differ from a link DB built from scratch"])
+    report(f"append ({name}): ranges", check_ranges(updated))
+    report(f"scratch ({name}): ranges", check_ranges(scratch))
+
+watermarks = []
+for name in ('serial', 'parallel'):
+    con = sqlite3.connect(os.path.join(workdir, f"scratch-{name}.db"))
+    watermarks.append(con.execute("SELECT * FROM corpus_watermarks ORDER BY corpusID").fetchall())
+    con.close()
+report("scratch: corpus watermarks", [] if watermarks[0] == watermarks[1] else
+       ["corpus_watermarks differ between serial and parallel mode"])
+
+
+## reverse: the last corpus first, the first one at the end
+
+reverse = os.path.join(workdir, 'reverse.db')
+if os.path.exists(reverse):
+    os.unlink(reverse)
+corpora = [row[0] for row in algcon.execute("SELECT corpus FROM corpora ORDER BY rowid DESC")]
+for corpus in corpora:
+    run_alg2links(reverse, '-c', corpus)
+report("reverse: links", [] if all_links(reverse) == all_links(scratch) else
+       ["links differ from a link DB built from scratch"])
+report("reverse: ranges", check_ranges(reverse))
+
+
+## legacy: remove the tables that older versions did not create and the
+## links, bitexts and ranges that the interrupted job had not written yet
+
+legacy = os.path.join(workdir, 'legacy.db')
+shutil.copyfile(scratch, legacy)
+con = sqlite3.connect(legacy)
+for table in ('watermarks', 'corpus_watermarks', 'bitext_range_extra', 'corpus_range_extra'):
+    con.execute(f"DROP TABLE {table}")
+(corpusID, corpus, version) = con.execute("SELECT corpusID,corpus,version FROM corpora ORDER BY corpusID DESC").fetchone()
+bitexts = [row[0] for row in con.execute("SELECT bitextID FROM bitexts WHERE corpus=? AND version=? ORDER BY bitextID",
+                                         (corpus, version))]
+interrupted = bitexts[len(bitexts) // 2]
+(start, end) = con.execute("SELECT start,end FROM bitext_range WHERE bitextID=?", (interrupted,)).fetchone()
+middle = (start + end) // 2
+for table in ('links', 'linkedsource', 'linkedtarget'):
+    con.execute(f"DELETE FROM {table} WHERE linkID>?", (middle,))
+con.execute("DELETE FROM bitexts WHERE bitextID>=?", (interrupted,))
+con.execute("DELETE FROM bitext_range WHERE bitextID>=?", (interrupted,))
+con.execute("DELETE FROM corpus_range WHERE corpusID=?", (corpusID,))
+con.commit()
+con.close()
+run_alg2links(legacy)
+report("legacy: links", [] if all_links(legacy) == all_links(scratch) else
+       ["links differ from a link DB built from scratch"])
+report("legacy: ranges", check_ranges(legacy))
+
+algcon.close()
+
+
+if not args.workdir:
+    shutil.rmtree(workdir)
+if failed:
+    sys.exit(f"{failed} tests failed")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+# print translations of sentences (one per line from stdin) using the sentence DBs
+# and the link DB of the language pair (xxx.db -> linkdb/xxx-yyy.db -> yyy.db)
+#
+# sentences are translated in batches (-b) with the three-hop pipeline of
+# indexserver.py (pooled connections, batched queries per hop) and the latency
+# of each hop is reported on stderr at the end
+#
+# output: sentence, number of links and translation separated by TAB
+# (all translations ordered by frequency or only the most frequent one with -1)
+#
+# USAGE: translate.py [-d sentdir] [-l linkdir] [-b batchsize] [-1] srclang trglang < sentences
+
+
+import argparse
+import asyncio
+import json
+import sys
+
+from indexserver import IndexService
+
+
+parser = argparse.ArgumentParser(prog='translate', description='print translations of sentences from link DBs')
+parser.add_argument("srclang", type=str, help="language of the input sentences")
+parser.add_argument("trglang", type=str, help="language of the translations")
+parser.add_argument("-d", "--sentdir", type=str, default='.', help="directory of the sentence DBs")
+parser.add_argument("-l", "--linkdir", type=str, default='linkdb', help="directory of the link DBs")
+parser.add_argument("-b", "--batch-size", type=int, default=1000, help="number of sentences per batch")
+parser.add_argument("-c", "--corpus", type=str, help="only links from this corpus")
+parser.add_argument("-v", "--version", type=str, help="only links from this release")
+parser.add_argument("-1", "--best", action='store_true', help="print only the most frequent translation")
+args = parser.parse_args()
+
+
+async def translate(service, batch):
+    params = {'lang': args.srclang, 'target': args.trglang, 'sentences': batch,
+              'corpus': args.corpus, 'version': args.version}
+    (status, result) = await service.query('translations', params)
+    if status != 200:
+        sys.exit(result['error'])
+    for item in result['translations']:
+        translations = item['translations'][:1] if args.best else item['translations']
+        if not translations:
+            print(f"{item['sentence']}\t0\t")
+        for t in translations:
+            print(f"{item['sentence']}\t{t['count']}\t{t['translation']}")
+
+
+async def main():
+    service = IndexService(args.sentdir, args.linkdir, workers=4, connections=4, window=0)
+    batch = []
+    for line in sys.stdin:
+        sentence = line.rstrip('\n')
+        if sentence:
+            batch.append(sentence)
+        if len(batch) >= args.batch_size:
+            await translate(service, batch)
+            batch = []
+    if batch:
+        await translate(service, batch)
+    for (name, latencies) in sorted(service.latencies.items()):
+        sys.stderr.write(f"{name}: {json.dumps(latencies.summary())}\n")
+    service.close()
+
+
+asyncio.run(main())
@@ -0,0 +1,114 @@
+#
+# streaming XML reader for OPUS documents and XCES alignment files
+#
+# expat is fed with large byte chunks instead of line by line and parse errors
+# are reported with their position instead of silently dropping data
+# (expat cannot recover from errors, everything after the error is lost)
+#
+
+import sys
+from xml.parsers.expat import ParserCreate, ExpatError, errors
+
+
+chunksize = 1048576
+
+
+## report a parse error with its position
+
+def report_error(err, name='', out=sys.stderr):
+    out.write(f"XML parsing error in {name}: {errors.messages[err.code]} (line {err.lineno}, column {err.offset})\n")
+    out.flush()
+
+
+##----------------------------------------------------------------
+## feed a binary file object into an expat parser (with handlers already set)
+## returns the number of parse errors (0 or 1)
+##----------------------------------------------------------------
+
+def parse(parser, fileobj, name='', size=chunksize):
+    try:
+        while True:
+            data = fileobj.read(size)
+            if not data:
+                break
+            parser.Parse(data, False)
+        parser.Parse(b'', True)
+    except ExpatError as err:
+        report_error(err, name)
+        return 1
+    return 0
+
+
+##----------------------------------------------------------------
+## generator over events collected by the handlers of a new parser
+## handlers are created by setup(parser, events) and append to events
+## parse errors are reported and raised after yielding all events before the error
+##----------------------------------------------------------------
+
+def iter_events(fileobj, setup, name='', size=chunksize):
+    parser = ParserCreate()
+    events = []
+    setup(parser, events)
+    try:
+        while True:
+            data = fileobj.read(size)
+            final = not data
+            parser.Parse(data, final)
+            yield from events
+            events.clear()
+            if final:
+                break
+    except ExpatError as err:
+        yield from events
+        report_error(err, name)
+        raise
+
+
+##----------------------------------------------------------------
+## links in XCES alignment files
+## yields ('linkGrp', attrs) and ('link', attrs)
+##----------------------------------------------------------------
+
+def iter_links(fileobj, name='', size=chunksize):
+
+    def setup(parser, events):
+        def start_element(tag, attrs):
+            if tag == 'link' or tag == 'linkGrp':
+                events.append((tag, attrs))
+        parser.StartElementHandler = start_element
+
+    return iter_events(fileobj, setup, name, size)
+
+
+##----------------------------------------------------------------
+## sentences in OPUS XML documents
+## yields (sentID, sentence) with the sentence text stripped from surrounding spaces
+## sentences without ID attribute get their position in the document as ID
+##----------------------------------------------------------------
+
+def iter_sentences(fileobj, name='', size=chunksize):
+
+    def setup(parser, events):
+        state = {'inSent': False, 'sentID': '', 'text': [], 'count': 0}
+
+        def start_element(tag, attrs):
+            if tag == 's':
+                state['inSent'] = True
+                state['count'] += 1
+                state['text'] = []
+                state['sentID'] = attrs['id'] if 'id' in attrs else str(state['count'])
+
+        def end_element(tag):
+            if tag == 's':
+                state['inSent'] = False
+                events.append((state['sentID'], ''.join(state['text']).strip()))
+
+        def char_data(data):
+            if state['inSent']:
+                state['text'].append(data)
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = char_data
+
+    return iter_events(fileobj, setup, name, size)